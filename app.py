@@ -1,30 +1,59 @@
-import pandas as pd
 import threading
 import time
-from flask import Flask, render_template, send_file, request, jsonify
-import tkinter as tk
-from tkinter import messagebox
-from gpiozero import Button, RotaryEncoder
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, redirect, url_for, stream_with_context
 import os
 import subprocess
 import queue
 import signal
 import sys
+import json
+import math
+import argparse
+import socket
+from storage import CsvStore, SqliteStore, make_row
+from occupancy import OccupancyGrid
+from importer import CsvImport, POLICIES
+from usage import UsageLog, DEFAULT_WINDOW_DAYS
+from watch import WatchEngine, CallbackNotifier, make_notifier, describe
+import exporter
+import metrics
+import profiler
+import scan_trace
+import hmac
 
-# === OS CONFIG ===
-os.environ["DISPLAY"] = ":0"
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+# pandas, tkinter and gpiozero are imported lazily by the subsystems that
+# need them, so a headless web node never loads the GUI or touches GPIO.
 
 # === CSV Path ===
-csv_path = "inventory.csv"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+csv_path = os.path.join(BASE_DIR, "inventory.csv")
+
+# === STORAGE ===
+# inventory.csv by default; --storage sqlite keeps bins in a WAL-mode database
+# and uses the CSV only for import (first run) and /download
+store = CsvStore(csv_path)
+
+def configure_storage(backend="csv", path=None):
+    global store, csv_path, occupancy, usage_log, watch
+    occupancy = None
+    usage_log = None
+    watch = None
+    if backend == "sqlite":
+        store = SqliteStore(path or os.path.join(BASE_DIR, "inventory.db"), seed_csv=csv_path)
+    else:
+        csv_path = path or csv_path
+        store = CsvStore(csv_path)
+    # Sorted /api/bins views belong to the old store
+    bins_changed()
 
 # === SHARED STATE ===
 current_bin_obj = None
 shutdown_event = threading.Event()
 
 # === THREAD SYNCHRONIZATION ===
-state_lock = threading.Lock()
-csv_lock = threading.Lock()
+# Timed locks record wait and hold times for /metrics
+state_lock = metrics.TimedLock('state')
+csv_lock = metrics.TimedLock('csv')
 
 # === GLOBAL SELECTION STATE ===
 valid_rows = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
@@ -33,9 +62,110 @@ selected_row_index = 0
 selected_column_index = 0
 selection_mode = "row"  # "row" or "column"
 
+def configure_cabinet(rows, columns):
+    """Change the cabinet grid, e.g. rows "ABCDEFGHIJ" and 12 columns"""
+    global valid_rows, valid_columns, selected_row_index, selected_column_index, occupancy
+    valid_rows = list(rows)
+    valid_columns = list(range(1, columns + 1))
+    selected_row_index = 0
+    selected_column_index = 0
+    occupancy = None
+
+# === OCCUPANCY ===
+# Bitmap of which grid slots hold stock, built on first use and kept in sync
+# by the write helpers below
+occupancy = None
+
+def get_occupancy():
+    global occupancy
+    if occupancy is None:
+        grid = OccupancyGrid(valid_rows, valid_columns)
+        grid.rebuild(load_bins())
+        occupancy = grid
+    return occupancy
+
+def track_occupancy(b, original_location=None):
+    if occupancy is None:
+        return
+    if original_location and original_location != b.location:
+        occupancy.set(original_location, False)
+    occupancy.set(b.location, bool(b.name) and b.quantity > 0)
+
+# === USAGE ANALYTICS ===
+# Adjustment events with hourly/daily rollups, opened on first use next to the
+# inventory (<inventory>.usage.jsonl); writers call record_usage with csv_lock held
+usage_log = None
+
+def get_usage():
+    global usage_log
+    if usage_log is None:
+        usage_log = UsageLog(os.path.splitext(store.path)[0] + ".usage.jsonl")
+    return usage_log
+
+def record_usage(location, name, before, after):
+    get_usage().record(location, name, after - before, after)
+
+def record_row_usage(before, after):
+    """Usage implied by rewriting a bin from row before (None if new) to row after.
+
+    The same part counts its quantity change, a cleared bin counts everything
+    as consumed and an empty bin being filled is a restock. Putting a different
+    part in the bin is a relabel, not usage.
+    """
+    old_name = before['Name'] if before else ""
+    if old_name and after['Name'] and old_name != after['Name']:
+        return
+    if old_name:
+        record_usage(after['Location'], old_name, before['Quantity'], after['Quantity'] if after['Name'] else 0)
+    else:
+        record_usage(after['Location'], after['Name'], 0, after['Quantity'])
+
+# === LOW-STOCK WATCH ===
+# Threshold-ordered index of watched bins, built at start-up so the first
+# write already has something to compare with; every write re-checks its bin.
+# Alerts reach the web UI and dashboard over /events, the Tk kiosk through
+# gui_event_queue (it subscribes when it starts), and any --notify targets
+# (file:<path> or a webhook URL).
+watch = None
+notify_targets = []
+
+def get_watch():
+    global watch
+    if watch is None:
+        engine = WatchEngine()
+        engine.rebuild(store.all())
+        engine.add_notifier(CallbackNotifier(push_stock_alert))
+        for target in notify_targets:
+            engine.add_notifier(make_notifier(target))
+        watch = engine
+    return watch
+
+def track_stock(b, original_location=None):
+    if watch is not None:
+        watch.update(b.to_dict(), original_location)
+
+def push_stock_alert(alert):
+    # Wakes the /events streams, which pick the alert up from watch.since()
+    notify_status_change()
+
 # === THREAD COMMUNICATION ===
 gui_event_queue = queue.Queue()
 
+# === STATUS PUSH ===
+# Bumped on every change to current_bin_obj so /events subscribers wake up;
+# status_listeners are called too (the async server's broadcaster)
+status_changed = threading.Condition()
+status_version = 0
+status_listeners = []
+
+def notify_status_change():
+    global status_version
+    with status_changed:
+        status_version += 1
+        status_changed.notify_all()
+    for listener in status_listeners:
+        listener()
+
 # === SIGNAL HANDLING ===
 def signal_handler(signum, frame):
     """Handle Ctrl+C gracefully"""
@@ -43,24 +173,18 @@ def signal_handler(signum, frame):
     shutdown_event.set()
     
     # Close GPIO resources
-    try:
-        button.close()
-        encoder.close()
-    except:
-        pass
+    close_encoder()
     
     # Exit the application
     sys.exit(0)
 
-# Register signal handler
-signal.signal(signal.SIGINT, signal_handler)
-
 # --- Bin class definition ---
 class Bin:
-    def __init__(self, name, quantity, location):
+    def __init__(self, name, quantity, location, threshold=0):
         self.name = name
         self.quantity = int(quantity)
         self.location = location
+        self.threshold = int(threshold)  # Reorder level; 0 means not watched
         self.adjustment = 0  # Store pending adjustment for this bin
 
     def adjust_quantity(self, amount):
@@ -70,32 +194,91 @@ class Bin:
         return {
             'Name': self.name,
             'Quantity': self.quantity,
-            'Location': self.location
+            'Location': self.location,
+            'Threshold': self.threshold
         }
 
     @staticmethod
     def from_dict(d):
         # Handle NaN values from CSV
         name = d['Name']
-        if pd.isna(name):
+        if name is None or (isinstance(name, float) and math.isnan(name)):
             name = ""
-        return Bin(name, d['Quantity'], d['Location'])
+        threshold = d.get('Threshold', 0)
+        if threshold is None or (isinstance(threshold, float) and math.isnan(threshold)):
+            threshold = 0
+        return Bin(name, d['Quantity'], d['Location'], threshold)
 
-# --- Helper functions for CSV <-> Bin ---
+# --- Helper functions for storage <-> Bin ---
 def load_bins():
-    try:
-        df = pd.read_csv(csv_path)
-        return [Bin.from_dict(row) for row in df.to_dict(orient='records')]
-    except Exception:
-        return []
+    return [Bin.from_dict(row) for row in store.all()]
 
 def save_bins(bins):
-    try:
-        df = pd.DataFrame([b.to_dict() for b in bins])
-        df.to_csv(csv_path, index=False)
-    except Exception as e:
-        print(f"Error saving bins: {e}")
-        # Don't let the error break the application
+    store.replace_all([b.to_dict() for b in bins])
+    bins_changed()
+    if occupancy is not None:
+        occupancy.rebuild(bins)
+    if watch is not None:
+        watch.rebuild(b.to_dict() for b in bins)
+
+def load_bin(location):
+    row = store.get(location)
+    return Bin.from_dict(row) if row else None
+
+def save_bin(b, original_location=None, replicate=True):
+    """Write a single bin; original_location is where it was before a move"""
+    store.upsert_many([(original_location or b.location, b.to_dict())])
+    bins_changed()
+    track_occupancy(b, original_location)
+    track_stock(b, original_location)
+    if replicate and replicator:
+        if original_location and original_location != b.location:
+            replicator.local_set(original_location, "", 0)
+        replicator.local_set(b.location, b.name, b.quantity)
+
+def save_adjusted_bin(b, delta):
+    """Write a bin after adding delta to it; peers merge the delta instead of overwriting"""
+    store.upsert_many([(b.location, b.to_dict())])
+    bins_changed()
+    track_occupancy(b)
+    track_stock(b)
+    if replicator:
+        replicator.local_adjust(b.location, delta, b.name, b.quantity - delta)
+
+# === REPLICATION ===
+# Set by configure_replication() when peers are given; None on a standalone unit
+replicator = None
+
+def apply_replicated_bins(changes):
+    """Write bins changed on a peer, [(location, name, quantity), ...], in one store write.
+
+    The replicator calls this with csv_lock held.
+    """
+    global current_bin_obj
+    # Thresholds are local settings; keep this unit's one for each bin
+    existing = store.get_many([location for location, _, _ in changes])
+    bins = [Bin(name, quantity, location, existing[location]['Threshold'] if location in existing else 0)
+            for location, name, quantity in changes]
+    store.upsert_many([(b.location, b.to_dict()) for b in bins])
+    bins_changed()
+    for b in bins:
+        track_occupancy(b)
+        track_stock(b)
+    with state_lock:
+        for b in bins:
+            if current_bin_obj and current_bin_obj.location == b.location:
+                if b.quantity <= 0:
+                    current_bin_obj = None
+                else:
+                    current_bin_obj.name = b.name
+                    current_bin_obj.quantity = b.quantity
+    notify_status_change()
+
+def configure_replication(node_id, peers, log_path, token):
+    global replicator
+    from replication import Replicator
+    replicator = Replicator(node_id, peers, log_path, csv_lock, apply_replicated_bins, token)
+    return replicator
 
 # --- Helper to find a bin by location ---
 def find_bin(bins, location):
@@ -116,23 +299,26 @@ def button_pressed(channel=None):
         local_bin = current_bin_obj.location
         local_adjustment = current_bin_obj.adjustment
     with csv_lock:
-        bins = load_bins()
-        b = find_bin(bins, local_bin)
+        b = load_bin(local_bin)
         if not b:
             return
+        name, before = b.name, b.quantity
         b.adjust_quantity(local_adjustment)
         if b.quantity <= 0:
             # Clear name and set quantity to 0 when removing
             b.name = ""
             b.quantity = 0
-            save_bins(bins)
+            save_bin(b)
+            record_usage(local_bin, name, before, 0)
             with state_lock:
                 current_bin_obj = None
         else:
-            save_bins(bins)
+            save_adjusted_bin(b, local_adjustment)
+            record_usage(local_bin, name, before, b.quantity)
             with state_lock:
                 current_bin_obj = b
                 current_bin_obj.adjustment = 0
+    notify_status_change()
 
 def rotary_cw():
     global current_bin_obj
@@ -144,6 +330,7 @@ def rotary_cw():
             # Bin is open - use adjustment mode
             if current_bin_obj is not None:
                 current_bin_obj.adjustment += 1
+                notify_status_change()
 
 def rotary_ccw():
     global current_bin_obj
@@ -155,14 +342,31 @@ def rotary_ccw():
             # Bin is open - use adjustment mode
             if current_bin_obj is not None:
                 current_bin_obj.adjustment -= 1
+                notify_status_change()
 
 # define RE GPIO pins and event detects
 SW,DT,CLK = 17, 27, 22
-button = Button(SW, pull_up=True, bounce_time=0.1)
-encoder = RotaryEncoder(CLK, DT,wrap=False, max_steps=0)
-button.when_pressed = button_pressed
-encoder.when_rotated_clockwise = rotary_cw
-encoder.when_rotated_counter_clockwise = rotary_ccw
+button = None
+encoder = None
+
+def init_encoder():
+    """Claim the GPIO pins and wire the encoder callbacks"""
+    global button, encoder
+    from gpiozero import Button, RotaryEncoder
+    button = Button(SW, pull_up=True, bounce_time=0.1)
+    encoder = RotaryEncoder(CLK, DT,wrap=False, max_steps=0)
+    button.when_pressed = metrics.timed(metrics.GPIO_SECONDS, callback='button')(button_pressed)
+    encoder.when_rotated_clockwise = metrics.timed(metrics.GPIO_SECONDS, callback='cw')(rotary_cw)
+    encoder.when_rotated_counter_clockwise = metrics.timed(metrics.GPIO_SECONDS, callback='ccw')(rotary_ccw)
+
+def close_encoder():
+    try:
+        if button:
+            button.close()
+        if encoder:
+            encoder.close()
+    except:
+        pass
 
 # Global selection functions
 def rotary_cw_selection():
@@ -189,22 +393,29 @@ def button_pressed_selection():
         selected_bin = f"{valid_rows[selected_row_index]}{valid_columns[selected_column_index]}"
         
         with csv_lock:
-            bins = load_bins()
-            b = find_bin(bins, selected_bin)
+            b = load_bin(selected_bin)
             if b:
                 # Send message to GUI to open the bin
                 gui_event_queue.put(("OPEN_BIN", selected_bin))
             else:
                 # Create empty bin if it doesn't exist
-                new_bin = Bin("", 0, selected_bin)
-                bins.append(new_bin)
-                bins.sort(key=lambda b: b.location)
-                save_bins(bins)
+                save_bin(Bin("", 0, selected_bin), replicate=False)
                 # Send message to GUI to open the new bin
                 gui_event_queue.put(("OPEN_BIN", selected_bin))
 
 # === FLASK SERVER FOR INVENTORY ===
-app = Flask(__name__)
+bp = Blueprint('inventory', __name__)
+
+def create_app():
+    """Build the Flask app without touching GPIO or the GUI"""
+    app = Flask(__name__)
+    metrics.instrument_app(app)
+    app.register_blueprint(bp)
+    get_watch()
+    if replicator:
+        from replication import create_blueprint
+        app.register_blueprint(create_blueprint(replicator))
+    return app
 
 def get_current_status():
     with state_lock:
@@ -223,161 +434,195 @@ def get_current_status():
                 'current_adjustment': None
             }
 
-@app.route("/")
+@bp.route("/")
 def index():
+    # The inventory table is paged in by the browser from /api/bins
+    return render_template("index.html", **get_current_status())
+
+def location_sort_key(location):
+    """Sort key that orders A2 before A10"""
+    letters = location.rstrip('0123456789')
+    digits = location[len(letters):]
+    return (letters, int(digits) if digits else 0)
+
+BIN_SORT_KEYS = {
+    'Name': lambda b: b.name.lower(),
+    'Quantity': lambda b: b.quantity,
+    'Location': lambda b: location_sort_key(b.location),
+}
+
+# Each sort order of the whole inventory is built once and shared by every
+# page and client. A view is keyed to the store and its version (CSV mtime and
+# size, SQLite data_version), so edits made behind our back show up too;
+# bins_changed() drops them all after our own writes.
+bin_views = {}           # sort key -> (view key, rows in ascending order)
+bins_version = 0
+bin_views_lock = threading.Lock()
+
+def bins_changed():
+    """Call after every store write"""
+    global bins_version
+    with bin_views_lock:
+        bins_version += 1
+        bin_views.clear()
+
+def sorted_bins(sort):
+    with bin_views_lock:
+        version = bins_version
+        cached = bin_views.get(sort)
+    # Read before loading: a write in between only costs a rebuild on the next page
+    key = (store, version, store.version())
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    bins = load_bins()
+    bins.sort(key=BIN_SORT_KEYS[sort])
+    rows = [b.to_dict() for b in bins]
+    with bin_views_lock:
+        # A write while we were reading makes this view stale already
+        if bins_version == version:
+            bin_views[sort] = (key, rows)
+    return rows
+
+@bp.route("/api/bins")
+def list_bins():
+    """Return one page of the inventory, filtered and sorted on the server"""
+    query = request.args.get('q', '').strip().lower()
+    sort = request.args.get('sort', 'Location')
+    descending = request.args.get('order', 'asc') == 'desc'
     try:
-        bins = load_bins()
-        table_data = [b.to_dict() for b in bins]
-        return render_template("index.html", table_data=table_data, **get_current_status())
-    except Exception as e:
-        return f"<p>Error loading CSV: {e}</p>"
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid offset or limit'})
+    if sort not in BIN_SORT_KEYS:
+        return jsonify({'success': False, 'error': f'Cannot sort by {sort}'})
 
-@app.route("/add", methods=['GET', 'POST'])
+    rows = sorted_bins(sort)
+    if query:
+        rows = [r for r in rows if query in r['Name'].lower() or query in r['Location'].lower()]
+    if descending:
+        end = max(len(rows) - offset, 0)
+        page = rows[max(end - limit, 0):end][::-1]
+    else:
+        page = rows[offset:offset + limit]
+    return jsonify({
+        'success': True,
+        'total': len(rows),
+        'offset': offset,
+        'rows': page
+    })
+
+@bp.route("/add", methods=['GET', 'POST'])
 def add_item():
-    if request.method == 'POST':
-        name = request.form.get('name', '').strip()
-        quantity = request.form.get('quantity', '').strip()
-        bin_location = request.form.get('bin_location', '').strip()
-        
-        if name and quantity and bin_location:
-            try:
-                quantity = int(quantity)
-                bin_location = bin_location.upper()  # Convert to uppercase for consistency
-                with csv_lock:
-                    bins = load_bins()
-                    if find_bin(bins, bin_location):
-                        table_data = [b.to_dict() for b in bins]
-                        return render_template("index.html", 
-                                             table_data=table_data,
-                                             error="Bin already occupied.",
-                                             **get_current_status())
-                    new_bin = Bin(name, quantity, bin_location)
-                    bins.append(new_bin)
-                    bins.sort(key=lambda b: b.location)
-                    save_bins(bins)
-                    with state_lock:
-                        global current_bin_obj
-                        current_bin_obj = new_bin
-                    table_data = [b.to_dict() for b in bins]
-                    return render_template("index.html", 
-                                         table_data=table_data,
-                                         success="Inventory updated successfully.",
-                                         **get_current_status())
-            except ValueError:
-                bins = load_bins()
-                table_data = [b.to_dict() for b in bins]
-                return render_template("index.html", 
-                                     table_data=table_data,
-                                     error="Invalid quantity. Please enter a number.",
-                                     **get_current_status())
-        else:
-            bins = load_bins()
-            table_data = [b.to_dict() for b in bins]
-            return render_template("index.html", 
-                                 table_data=table_data,
-                                 error="All fields are required.",
-                                 **get_current_status())
+    if request.method != 'POST':
+        return redirect(url_for('.index'))
+    name = request.form.get('name', '').strip()
+    quantity = request.form.get('quantity', '').strip()
+    bin_location = request.form.get('bin_location', '').strip()
+    threshold = request.form.get('threshold', '').strip()
     
-    bins = load_bins()
-    table_data = [b.to_dict() for b in bins]
-    return render_template("index.html", 
-                         table_data=table_data,
-                         **get_current_status())
+    if not (name and quantity):
+        return jsonify({'success': False, 'error': 'Name and quantity are required.'})
+    try:
+        quantity = int(quantity)
+        threshold = int(threshold) if threshold else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid quantity or threshold. Please enter a number.'})
+    if threshold is not None and threshold < 0:
+        return jsonify({'success': False, 'error': 'Threshold cannot be negative.'})
+    
+    grid = get_occupancy()
+    with csv_lock:
+        if bin_location:
+            bin_location = bin_location.upper()  # Convert to uppercase for consistency
+        else:
+            # No location given: take the first free bin
+            bin_location = grid.first_free()
+            if not bin_location:
+                return jsonify({'success': False, 'error': 'No free bins.'})
+        existing = load_bin(bin_location)
+        if existing and existing.name and existing.quantity > 0:
+            suggestion = grid.nearest_free(bin_location)
+            error = 'Bin already occupied.'
+            if suggestion:
+                error += f' Nearest free bin: {suggestion}.'
+            return jsonify({'success': False, 'error': error, 'suggestion': suggestion})
+        if threshold is None:
+            # Blank keeps the bin's reorder level
+            threshold = existing.threshold if existing else 0
+        new_bin = Bin(name, quantity, bin_location, threshold)
+        save_bin(new_bin)
+        record_row_usage(existing.to_dict() if existing else None, new_bin.to_dict())
+        with state_lock:
+            global current_bin_obj
+            current_bin_obj = new_bin
+    notify_status_change()
+    return jsonify({'success': True, 'message': f'Added {name} to {bin_location}.', 'location': bin_location})
+
+@bp.route("/api/free-slot")
+def free_slot():
+    """First free bin, or the free bin nearest to ?near=<location>"""
+    grid = get_occupancy()
+    near = request.args.get('near', '').strip().upper()
+    location = grid.nearest_free(near) if near else grid.first_free()
+    if not location:
+        return jsonify({'success': False, 'error': 'No free bins.'})
+    return jsonify({'success': True, 'location': location})
 
-@app.route("/clear", methods=['GET', 'POST'])
+@bp.route("/clear", methods=['GET', 'POST'])
 def clear_item():
-    if request.method == 'POST':
-        bin_location = request.form.get('bin_location', '').strip().upper()
+    if request.method != 'POST':
+        return redirect(url_for('.index'))
+    bin_location = request.form.get('bin_location', '').strip().upper()
+    if not bin_location:
+        return jsonify({'success': False, 'error': 'Bin location is required.'})
+    
+    with csv_lock:
+        b = load_bin(bin_location)
+        if not b:
+            return jsonify({'success': False, 'error': f'{bin_location} not found.'})
+        before = b.to_dict()
+        b.name = ""  # Clear name
+        b.quantity = 0  # Set quantity to 0
+        save_bin(b)
+        record_row_usage(before, b.to_dict())
         
-        if bin_location:
-            with csv_lock:
-                bins = load_bins()
-                b = find_bin(bins, bin_location)
-                if b:
-                    b.name = ""  # Clear name
-                    b.quantity = 0  # Set quantity to 0
-                    save_bins(bins)
-                    
-                    # Close the bin if it's currently open in Tkinter GUI
-                    with state_lock:
-                        global current_bin_obj
-                        if current_bin_obj and current_bin_obj.location == bin_location:
-                            current_bin_obj = None
-                    
-                    table_data = [b.to_dict() for b in bins]
-                    return render_template("index.html", 
-                                         table_data=table_data,
-                                         success=f"Cleared {bin_location}.",
-                                         **get_current_status())
-                else:
-                    table_data = [b.to_dict() for b in bins]
-                    return render_template("index.html", 
-                                         table_data=table_data,
-                                         error=f"{bin_location} not found.",
-                                         **get_current_status())
-        else:
-            bins = load_bins()
-            table_data = [b.to_dict() for b in bins]
-            return render_template("index.html", 
-                                 table_data=table_data,
-                                 error="Bin location is required.",
-                                 **get_current_status())
-    
-    # GET request - show the form
-    bins = load_bins()
-    table_data = [b.to_dict() for b in bins]
-    return render_template("index.html", table_data=table_data, **get_current_status())
+        # Close the bin if it's currently open in Tkinter GUI
+        with state_lock:
+            global current_bin_obj
+            if current_bin_obj and current_bin_obj.location == bin_location:
+                current_bin_obj = None
+    notify_status_change()
+    return jsonify({'success': True, 'message': f'Cleared {bin_location}.'})
 
-@app.route("/open", methods=['GET', 'POST'])
+@bp.route("/open", methods=['GET', 'POST'])
 def open_bin():
-    if request.method == 'POST':
-        bin_location = request.form.get('bin_location', '').strip()
-        if bin_location:
-            bin_location = bin_location.upper()  # Convert to uppercase for consistency
-            with csv_lock:
-                bins = load_bins()
-                b = find_bin(bins, bin_location)
-                if b:
-                    with state_lock:
-                        global current_bin_obj
-                        current_bin_obj = b
-                    table_data = [b.to_dict() for b in bins]
-                    return render_template("index.html", 
-                                         table_data=table_data,
-                                         success=f"Opened {bin_location} - {b.name} (Qty: {b.quantity})",
-                                         **get_current_status())
-                else:
-                    table_data = [b.to_dict() for b in bins]
-                    return render_template("index.html", 
-                                         table_data=table_data,
-                                         error=f"{bin_location} not found.",
-                                         **get_current_status())
-        else:
-            bins = load_bins()
-            table_data = [b.to_dict() for b in bins]
-            return render_template("index.html", 
-                                 table_data=table_data,
-                                 error="Bin location is required.",
-                                 **get_current_status())
-    bins = load_bins()
-    table_data = [b.to_dict() for b in bins]
-    return render_template("index.html", 
-                         table_data=table_data,
-                         **get_current_status())
+    if request.method != 'POST':
+        return redirect(url_for('.index'))
+    bin_location = request.form.get('bin_location', '').strip()
+    if not bin_location:
+        return jsonify({'success': False, 'error': 'Bin location is required.'})
+    
+    bin_location = bin_location.upper()  # Convert to uppercase for consistency
+    with csv_lock:
+        b = load_bin(bin_location)
+        if not b:
+            return jsonify({'success': False, 'error': f'{bin_location} not found.'})
+        with state_lock:
+            global current_bin_obj
+            current_bin_obj = b
+    notify_status_change()
+    return jsonify({'success': True, 'message': f'Opened {bin_location} - {b.name} (Qty: {b.quantity})'})
 
-@app.route("/close", methods=['POST'])
+@bp.route("/close", methods=['POST'])
 def close_bin():
     with state_lock:
         global current_bin_obj
         current_bin_obj = None
-    bins = load_bins()
-    table_data = [b.to_dict() for b in bins]
-    return render_template("index.html", 
-                         table_data=table_data,
-                         success="Bin closed.",
-                         **get_current_status())
+    notify_status_change()
+    return jsonify({'success': True, 'message': 'Bin closed.'})
 
-@app.route("/status")
+@bp.route("/status")
 def get_status():
     with state_lock:
         status = {
@@ -388,7 +633,124 @@ def get_status():
         }
     return jsonify(status)
 
-@app.route("/apply-adjustment", methods=['POST'])
+@bp.route("/dashboard")
+@bp.route("/Dashboard")
+def dashboard():
+    """Kiosk view; renders once and then follows /events"""
+    status = get_current_status()
+    return render_template("dashboard.html",
+                           bin=status['current_bin'],
+                           name=status['current_name'],
+                           qty=status['current_quantity'],
+                           adjustment=status['current_adjustment'])
+
+@bp.route("/events")
+def status_events():
+    """Server-sent events stream that pushes the status whenever it changes"""
+    engine = get_watch()
+
+    def stream():
+        seen = None
+        # Only alerts raised after connecting; GET /api/low-stock has the current state
+        seen_alert = engine.seq
+        while not shutdown_event.is_set():
+            with status_changed:
+                status_changed.wait_for(lambda: status_version != seen, timeout=15)
+                version = status_version
+            if version == seen:
+                # Comment line keeps idle connections open through proxies
+                yield ": keepalive\n\n"
+                continue
+            seen = version
+            for alert in engine.since(seen_alert):
+                seen_alert = alert['seq']
+                yield f"event: stock\ndata: {json.dumps(alert)}\n\n"
+            yield f"data: {json.dumps(get_current_status())}\n\n"
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: request, lock, persistence and GPIO callback timings"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route("/api/scan-stats")
+def scan_stats():
+    """Stage timings and outcomes of recent scans, grouped by localization parameters"""
+    records = scan_trace.read_recent(window=request.args.get('window', scan_trace.WINDOW, type=int))
+    return jsonify({'success': True, 'scans': len(records), 'groups': scan_trace.summarize(records)})
+
+@bp.route("/api/low-stock")
+def low_stock():
+    """Bins at or below their reorder threshold, plus the ?near= (default 10) closest to it"""
+    engine = get_watch()
+    near = request.args.get('near', 10, type=int)
+    return jsonify({'success': True, 'low': engine.low(), 'nearest': engine.nearest(max(near, 0)),
+                    'alerts': engine.since(0)})
+
+@bp.route("/api/usage")
+def usage_report():
+    """Burn rate and days-to-empty per part over the last ?days= (default 7), from the rollups"""
+    days = request.args.get('days', DEFAULT_WINDOW_DAYS, type=float)
+    if not 0 < days <= 90:
+        return jsonify({'success': False, 'error': 'days must be between 0 and 90'})
+    with csv_lock:
+        log = get_usage()
+    # The shared sorted view, read without the write lock like /api/bins; rebuilt only after a write
+    on_hand = {}
+    for row in sorted_bins('Location'):
+        if row['Name']:
+            on_hand[row['Name']] = on_hand.get(row['Name'], 0) + row['Quantity']
+    parts = log.summary(on_hand, days)
+    name = request.args.get('name', '').strip().lower()
+    if name:
+        parts = [p for p in parts if name in p['name'].lower()]
+    return jsonify({'success': True, 'days': days, 'parts': parts})
+
+# === ADMIN ===
+# Admin endpoints are disabled unless a token is set (--admin-token or
+# MINIBENCH_ADMIN_TOKEN); requests send it as "Authorization: Bearer <token>"
+admin_token = os.environ.get("MINIBENCH_ADMIN_TOKEN")
+
+def admin_authorized():
+    supplied = request.headers.get('Authorization', '')
+    return bool(admin_token) and supplied.startswith('Bearer ') and \
+        hmac.compare_digest(supplied[len('Bearer '):].encode(), admin_token.encode())
+
+@bp.route("/admin/profile", methods=['POST'])
+def admin_profile():
+    """Start sampling every thread for ?seconds= (default 10); GET /admin/profile collects the result"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.01))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid seconds or interval'})
+    if not (0 < seconds <= profiler.MAX_SECONDS and 0.001 <= interval <= 1):
+        return jsonify({'success': False, 'error': f'seconds must be 0-{profiler.MAX_SECONDS}, interval 0.001-1'})
+    run = profiler.start(seconds, interval)
+    if run is None:
+        return jsonify({'success': False, 'error': 'A profile is already running'}), 409
+    return jsonify({'success': True, 'message': f'Profiling for {run["seconds"]:g}s',
+                    'seconds': run['seconds'], 'started': run['started']}), 202
+
+@bp.route("/admin/profile", methods=['GET'])
+def admin_profile_result():
+    """Collapsed stacks of the latest profile for a flame graph; 202 while it is still sampling"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    run = profiler.last_run()
+    if run is None:
+        return jsonify({'success': False, 'error': 'No profile has been run'}), 404
+    if run['error']:
+        return jsonify({'success': False, 'error': f"Profile failed: {run['error']}"}), 500
+    if run['stacks'] is None:
+        remaining = max(run['started'] + run['seconds'] - time.time(), 0)
+        return jsonify({'success': True, 'running': True, 'remaining': round(remaining, 1)}), 202
+    return Response(run['stacks'], mimetype='text/plain')
+
+@bp.route("/apply-adjustment", methods=['POST'])
 def apply_adjustment():
     global current_bin_obj
     if not request.is_json:
@@ -400,50 +762,233 @@ def apply_adjustment():
             return jsonify({'success': False, 'error': 'No bin currently open'})
         local_bin = current_bin_obj.location
     with csv_lock:
-        bins = load_bins()
-        b = find_bin(bins, local_bin)
+        b = load_bin(local_bin)
         if not b:
             return jsonify({'success': False, 'error': 'Bin not found'})
+        name, before = b.name, b.quantity
         b.adjust_quantity(adjustment)
         if b.quantity <= 0:
             # Clear name and set quantity to 0 when removing
             b.name = ""
             b.quantity = 0
-            save_bins(bins)
+            save_bin(b)
+            record_usage(local_bin, name, before, 0)
             with state_lock:
                 current_bin_obj = None
+            notify_status_change()
             return jsonify({'success': True, 'message': f'Cleared {local_bin}'})
         else:
-            save_bins(bins)
+            save_adjusted_bin(b, adjustment)
+            record_usage(local_bin, name, before, b.quantity)
             with state_lock:
                 current_bin_obj = b
                 current_bin_obj.adjustment = 0
+            notify_status_change()
             return jsonify({'success': True, 'message': f'Updated {local_bin} quantity to {b.quantity}'})
 
-@app.route("/download")
-def download_csv():
-    return send_file(csv_path, as_attachment=True)
+@bp.route("/download")
+@bp.route("/export")
+def export_inventory():
+    """Stream the inventory as ?format=csv|jsonl|xlsx, optionally filtered by ?row=, ?column= and ?name="""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        return jsonify({'success': False, 'error': f'Invalid format. Use one of: {", ".join(exporter.FORMATS)}'})
+    column = request.args.get('column', '').strip()
+    if column and not column.isdigit():
+        return jsonify({'success': False, 'error': 'Invalid column. Please enter a number.'})
+    keep = exporter.row_filter(row=request.args.get('row', '').strip(),
+                               column=int(column) if column else None,
+                               name=request.args.get('name', '').strip())
+    encode, mimetype, compressible = exporter.FORMATS[fmt]
+    
+    # Take the point-in-time view under the lock, then stream it without blocking writers
+    with csv_lock:
+        rows = store.iter_rows()
+    chunks = encode(r for r in rows if keep(r))
+    headers = {'Content-Disposition': f'attachment; filename=inventory.{fmt}', 'Vary': 'Accept-Encoding'}
+    if compressible and 'gzip' in request.accept_encodings:
+        chunks = exporter.gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+def apply_import(job):
+    """Write a validated import in one flush; caller holds csv_lock. Returns the changed locations"""
+    global current_bin_obj
+    if job.policy == 'replace':
+        existing = {r['Location']: r for r in store.all()}
+    else:
+        existing = store.get_many(job.rows)
+    merged = job.merge(existing)
+    if job.errors:
+        return []
+    removed = set()
+    if job.policy == 'replace':
+        store.replace_all(sorted(merged.values(), key=lambda r: location_sort_key(r['Location'])))
+        get_occupancy().rebuild(Bin.from_dict(r) for r in merged.values())
+        # Bins left out of the file are gone; peers see them cleared
+        removed = existing.keys() - merged.keys()
+        for location in removed:
+            merged[location] = make_row("", 0, location)
+    else:
+        store.upsert_many([(location, row) for location, row in merged.items()])
+        for row in merged.values():
+            track_occupancy(Bin.from_dict(row))
+    bins_changed()
+    def contents(row):
+        return (row['Name'], row['Quantity']) if row else ("", 0)
+    # What peers and the kiosk care about; a new Threshold only matters to the watch
+    changed = [location for location, row in merged.items() if contents(existing.get(location)) != contents(row)]
+    # Restocks booked by import or /scan/batch; bins dropped by a replace weren't used up
+    for location in changed:
+        if location not in removed:
+            record_row_usage(existing.get(location), merged[location])
+    if watch is not None:
+        for location, row in merged.items():
+            if location in removed:
+                watch.forget(location)    # dropped, not run out: no alert
+            elif existing.get(location) != row:
+                watch.update(row)
+    if replicator:
+        for location in changed:
+            replicator.local_set(location, merged[location]['Name'], merged[location]['Quantity'])
+    with state_lock:
+        if current_bin_obj and current_bin_obj.location in changed:
+            row = merged[current_bin_obj.location]
+            if row['Name'] and row['Quantity'] > 0:
+                current_bin_obj.name = row['Name']
+                current_bin_obj.quantity = row['Quantity']
+            else:
+                current_bin_obj = None
+    notify_status_change()
+    return changed
+
+@bp.route("/scan/batch", methods=['POST'])
+def scan_batch():
+    """Book a tray of scanned Digi-Key labels in one write.
+
+    Each label ({'mfr_pn', 'digi_key_pn', 'qty', ...} as parsed by camera_test)
+    adds its quantity to the bin already named after the part, or fills a free bin.
+    """
+    if not request.is_json:
+        return jsonify({'success': False, 'error': 'Invalid request format'})
+    labels = request.get_json().get('labels', [])
+    if not labels:
+        return jsonify({'success': False, 'error': 'No labels provided'})
+    
+    grid = get_occupancy()
+    with csv_lock:
+        by_name = {b.name.lower(): b for b in load_bins() if b.name}
+        free = grid.free_slots()
+        pending = {}             # location -> [name, quantity to add]
+        for i, label in enumerate(labels, 1):
+            part = str(label.get('mfr_pn') or label.get('digi_key_pn') or '').strip()
+            try:
+                quantity = int(label.get('qty'))
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': f'Label {i}: invalid quantity'})
+            if not part or quantity <= 0:
+                return jsonify({'success': False, 'error': f'Label {i}: needs a part number and a quantity'})
+            b = by_name.get(part.lower()) or by_name.get(str(label.get('digi_key_pn', '')).lower())
+            if b is None:
+                location = next((loc for loc in free if loc not in pending), None)
+                if location is None:
+                    return jsonify({'success': False, 'error': f'No free bin for {part}'})
+                b = Bin(part, 0, location)
+                by_name[part.lower()] = b
+            # Several bags of one part (different lots) land in the same bin
+            pending.setdefault(b.location, [b.name, 0])[1] += quantity
+        
+        job = CsvImport('add', lambda location: grid.index(location) is not None)
+        for line, (location, (name, quantity)) in enumerate(pending.items(), 1):
+            job.add_record(line, {'Name': name, 'Quantity': str(quantity), 'Location': location})
+        if not job.errors:
+            apply_import(job)
+        if job.errors:
+            return jsonify({'success': False, 'error': '; '.join(job.errors)})
+        booked = []
+        for location, (name, quantity) in pending.items():
+            b = load_bin(location)
+            booked.append({'location': location, 'name': name, 'added': quantity,
+                           'quantity': b.quantity if b else quantity})
+    return jsonify({'success': True, 'message': f'Booked {len(labels)} labels into {len(booked)} bins',
+                    'booked': booked})
+
+@bp.route("/import", methods=['POST'])
+def import_csv():
+    """Bulk-load bins from a CSV upload (form field 'file', or a text/csv body).
 
-@app.route("/update-bin", methods=['POST'])
+    ?policy=replace|merge|add (default merge). With ?progress=1 the response is
+    newline-delimited JSON: {"rows": n} every few thousand rows, then the result.
+    """
+    policy = request.values.get('policy', 'merge')
+    if policy not in POLICIES:
+        return jsonify({'success': False, 'error': f'Invalid policy. Use one of: {", ".join(POLICIES)}'})
+    upload = request.files.get('file')
+    if upload is not None:
+        source = upload.stream
+    elif request.mimetype == 'text/csv':
+        source = request.stream
+    else:
+        return jsonify({'success': False, 'error': 'No CSV file provided'})
+    
+    grid = get_occupancy()
+    job = CsvImport(policy, lambda location: grid.index(location) is not None)
+    
+    def run():
+        # Parse without holding the lock; only the merge and write need it
+        for count in job.read(source):
+            yield {'rows': count}
+        if not job.errors and not job.rows:
+            yield {'success': False, 'error': 'No rows to import'}
+            return
+        if not job.errors:
+            with csv_lock:
+                changed = apply_import(job)
+        if job.errors:
+            yield {'success': False, 'error': f'Import aborted, {len(job.errors)} problem(s) found',
+                   'errors': job.errors, 'rows': job.count}
+            return
+        yield {'success': True, 'message': f'Imported {job.count} rows ({policy}), {len(changed)} bins changed',
+               'rows': job.count, 'changed': len(changed)}
+    
+    if request.args.get('progress'):
+        lines = (json.dumps(event) + "\n" for event in run())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    for event in run():
+        result = event
+    return jsonify(result)
+
+@bp.route("/update-bin", methods=['POST'])
 def update_bin():
     data = request.get_json()
     name = data.get('name', '').strip()
     quantity = data.get('quantity', '').strip()
     location = data.get('location', '').strip()
     original_location = data.get('original_location', '').strip()
+    threshold = data.get('threshold')
     try:
         quantity = int(quantity)
+        threshold = int(threshold) if threshold not in (None, '') else None
     except Exception:
-        return jsonify({'success': False, 'error': 'Invalid quantity'})
+        return jsonify({'success': False, 'error': 'Invalid quantity or threshold'})
+    if threshold is not None and threshold < 0:
+        return jsonify({'success': False, 'error': 'Threshold cannot be negative'})
     with csv_lock:
-        bins = load_bins()
-        b = find_bin(bins, original_location)
+        b = load_bin(original_location)
         if not b:
             return jsonify({'success': False, 'error': 'Original bin not found'})
+        before = b.to_dict()
         b.name = name
         b.quantity = quantity
         b.location = location
-        save_bins(bins)
+        if threshold is not None:
+            b.threshold = threshold
+        try:
+            save_bin(b, original_location)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+        record_row_usage(before, b.to_dict())
         
         # Update current_bin_obj if it's the one being updated
         with state_lock:
@@ -452,10 +997,20 @@ def update_bin():
                 current_bin_obj.name = name
                 current_bin_obj.quantity = quantity
                 current_bin_obj.location = location
+    notify_status_change()
     return jsonify({'success': True})
 
-@app.route("/update-all-bins", methods=['POST'])
+@bp.route("/bin/<location>")
+def get_bin(location):
+    """Return a single bin so the web table can edit one row in place"""
+    b = load_bin(location.strip().upper())
+    if not b:
+        return jsonify({'success': False, 'error': f'{location} not found'})
+    return jsonify({'success': True, 'bin': b.to_dict()})
+
+@bp.route("/update-all-bins", methods=['POST'])
 def update_all_bins():
+    """Apply sparse row diffs: each change carries original_location plus only the edited fields"""
     if not request.is_json:
         return jsonify({'success': False, 'error': 'Invalid request format'})
     
@@ -467,68 +1022,117 @@ def update_all_bins():
     
     try:
         with csv_lock:
-            bins = load_bins()
+            # Fetch only the edited bins, indexed by their locations before this batch
+            rows_before = store.get_many(str(change.get('original_location', '')).strip() for change in changes)
+            bins_by_location = {location: Bin.from_dict(row) for location, row in rows_before.items()}
+            updated = []
             
             # Process all changes
             for change in changes:
-                name = change.get('name', '').strip()
-                quantity = change.get('quantity', '').strip()
-                location = change.get('location', '').strip()
-                original_location = change.get('original_location', '').strip()
-                
-                try:
-                    quantity = int(quantity)
-                except ValueError:
-                    return jsonify({'success': False, 'error': f'Invalid quantity for {original_location}'})
+                original_location = str(change.get('original_location', '')).strip()
                 
                 # Find the bin to update
-                b = find_bin(bins, original_location)
+                b = bins_by_location.get(original_location)
                 if not b:
                     return jsonify({'success': False, 'error': f'Original bin {original_location} not found'})
                 
-                # Update the bin
-                b.name = name
-                b.quantity = quantity
-                b.location = location
+                changed = False
+                if 'name' in change:
+                    name = str(change['name']).strip()
+                    if name != b.name:
+                        b.name = name
+                        changed = True
+                if 'quantity' in change:
+                    try:
+                        quantity = int(str(change['quantity']).strip())
+                    except ValueError:
+                        return jsonify({'success': False, 'error': f'Invalid quantity for {original_location}'})
+                    if quantity != b.quantity:
+                        b.quantity = quantity
+                        changed = True
+                if 'location' in change:
+                    location = str(change['location']).strip()
+                    if location and location != b.location:
+                        b.location = location
+                        changed = True
+                if 'threshold' in change:
+                    try:
+                        threshold = int(str(change['threshold']).strip() or 0)
+                    except ValueError:
+                        return jsonify({'success': False, 'error': f'Invalid threshold for {original_location}'})
+                    if threshold < 0:
+                        return jsonify({'success': False, 'error': f'Negative threshold for {original_location}'})
+                    if threshold != b.threshold:
+                        b.threshold = threshold
+                        changed = True
+                
+                if changed:
+                    updated.append((original_location, b))
+            
+            if not updated:
+                return jsonify({'success': True, 'message': 'No changes to save'})
             
-            # Save all changes
-            save_bins(bins)
+            # Save all changes in a single write
+            store.upsert_many([(original_location, b.to_dict()) for original_location, b in updated])
+            bins_changed()
+            for original_location, b in updated:
+                track_occupancy(b, original_location)
+                track_stock(b, original_location)
+                record_row_usage(rows_before[original_location], b.to_dict())
+            if replicator:
+                for original_location, b in updated:
+                    if original_location != b.location:
+                        replicator.local_set(original_location, "", 0)
+                    replicator.local_set(b.location, b.name, b.quantity)
             
             # Update current_bin_obj if it's one of the bins being updated
             with state_lock:
                 global current_bin_obj
                 if current_bin_obj:
-                    for change in changes:
-                        original_location = change.get('original_location', '').strip()
+                    for original_location, updated_bin in updated:
                         if current_bin_obj.location == original_location:
-                            # Reload the current bin from the updated data
-                            updated_bin = find_bin(bins, original_location)
-                            if updated_bin:
-                                current_bin_obj.name = updated_bin.name
-                                current_bin_obj.quantity = updated_bin.quantity
-                                current_bin_obj.location = updated_bin.location
+                            current_bin_obj.name = updated_bin.name
+                            current_bin_obj.quantity = updated_bin.quantity
+                            current_bin_obj.location = updated_bin.location
                             break
+            notify_status_change()
             
-        return jsonify({'success': True, 'message': f'Updated {len(changes)} bins successfully'})
+        return jsonify({'success': True, 'message': f'Updated {len(updated)} bins successfully'})
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error updating bins: {str(e)}'})
 
-def start_flask():
+def start_flask(host="0.0.0.0", port=5000):
     import logging
     log = logging.getLogger('werkzeug')
     log.setLevel(logging.ERROR)
     
     # Run Flask in a way that can be interrupted
     try:
-        app.run(host="0.0.0.0", port=5000, use_reloader=False)
+        create_app().run(host=host, port=port, use_reloader=False)
     except KeyboardInterrupt:
         print("Flask server terminated.")
     finally:
         print("Flask server shutdown complete.")
 
+def start_async_server(host="0.0.0.0", port=5000):
+    """Serve the same app from asyncio: idle /events clients cost a coroutine, not a thread"""
+    from async_server import AsyncServer
+    server = AsyncServer(create_app(), get_current_status, get_watch(), shutdown_event)
+    status_listeners.append(server.status_changed)
+    try:
+        server.run(host, port)
+    except KeyboardInterrupt:
+        print("Async server terminated.")
+    finally:
+        status_listeners.remove(server.status_changed)
+        print("Async server shutdown complete.")
+
 def start_tkinter_gui():
     """Start the Tkinter GUI"""
+    os.environ["DISPLAY"] = ":0"
+    import tkinter as tk
+    from tkinter import messagebox
     
     # Create main window
     root = tk.Tk()
@@ -541,9 +1145,13 @@ def start_tkinter_gui():
     current_col = None
     current_bin = None
     
-    # Valid rows and columns
-    valid_rows = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
-    valid_cols = [1, 2, 3, 4, 5, 6, 7, 8]
+    # Heatmap colors for the selection matrix
+    empty_color = (0x34, 0x49, 0x5e)
+    full_color = (0xe6, 0x7e, 0x22)
+    
+    def heat_color(fraction):
+        """Blend from the empty to the full color by the fraction of slots in use"""
+        return '#%02x%02x%02x' % tuple(int(e + (f - e) * fraction) for e, f in zip(empty_color, full_color))
     
     # Create main frame
     main_frame = tk.Frame(root, bg='#2c3e50')
@@ -553,6 +1161,28 @@ def start_tkinter_gui():
     content_frame = tk.Frame(main_frame, bg='#2c3e50')
     content_frame.pack(expand=True, fill='both')
     
+    # Low-stock banner above the content, shown for a while after each alert
+    alert_label = tk.Label(main_frame, text="", font=('Arial', 14, 'bold'), fg='white', wraplength=740)
+    alert_hide = None
+    get_watch().add_notifier(CallbackNotifier(lambda alert: gui_event_queue.put(("STOCK_ALERT", alert))))
+    
+    def show_gui_events():
+        """Handle events queued by other threads (stock alerts from the watch engine)"""
+        nonlocal alert_hide
+        while True:
+            try:
+                kind, payload = gui_event_queue.get_nowait()
+            except queue.Empty:
+                return
+            if kind != "STOCK_ALERT":
+                continue
+            alert_label.config(text=describe(payload),
+                               bg='#27ae60' if payload['kind'] == 'restocked' else '#c0392b')
+            alert_label.pack(fill='x', pady=(0, 10), before=content_frame)
+            if alert_hide:
+                root.after_cancel(alert_hide)
+            alert_hide = root.after(15000, alert_label.pack_forget)
+    
     def go_home():
         """Clear current bin and return to home (row selection)"""
         nonlocal current_row, current_col, current_bin
@@ -566,11 +1196,12 @@ def start_tkinter_gui():
         with state_lock:
             global current_bin_obj
             current_bin_obj = None
+        notify_status_change()
         
         # Show home screen (row selection)
         show_home_screen()
     
-    def create_centered_matrix(parent, items, command_func, title_text):
+    def create_centered_matrix(parent, items, command_func, title_text, colors=None):
         """Create a centered 2x5 matrix of buttons"""
         # Clear content frame
         for widget in content_frame.winfo_children():
@@ -599,7 +1230,7 @@ def start_tkinter_gui():
             btn = tk.Button(matrix_frame, text=str(item), 
                            font=('Arial', 16, 'bold'),
                            width=8, height=3,
-                           bg='#34495e', fg='white',
+                           bg=colors[i] if colors else '#34495e', fg='white',
                            activebackground='#3498db',
                            command=lambda x=item: command_func(x))
             btn.grid(row=row_num, column=col_num, padx=10, pady=10)
@@ -614,7 +1245,9 @@ def start_tkinter_gui():
     
     def show_home_screen():
         """Show home screen (row selection)"""
-        create_centered_matrix(content_frame, valid_rows, select_row, "Select Bin Row:")
+        grid = get_occupancy()
+        colors = [heat_color(grid.row_fill(row)) for row in valid_rows]
+        create_centered_matrix(content_frame, valid_rows, select_row, "Select Bin Row:", colors)
         
     def show_row_selection():
         """Show row selection screen (same as home screen now)"""
@@ -628,7 +1261,8 @@ def start_tkinter_gui():
     
     def show_column_selection():
         """Show column selection screen"""
-        create_centered_matrix(content_frame, valid_cols, select_column, f"Selected Row: {current_row}\nSelect Bin Column:")
+        colors = [heat_color(1 if occupied else 0) for occupied in get_occupancy().row_occupancy(current_row)]
+        create_centered_matrix(content_frame, valid_columns, select_column, f"Selected Row: {current_row}\nSelect Bin Column:", colors)
     
     def select_column(col):
         """Handle column selection"""
@@ -656,8 +1290,7 @@ def start_tkinter_gui():
         bin_label.pack(pady=(0, 20))
         
         # Load and display bin contents
-        bins = load_bins()
-        bin_obj = find_bin(bins, current_bin)
+        bin_obj = load_bin(current_bin)
         
         # Content display frame
         content_display_frame = tk.Frame(content_frame, bg='#2c3e50')
@@ -811,20 +1444,21 @@ def start_tkinter_gui():
                 messagebox.showerror("Error", "Quantity cannot be negative")
                 return
             
-            # Load bins and update
-            bins = load_bins()
-            bin_obj = find_bin(bins, current_bin)
-            
-            if not bin_obj:
-                # Create new bin if it doesn't exist
-                bin_obj = Bin("", 0, current_bin)
-                bins.append(bin_obj)
-            
-            bin_obj.quantity = new_quantity
-            if new_quantity == 0:
-                bin_obj.name = ""  # Clear name if quantity is 0
-            
-            save_bins(bins)
+            # Load the bin and update
+            with csv_lock:
+                bin_obj = load_bin(current_bin)
+                
+                if not bin_obj:
+                    # Create new bin if it doesn't exist
+                    bin_obj = Bin("", 0, current_bin)
+                
+                name, before = bin_obj.name, bin_obj.quantity
+                bin_obj.quantity = new_quantity
+                if new_quantity == 0:
+                    bin_obj.name = ""  # Clear name if quantity is 0
+                
+                save_bin(bin_obj)
+                record_usage(current_bin, name, before, new_quantity)
             messagebox.showinfo("Success", f"Quantity updated to {new_quantity}")
             show_edit_screen()
             
@@ -843,14 +1477,17 @@ def start_tkinter_gui():
                                    f"This will remove {bin_obj.name} (Qty: {bin_obj.quantity})")
         
         if result:
-            # Load bins and clear
-            bins = load_bins()
-            bin_obj = find_bin(bins, current_bin)
+            # Load the bin and clear
+            with csv_lock:
+                bin_obj = load_bin(current_bin)
+                if bin_obj:
+                    before = bin_obj.to_dict()
+                    bin_obj.name = ""
+                    bin_obj.quantity = 0
+                    save_bin(bin_obj)
+                    record_row_usage(before, bin_obj.to_dict())
             
             if bin_obj:
-                bin_obj.name = ""
-                bin_obj.quantity = 0
-                save_bins(bins)
                 messagebox.showinfo("Success", f"Bin {current_bin} has been cleared")
                 show_edit_screen()
     
@@ -862,7 +1499,7 @@ def start_tkinter_gui():
         # Create a simple dialog for manual entry
         dialog = tk.Toplevel()
         dialog.title("Add to Bin")
-        dialog.geometry("400x300")
+        dialog.geometry("400x360")
         dialog.configure(bg='#2c3e50')
         dialog.transient(root)  # Make dialog modal
         dialog.grab_set()
@@ -881,6 +1518,26 @@ def start_tkinter_gui():
                             bg='#2c3e50', fg='white')
         bin_label.pack(pady=(0, 20))
         
+        # Offer the nearest free bin if this one already holds stock
+        grid = get_occupancy()
+        suggestion = grid.nearest_free(current_bin) if grid.is_occupied(current_bin) else None
+        if suggestion:
+            def use_suggestion():
+                nonlocal current_bin
+                current_bin = suggestion
+                bin_label.config(text=f"Bin: {current_bin}")
+                suggestion_frame.destroy()
+            
+            suggestion_frame = tk.Frame(dialog, bg='#2c3e50')
+            suggestion_frame.pack(pady=(0, 10))
+            tk.Label(suggestion_frame, text=f"Bin is occupied. Nearest free bin: {suggestion}",
+                     font=('Arial', 11), bg='#2c3e50', fg='#f39c12').pack(side='left')
+            tk.Button(suggestion_frame, text=f"Use {suggestion}",
+                      font=('Arial', 10, 'bold'),
+                      bg='#3498db', fg='white',
+                      activebackground='#2980b9',
+                      command=use_suggestion).pack(side='left', padx=10)
+        
         # Input frame
         input_frame = tk.Frame(dialog, bg='#2c3e50')
         input_frame.pack(pady=10)
@@ -925,18 +1582,19 @@ def start_tkinter_gui():
                 messagebox.showerror("Error", "Please enter a valid quantity")
                 return
             
-            # Load bins and add item
-            bins = load_bins()
-            bin_obj = find_bin(bins, current_bin)
-            
-            if not bin_obj:
-                bin_obj = Bin(name, quantity, current_bin)
-                bins.append(bin_obj)
-            else:
-                bin_obj.name = name
-                bin_obj.quantity = quantity
-            
-            save_bins(bins)
+            # Load the bin and add item
+            with csv_lock:
+                bin_obj = load_bin(current_bin)
+                before = bin_obj.to_dict() if bin_obj else None
+                
+                if not bin_obj:
+                    bin_obj = Bin(name, quantity, current_bin)
+                else:
+                    bin_obj.name = name
+                    bin_obj.quantity = quantity
+                
+                save_bin(bin_obj)
+                record_row_usage(before, bin_obj.to_dict())
             messagebox.showinfo("Success", f"Added {name} (Qty: {quantity}) to bin {current_bin}")
             dialog.destroy()
             show_edit_screen()
@@ -987,6 +1645,7 @@ def start_tkinter_gui():
     # Start the GUI with shutdown checking
     try:
         while not shutdown_event.is_set():
+            show_gui_events()
             root.update()
             time.sleep(0.1)  # Small delay to allow checking shutdown event
     except tk.TclError:
@@ -995,29 +1654,108 @@ def start_tkinter_gui():
     finally:
         print("Tkinter GUI shutdown complete.")
 
-# === THREADING ===
-# Start Flask server thread
-flask_thread = threading.Thread(target=start_flask, daemon=True)
-flask_thread.start()
-
-# Start Tkinter GUI (this will block until GUI closes)
-try:
-    start_tkinter_gui()
-except KeyboardInterrupt:
-    print("\nReceived interrupt signal...")
-finally:
-    # Set shutdown event to stop all threads
-    shutdown_event.set()
-    
-    # Wait for threads to finish (with timeout)
-    print("Waiting for threads to finish...")
-    flask_thread.join(timeout=2)
+# === ENTRY POINTS ===
+MODES = {
+    # mode: (web server, encoder, Tk GUI)
+    'all': (True, True, True),
+    'web': (True, False, False),
+    'kiosk': (False, True, True),
+    'encoder': (False, True, False),
+}
+
+def main(argv=None):
+    global admin_token
+    parser = argparse.ArgumentParser(description="MiniBench Inventory Management System")
+    parser.add_argument("--mode", choices=sorted(MODES), default="all",
+                        help="subsystems to start (default: all)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--server", choices=["threaded", "async"], default="threaded",
+                        help="web server: Flask's threaded server or the asyncio one for many live clients")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv",
+                        help="where bins are kept (default: inventory.csv)")
+    parser.add_argument("--db", help="SQLite database path (default: inventory.db next to app.py)")
+    parser.add_argument("--inventory", help="CSV inventory path (default: inventory.csv next to app.py)")
+    parser.add_argument("--rows", default="".join(valid_rows), help="cabinet row letters (default: ABCDEFGH)")
+    parser.add_argument("--columns", type=int, default=len(valid_columns), help="cabinet columns (default: 8)")
+    parser.add_argument("--peer", action="append", default=[],
+                        help="URL of another MiniBench to replicate with (repeatable)")
+    parser.add_argument("--node-id", help="replication id for this unit (default: hostname:port)")
+    parser.add_argument("--oplog", help="replication op log (default: next to the inventory)")
+    parser.add_argument("--replication-token", default=os.environ.get("MINIBENCH_REPLICATION_TOKEN"),
+                        help="secret shared by replicating units (default: $MINIBENCH_REPLICATION_TOKEN)")
+    parser.add_argument("--admin-token", help="enables /admin endpoints (default: $MINIBENCH_ADMIN_TOKEN)")
+    parser.add_argument("--notify", action="append", default=[],
+                        help="low-stock alert target: file:<path> or a webhook URL (repeatable)")
+    args = parser.parse_args(argv)
+    use_web, use_encoder, use_gui = MODES[args.mode]
+    start_web = start_async_server if args.server == "async" else start_flask
     
-    # Close GPIO resources
+    configure_cabinet(args.rows.upper(), args.columns)
+    if args.admin_token:
+        admin_token = args.admin_token
+    if args.inventory:
+        configure_storage("csv", os.path.abspath(args.inventory))
+    if args.storage == "sqlite":
+        configure_storage("sqlite", args.db)
     try:
-        button.close()
-        encoder.close()
-    except:
-        pass
+        for target in args.notify:
+            make_notifier(target)
+    except ValueError as e:
+        parser.error(str(e))
+    notify_targets.extend(args.notify)
+    get_watch()
+    if args.peer or args.node_id:
+        if not args.replication_token:
+            parser.error("replication needs --replication-token or MINIBENCH_REPLICATION_TOKEN")
+        node_id = args.node_id or f"{socket.gethostname()}:{args.port}"
+        oplog = args.oplog or os.path.splitext(store.path)[0] + ".oplog.jsonl"
+        configure_replication(node_id, args.peer, oplog, args.replication_token).start(shutdown_event)
     
-    print("Application shutdown complete.")
+    # Register signal handler
+    signal.signal(signal.SIGINT, signal_handler)
+    
+    if use_encoder:
+        init_encoder()
+    
+    flask_thread = None
+    try:
+        if use_web and not use_gui:
+            # Headless web node: serve from the main thread
+            start_web(args.host, args.port)
+        else:
+            if use_web:
+                # Start Flask server thread
+                flask_thread = threading.Thread(target=start_web, args=(args.host, args.port), daemon=True)
+                flask_thread.start()
+            
+            if use_gui:
+                # Start Tkinter GUI (this will block until GUI closes)
+                start_tkinter_gui()
+            else:
+                # Encoder only: callbacks run on gpiozero's threads
+                while not shutdown_event.wait(1):
+                    pass
+    except KeyboardInterrupt:
+        print("\nReceived interrupt signal...")
+    finally:
+        # Set shutdown event to stop all threads
+        shutdown_event.set()
+        
+        # Wait for threads to finish (with timeout)
+        if flask_thread:
+            print("Waiting for threads to finish...")
+            flask_thread.join(timeout=2)
+        
+        # Close GPIO resources
+        close_encoder()
+        
+        # Save the usage rollups so the next start replays only new events
+        if usage_log:
+            usage_log.flush()
+        store.close()
+        
+        print("Application shutdown complete.")
+
+if __name__ == "__main__":
+    main()
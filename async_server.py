@@ -0,0 +1,426 @@
+import asyncio
+import json
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug import exceptions as http_errors
+
+# === ASYNC SERVER ===
+# An asyncio HTTP/1.1 front end for many long-lived clients (kiosks, browser
+# tabs following /events). Idle connections are coroutines waiting on a
+# socket, not threads. /events is served here directly: one broadcaster
+# builds each status payload once and every subscriber writes it out.
+# Every other route is the Flask app from app.py, called through WSGI on a
+# small thread pool, so route code and its blocking store/CSV writes stay as
+# they are and never run on the event loop. Request bodies are read from the
+# socket as the route consumes them and streamed responses (exports, import
+# progress) are written with backpressure, both from the worker thread.
+#
+#   python3 app.py --mode web --server async
+
+WORKERS = 8                    # threads for Flask routes and blocking persistence
+KEEPALIVE_SECONDS = 15
+IDLE_TIMEOUT = 75              # close keep-alive connections idle this long
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+DISCARD_BYTES = 64 * 1024      # unread body drained to keep a connection; more and it is closed
+READ_SIZE = 64 * 1024
+REASONS = {400: 'Bad Request', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large'}
+
+class BadRequest(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+
+class StatusBroadcaster:
+    """Wakes /events subscribers when app.notify_status_change() runs on any thread"""
+    def __init__(self, loop, get_status):
+        self.loop = loop
+        self.get_status = get_status
+        self.version = 0
+        self.changed = asyncio.Event()
+        self._payload = (None, None)
+        self._building = (None, None)     # (version, future) of the payload being built
+
+    def notify(self):
+        # Called from Flask workers, gpiozero callbacks and the Tk thread
+        self.loop.call_soon_threadsafe(self._bump)
+
+    def _bump(self):
+        self.version += 1
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def payload(self):
+        """The current status as SSE data, built once per change however many subscribers read it"""
+        version, data = self._payload
+        if version == self.version:
+            return data
+        version, building = self._building
+        if version != self.version:
+            building = asyncio.ensure_future(self._build(self.version))
+            self._building = (self.version, building)
+        # shield: one subscriber going away must not cancel the build the others wait on
+        return await asyncio.shield(building)
+
+    async def _build(self, version):
+        # get_status waits on state_lock, which the encoder, Tk and Flask threads hold; keep it off the event loop
+        status = await self.loop.run_in_executor(None, self.get_status)
+        data = f"data: {json.dumps(status)}\n\n".encode()
+        if self._payload[0] is None or version > self._payload[0]:
+            self._payload = (version, data)
+        return data
+
+class AsyncServer:
+    def __init__(self, wsgi_app, get_status, watch, shutdown_event, workers=WORKERS):
+        """wsgi_app is create_app(); watch is the low-stock WatchEngine (its alerts go out on /events)"""
+        self.wsgi_app = wsgi_app
+        self.get_status = get_status
+        self.watch = watch
+        self.shutdown_event = shutdown_event
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-web")
+        self.broadcaster = None
+        self.connections = {}       # writer -> handler task
+        self.subscribers = 0
+
+    def status_changed(self):
+        if self.broadcaster is not None:
+            self.broadcaster.notify()
+
+    def run(self, host="0.0.0.0", port=5000):
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(self.executor)
+        self.broadcaster = StatusBroadcaster(loop, self.get_status)
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Async server listening on {host}:{port}")
+        async with server:
+            while not self.shutdown_event.is_set():
+                await asyncio.sleep(0.5)
+            # Let /events loops see the shutdown and drop idle keep-alive connections
+            self.broadcaster._bump()
+            for writer in list(self.connections):
+                writer.close()
+            if self.connections:
+                await asyncio.wait(list(self.connections.values()), timeout=2)
+        self.executor.shutdown(wait=False)
+
+    # --- connections ---
+    async def handle(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while not self.shutdown_event.is_set():
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except BadRequest as e:
+                    await write_error(writer, e.status, str(e))
+                    break
+                if request is None:
+                    break
+                # Match the path Flask would route, so /%65vents can't reach the endless WSGI stream
+                path = urllib.parse.unquote_to_bytes(request['path']).decode('latin-1')
+                if path == '/events' and request['method'] in ('GET', 'HEAD'):
+                    await self.serve_events(writer, head_only=request['method'] == 'HEAD')
+                    break
+                if not await self.serve_wsgi(request, reader, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client went away, or a line longer than the stream limit
+        except Exception as e:
+            print(f"Error serving request: {e}")
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_events(self, writer, head_only=False):
+        """Same stream as app.status_events(): status on every change, stock alerts as 'stock' events"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"X-Accel-Buffering: no\r\nConnection: close\r\n\r\n")
+        if head_only:
+            await writer.drain()
+            return
+        b = self.broadcaster
+        seen = None
+        seen_alert = self.watch.seq
+        self.subscribers += 1
+        try:
+            while not self.shutdown_event.is_set():
+                if b.version == seen:
+                    try:
+                        await asyncio.wait_for(b.changed.wait(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        writer.write(b": keepalive\n\n")
+                        await writer.drain()
+                    continue
+                seen = b.version
+                for alert in self.watch.since(seen_alert):
+                    seen_alert = alert['seq']
+                    writer.write(f"event: stock\ndata: {json.dumps(alert)}\n\n".encode())
+                writer.write(await b.payload())
+                await writer.drain()
+        finally:
+            self.subscribers -= 1
+
+    async def serve_wsgi(self, request, reader, writer):
+        """Run a Flask route on the pool; returns whether the connection can be reused"""
+        loop = asyncio.get_running_loop()
+        body = RequestBody(reader, writer, loop, request)
+        environ = wsgi_environ(request, writer, body)
+
+        def send(data):
+            # Worker thread -> event loop; waits for drain so large exports don't pile up in memory
+            body.responded = True
+            asyncio.run_coroutine_threadsafe(write_and_drain(writer, data), loop).result()
+
+        keep_alive = await loop.run_in_executor(self.executor, run_wsgi, self.wsgi_app, environ, send,
+                                                request['keep_alive'])
+        # The next request starts after this one's body; skip what the route didn't read
+        return keep_alive and not body.failed and await body.discard()
+
+# === HTTP/1.1 ===
+async def read_request(reader):
+    """Parse one request line and its headers; None at a clean end of the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise BadRequest(400, "Malformed request line")
+    headers = []
+    size = len(line)
+    while True:
+        line = await reader.readline()
+        size += len(line)
+        if size > MAX_HEADER_BYTES:
+            raise BadRequest(431, "Headers too large")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers.append((name.strip().lower(), value.strip()))
+    fields = dict(headers)
+    chunked = fields.get('transfer-encoding', '').lower() == 'chunked'
+    length = None
+    if not chunked:
+        try:
+            length = int(fields.get('content-length', 0))
+        except ValueError:
+            raise BadRequest(400, "Invalid Content-Length")
+        if length < 0:
+            raise BadRequest(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise BadRequest(413, "Request body too large")
+    path, _, query = target.partition("?")
+    connection = fields.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return {'method': method.upper(), 'path': path, 'query': query, 'version': version,
+            'headers': headers, 'length': length, 'chunked': chunked, 'keep_alive': keep_alive,
+            'expect_continue': fields.get('expect', '').lower() == '100-continue'}
+
+class RequestBody:
+    """wsgi.input: the request body, read from the socket as the route asks for it.
+
+    read()/readline() run on a worker thread and hand each socket read to the
+    event loop, so an upload is never held in memory as a whole. A client that
+    sent Expect: 100-continue is told to go ahead on the first read. A bad
+    chunked body reaches the route as a werkzeug 400/413, as Flask expects.
+    """
+    def __init__(self, reader, writer, loop, request):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.chunked = request['chunked']
+        self.remaining = request['length'] or 0    # Content-Length bytes not yet read
+        self.chunk_left = 0
+        self.received = 0
+        self.done = not self.chunked and not self.remaining
+        self.expect_continue = request['expect_continue'] and not self.done
+        self.responded = False
+        self.failed = False
+        self.buffer = bytearray()
+
+    # --- event loop side ---
+    async def _read_some(self, size):
+        """Up to size bytes of the body; b"" at its end"""
+        if self.expect_continue:
+            self.expect_continue = False
+            if not self.responded:
+                await write_and_drain(self.writer, b"HTTP/1.1 100 Continue\r\n\r\n")
+        if self.done:
+            return b""
+        if self.chunked and not self.chunk_left:
+            try:
+                self.chunk_left = int((await self.reader.readline()).split(b";")[0], 16)
+            except ValueError:
+                self.failed = True
+                raise http_errors.BadRequest("Invalid chunk size")
+            if not self.chunk_left:
+                # Skip trailers
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.done = True
+                return b""
+            if self.received + self.chunk_left > MAX_BODY_BYTES:
+                self.failed = True
+                raise http_errors.RequestEntityTooLarge()
+        left = self.chunk_left if self.chunked else self.remaining
+        data = await self.reader.read(min(size, left))
+        if not data:
+            self.failed = True
+            raise http_errors.ClientDisconnected()
+        self.received += len(data)
+        if self.chunked:
+            self.chunk_left -= len(data)
+            if not self.chunk_left:
+                await self.reader.readline()    # CRLF after the chunk
+        else:
+            self.remaining -= len(data)
+            self.done = not self.remaining
+        return data
+
+    async def discard(self):
+        """Skip the unread rest of the body; False if the connection can't be reused"""
+        if self.expect_continue:
+            return False    # never told the client to send it
+        skipped = 0
+        try:
+            while not self.done:
+                if skipped > DISCARD_BYTES:
+                    return False
+                skipped += len(await self._read_some(READ_SIZE))
+        except http_errors.HTTPException:
+            return False
+        return True
+
+    # --- worker thread side ---
+    def _fill(self, size):
+        data = asyncio.run_coroutine_threadsafe(self._read_some(size), self.loop).result()
+        self.buffer += data
+        return bool(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill(READ_SIZE):
+                pass
+            size = len(self.buffer)
+        while len(self.buffer) < size and self._fill(size - len(self.buffer)):
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while b"\n" not in self.buffer and (size is None or size < 0 or len(self.buffer) < size):
+            if not self._fill(READ_SIZE):
+                break
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and 0 <= size < end:
+            end = size
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+async def write_and_drain(writer, data):
+    writer.write(data)
+    await writer.drain()
+
+async def write_error(writer, status, message):
+    body = message.encode()
+    writer.write(f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\nContent-Type: text/plain\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+
+# === WSGI BRIDGE ===
+def wsgi_environ(request, writer, body):
+    peer = writer.get_extra_info('peername') or ('', 0)
+    sock = writer.get_extra_info('sockname') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': request['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': urllib.parse.unquote_to_bytes(request['path']).decode('latin-1'),
+        'QUERY_STRING': request['query'],
+        'SERVER_NAME': str(sock[0]),
+        'SERVER_PORT': str(sock[1]),
+        'SERVER_PROTOCOL': request['version'],
+        'REMOTE_ADDR': str(peer[0]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': body,
+        'wsgi.input_terminated': request['chunked'],    # read a chunked body to its end, not to a length
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if not request['chunked']:
+        environ['CONTENT_LENGTH'] = str(request['length'])
+    for name, value in request['headers']:
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name not in ('content-length', 'transfer-encoding'):
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def run_wsgi(wsgi_app, environ, send, keep_alive):
+    """Call the app on a worker thread, writing the response through send(); returns keep_alive"""
+    response = {}
+    head_only = environ['REQUEST_METHOD'] == 'HEAD'
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and 'chunked' in response:
+            raise exc_info[1].with_traceback(exc_info[2])  # too late to replace a sent head
+        response['status'], response['headers'] = status, headers
+        return write
+
+    def send_head():
+        nonlocal keep_alive
+        names = {name.lower() for name, _ in response['headers']}
+        # HEAD, 204 and 304 responses never carry a body
+        bodyless = head_only or response['status'][:3] in ('204', '304')
+        # Without a length the body is streamed; HTTP/1.1 clients get it chunked
+        chunked = 'content-length' not in names and environ['SERVER_PROTOCOL'] == 'HTTP/1.1' and not bodyless
+        keep_alive = keep_alive and (chunked or 'content-length' in names or bodyless)
+        head = [f"HTTP/1.1 {response['status']}"]
+        head += [f"{name}: {value}" for name, value in response['headers']]
+        if chunked:
+            head.append("Transfer-Encoding: chunked")
+        head.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        send(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+        response['chunked'], response['bodyless'] = chunked, bodyless
+
+    def write(data):
+        # The head goes out with the first non-empty data, so start_response can still be redone on error
+        if not data:
+            return
+        if 'chunked' not in response:
+            send_head()
+        if not response['bodyless']:
+            send(b"%x\r\n%s\r\n" % (len(data), data) if response['chunked'] else data)
+
+    body = wsgi_app(environ, start_response)
+    try:
+        for chunk in body:
+            write(chunk)
+        if 'chunked' not in response:
+            send_head()
+        if response['chunked']:
+            send(b"0\r\n\r\n")
+        return keep_alive
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
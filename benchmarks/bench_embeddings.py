@@ -0,0 +1,202 @@
+"""Benchmark the part-search embedding backends on our inventory names.
+
+Each configuration (model x fp32/int8) is loaded in a fresh interpreter so
+load time and peak RSS are its own. Queries are derived from the inventory
+names (lowercased, reordered, truncated, misspelled) and ranked over the
+whole catalog by embedding alone; top-1 agreement is measured against
+all-mpnet-base-v2 in fp32, the model embeddingsDemo.py used to hard-code:
+
+    python3 benchmarks/bench_embeddings.py
+    python3 benchmarks/bench_embeddings.py --inventory Expanded_Sample_Inventory.csv --threads 2
+    python3 benchmarks/bench_embeddings.py --compare benchmarks/results/<older>.json
+
+Needs sentence-transformers (and torch); models are downloaded on first use.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+sys.path.insert(0, REPO_DIR)
+
+from embedding_backend import MODELS
+
+REFERENCE = ('mpnet', False)
+
+# Runs in a fresh interpreter; prints load/latency/RSS and top-1 per query as JSON
+CONFIG_SCRIPT = """
+import json, statistics, sys, time
+import numpy as np
+sys.path.insert(0, {repo!r})
+from embedding_backend import EmbeddingBackend
+
+def peak_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+with open({data!r}) as f:
+    data = json.load(f)
+backend = EmbeddingBackend({model!r}, quantize={quantize!r}, threads={threads!r})
+t0 = time.perf_counter()
+catalog = backend.encode(data['names'])
+catalog_seconds = time.perf_counter() - t0
+latencies, top1 = [], []
+for query in data['queries']:
+    t0 = time.perf_counter()
+    vector = backend.encode([query])[0]
+    latencies.append(time.perf_counter() - t0)
+    top1.append(int(np.argmax(catalog @ vector)))
+latencies.sort()
+print(json.dumps({{
+    'load_s': backend.load_seconds,
+    'warmup_s': backend.warmup_seconds,
+    'catalog_ms': catalog_seconds * 1000,
+    'p50_ms': latencies[len(latencies) // 2] * 1000,
+    'p90_ms': latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))] * 1000,
+    'mean_ms': statistics.mean(latencies) * 1000,
+    'dim': int(catalog.shape[1]),
+    'rss_kb': peak_rss_kb(),
+    'top1': top1,
+}}))
+"""
+
+
+# === QUERIES ===
+def read_names(path):
+    with open(path, newline='') as f:
+        return [row[0] for row in csv.reader(f)][1:]
+
+
+def make_queries(names, per_name, seed):
+    """Lookups a person might type for each name: lowercase, reordered, partial, misspelled"""
+    rng = random.Random(seed)
+
+    def typo(text):
+        if len(text) < 4:
+            return text
+        i = rng.randrange(1, len(text) - 1)
+        return text[:i] + text[i + 1:]
+
+    variants = [
+        lambda words: " ".join(words).lower(),
+        lambda words: " ".join(reversed(words)).lower(),
+        lambda words: " ".join(words[1:] or words).lower(),
+        lambda words: typo(" ".join(words).lower()),
+    ]
+    queries = []
+    for name in names:
+        words = name.split()
+        for variant in rng.sample(variants, min(per_name, len(variants))):
+            queries.append(variant(words))
+    return queries
+
+
+# === RUNS ===
+def run_config(model, quantize, threads, data_path):
+    script = CONFIG_SCRIPT.format(repo=REPO_DIR, data=data_path, model=model, quantize=quantize, threads=threads)
+    out = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def print_results(results):
+    print(f"{'config':<18}{'dim':>5}{'load s':>8}{'warm s':>8}{'RSS MB':>8}{'catalog ms':>12}"
+          f"{'p50 ms':>9}{'p90 ms':>9}{'top-1 agree':>13}")
+    for r in results:
+        print(f"{r['config']:<18}{r['dim']:>5}{r['load_s']:>8.1f}{r['warmup_s']:>8.2f}{r['rss_kb'] / 1024:>8.0f}"
+              f"{r['catalog_ms']:>12.0f}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['top1_agreement']:>13.1%}")
+
+
+def compare_results(results, baseline_path, threshold):
+    """Flag configs whose query p50 got slower by more than threshold % or that agree less with mpnet"""
+    with open(baseline_path) as f:
+        baseline = {r['config']: r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get(r['config'])
+        if not old or not old['p50_ms']:
+            continue
+        change = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        flag = ""
+        if change > threshold or r['top1_agreement'] < old['top1_agreement']:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"  {r['config']:<18}p50 {old['p50_ms']:.1f} -> {r['p50_ms']:.1f} ms ({change:+.1f}%), "
+              f"agreement {old['top1_agreement']:.1%} -> {r['top1_agreement']:.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inventory", default=os.path.join(REPO_DIR, "inventory.csv"),
+                        help="CSV whose first column holds the part names")
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=[m for m in MODELS if m != 'mpnet'])
+    parser.add_argument("--precision", nargs="+", choices=["fp32", "int8"], default=["fp32", "int8"])
+    parser.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+    parser.add_argument("--queries-per-name", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p50 slowdown (%%) reported as a regression")
+    args = parser.parse_args()
+
+    names = read_names(args.inventory)
+    queries = make_queries(names, args.queries_per_name, args.seed)
+    configs = [REFERENCE] + [(m, p == "int8") for m in args.models for p in args.precision
+                             if (m, p == "int8") != REFERENCE]
+    print(f"{len(names)} names, {len(queries)} queries, {len(configs)} configurations")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({'names': names, 'queries': queries}, f)
+        data_path = f.name
+    results = []
+    try:
+        for model, quantize in configs:
+            config = f"{model}{' int8' if quantize else ''}"
+            print(f"  {config}...")
+            r = run_config(model, quantize, args.threads, data_path)
+            r['config'] = config
+            results.append(r)
+    finally:
+        os.unlink(data_path)
+
+    reference = results[0]['top1']
+    for r in results:
+        top1 = r.pop('top1')
+        r['top1_agreement'] = sum(a == b for a, b in zip(top1, reference)) / len(reference)
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime("embeddings_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'args': vars(args),
+            'names': len(names),
+            'queries': len(queries),
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare and compare_results(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Benchmark app.py's inventory hot paths against synthetic inventories.
+
+Runs in-process against create_app() with gpiozero replaced by stubs, so it
+works on a laptop as well as on the Pi. Results are written as JSON and can be
+compared against an earlier run:
+
+    python3 benchmarks/bench_inventory.py --sizes 64 1000 10000
+    python3 benchmarks/bench_inventory.py --compare benchmarks/results/<older>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+PART_NAMES = [
+    "Resistor 10kΩ", "Resistor 4.7kΩ", "Capacitor 100µF", "Capacitor 0.1µF",
+    "LED Red", "LED Green", "Arduino Nano", "Jumper Wires", "Diode 1N4148",
+    "Transistor 2N2222", "Voltage Regulator 7805", "Potentiometer 10kΩ",
+    "Photoresistor", "Crystal 16MHz", "Header 2.54mm", "Push Button",
+]
+
+
+# === HARDWARE STUBS ===
+class StubDevice:
+    """Stands in for gpiozero's Button and RotaryEncoder"""
+    def __init__(self, *args, **kwargs):
+        self.when_pressed = None
+        self.when_rotated_clockwise = None
+        self.when_rotated_counter_clockwise = None
+
+    def close(self):
+        pass
+
+
+def install_stubs():
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.Button = StubDevice
+    gpiozero.RotaryEncoder = StubDevice
+    sys.modules["gpiozero"] = gpiozero
+
+
+def import_app():
+    install_stubs()
+    sys.path.insert(0, REPO_DIR)
+    import app
+    app.init_encoder()
+    return app
+
+
+# Peak RSS of the child itself. ru_maxrss survives exec on Linux, so it would
+# report this (already large) benchmark process instead; VmHWM does not.
+PEAK_RSS = """
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+"""
+
+# Run in a fresh interpreter; prints boot time and peak RSS as JSON
+STARTUP_SCRIPT = PEAK_RSS + """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+import app
+flask_app = app.create_app()
+boot = time.perf_counter() - t0
+flask_app.test_client().get('/api/bins?limit=1')
+first_request = time.perf_counter() - t0
+print(json.dumps({{'boot': boot, 'first_request': first_request,
+                  'rss_kb': peak_rss_kb()}}))
+"""
+
+
+# === SYNTHETIC INVENTORIES ===
+def row_label(index):
+    """0 -> A, 25 -> Z, 26 -> AA, ..."""
+    label = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        label = chr(ord('A') + rem) + label
+    return label
+
+
+def synthetic_locations(count):
+    columns = max(8, int(count ** 0.5))
+    return [f"{row_label(i // columns)}{i % columns + 1}" for i in range(count)]
+
+
+def synthetic_bins(app, count):
+    bins = []
+    for i, location in enumerate(synthetic_locations(count)):
+        if i % 5 == 4:
+            bins.append(app.Bin("", 0, location))  # leave some bins empty
+        else:
+            bins.append(app.Bin(PART_NAMES[i % len(PART_NAMES)], 100 + (i * 7) % 500, location))
+    return bins
+
+
+# === MEASUREMENT ===
+def summarize(name, size, samples, wall_time, clients=1):
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    return {
+        'name': name,
+        'size': size,
+        'clients': clients,
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': percentile(50) * 1000,
+        'p90_ms': percentile(90) * 1000,
+        'p99_ms': percentile(99) * 1000,
+        'max_ms': samples[-1] * 1000,
+        'ops_per_sec': len(samples) / wall_time if wall_time else 0.0,
+    }
+
+
+def time_calls(func, repeat):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+def bench_persistence(app, size, repeat):
+    bins = app.load_bins()
+    locations = [b.location for b in bins]
+    results = []
+
+    samples, wall = time_calls(app.load_bins, repeat)
+    results.append(summarize("load_bins", size, samples, wall))
+
+    samples, wall = time_calls(lambda: app.save_bins(bins), repeat)
+    results.append(summarize("save_bins", size, samples, wall))
+
+    # Look up spread-out locations, including the worst case (last bin)
+    targets = [locations[(i * 7919) % len(locations)] for i in range(repeat * 10)]
+    targets[-1] = locations[-1]
+    lookups = iter(targets)
+    samples, wall = time_calls(lambda: app.find_bin(bins, next(lookups)), len(targets))
+    results.append(summarize("find_bin", size, samples, wall))
+    return results
+
+
+def route_requests(locations):
+    """Request factories keyed by benchmark name; each takes a request index"""
+    def spread(i):
+        return locations[(i * 7919) % len(locations)]
+
+    return {
+        "GET /": lambda i: ("GET", "/", {}),
+        "GET /status": lambda i: ("GET", "/status", {}),
+        "GET /dashboard": lambda i: ("GET", "/dashboard", {}),
+        "GET /api/bins": lambda i: ("GET", f"/api/bins?offset={(i * 100) % len(locations)}&limit=100", {}),
+        "GET /api/bins?q": lambda i: ("GET", "/api/bins?q=resistor&sort=Quantity&order=desc", {}),
+        "GET /bin/<location>": lambda i: ("GET", f"/bin/{spread(i)}", {}),
+        "POST /open": lambda i: ("POST", "/open", {'data': {'bin_location': spread(i)}}),
+        "POST /apply-adjustment": lambda i: ("POST", "/apply-adjustment",
+                                             {'json': {'adjustment': -1 if i % 2 else 1}}),
+        "POST /update-bin": lambda i: ("POST", "/update-bin", {'json': {
+            'name': PART_NAMES[i % len(PART_NAMES)], 'quantity': str(10 + i % 90),
+            'location': locations[0], 'original_location': locations[0]}}),
+        "POST /update-all-bins": lambda i: ("POST", "/update-all-bins", {'json': {'changes': [
+            {'original_location': spread(i + k), 'quantity': str(20 + (i + k) % 50)} for k in range(5)]}}),
+    }
+
+
+def bench_routes(app, size, repeat, clients):
+    locations = [b.location for b in app.load_bins()]
+    local = threading.local()
+    results = []
+
+    flask_app = app.create_app()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = flask_app.test_client()
+        return local.client
+
+    for name, make_request in route_requests(locations).items():
+        # Keep a stocked bin open so /apply-adjustment has something to adjust
+        with app.state_lock:
+            app.current_bin_obj = app.Bin("Benchmark Part", 1000, locations[0])
+
+        def one_request(i):
+            method, url, kwargs = make_request(i)
+            t0 = time.perf_counter()
+            response = client().open(url, method=method, **kwargs)
+            elapsed = time.perf_counter() - t0
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned HTTP {response.status_code}")
+            return elapsed
+
+        count = repeat * clients
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            samples = list(pool.map(one_request, range(count)))
+        wall = time.perf_counter() - start
+        results.append(summarize(name, size, samples, wall, clients))
+    return results
+
+
+def bench_encoder(app, size, bursts, steps):
+    """Simulate fast encoder spins followed by a button press to commit"""
+    location = app.load_bins()[0].location
+    step_samples = []
+    commit_samples = []
+    start = time.perf_counter()
+    for burst in range(bursts):
+        with app.state_lock:
+            app.current_bin_obj = app.Bin("Benchmark Part", 1000, location)
+        # Alternate direction so the bin never runs empty
+        rotate = (app.encoder.when_rotated_counter_clockwise if burst % 2
+                  else app.encoder.when_rotated_clockwise)
+        for _ in range(steps):
+            t0 = time.perf_counter()
+            rotate()
+            step_samples.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        app.button.when_pressed()
+        commit_samples.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - start
+    with app.state_lock:
+        app.current_bin_obj = None
+    return [
+        summarize("encoder step", size, step_samples, wall),
+        summarize("encoder commit", size, commit_samples, wall),
+    ]
+
+
+def bench_startup(repeat):
+    """Cold start of a headless web node: import + create_app(), then the first request"""
+    boots, first_requests, rss = [], [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT.format(repo=REPO_DIR)],
+                             check=True, capture_output=True, text=True).stdout
+        run = json.loads(out.strip().splitlines()[-1])
+        boots.append(run['boot'])
+        first_requests.append(run['first_request'])
+        rss.append(run['rss_kb'])
+    results = [
+        summarize("startup: create_app", 0, boots, sum(boots)),
+        summarize("startup: first request", 0, first_requests, sum(first_requests)),
+    ]
+    for r in results:
+        r['rss_kb'] = max(rss)
+    return results
+
+
+# Cold load of one inventory in a fresh interpreter, with or without the snapshot
+COLD_LOAD_SCRIPT = PEAK_RSS + """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+from storage import CsvStore
+store = CsvStore({path!r}, use_snapshot={use_snapshot!r})
+store.get({location!r})
+first_get = time.perf_counter() - t0
+store.all()
+print(json.dumps({{'first_get': first_get, 'all': time.perf_counter() - t0,
+                  'rss_kb': peak_rss_kb()}}))
+"""
+
+
+def bench_cold_load(app, size, repeat):
+    """inventory.csv via pd.read_csv versus the memory-mapped snapshot"""
+    if not isinstance(app.store, app.CsvStore):
+        return []
+    location = app.load_bins()[-1].location
+    app.store.close()   # write out the snapshot the timed writes deferred
+    results = []
+    for label, use_snapshot in (("pd.read_csv", False), ("snapshot", True)):
+        first_gets, alls, rss = [], [], []
+        for _ in range(repeat):
+            script = COLD_LOAD_SCRIPT.format(repo=REPO_DIR, path=app.store.path,
+                                             use_snapshot=use_snapshot, location=location)
+            out = subprocess.run([sys.executable, "-c", script],
+                                 check=True, capture_output=True, text=True).stdout
+            run = json.loads(out.strip().splitlines()[-1])
+            first_gets.append(run['first_get'])
+            alls.append(run['all'])
+            rss.append(run['rss_kb'])
+        for name, samples in ((f"cold get: {label}", first_gets), (f"cold all: {label}", alls)):
+            r = summarize(name, size, samples, sum(samples))
+            r['rss_kb'] = max(rss)
+            results.append(r)
+    return results
+
+
+# === REPORTING ===
+def print_results(results):
+    print(f"{'benchmark':<26}{'bins':>8}{'clients':>8}{'p50 ms':>10}{'p90 ms':>10}"
+          f"{'p99 ms':>10}{'max ms':>10}{'ops/s':>11}{'RSS MB':>9}")
+    for r in results:
+        rss = f"{r['rss_kb'] / 1024:>9.1f}" if 'rss_kb' in r else ""
+        print(f"{r['name']:<26}{r['size']:>8}{r['clients']:>8}{r['p50_ms']:>10.3f}{r['p90_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{r['max_ms']:>10.3f}{r['ops_per_sec']:>11.1f}{rss}")
+
+
+def compare_results(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r['name'], r['size'], r['clients']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r['name'], r['size'], r['clients']))
+        if not old or not old['p50_ms']:
+            continue
+        change = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        flag = ""
+        if change > threshold:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"  {r['name']:<26}{r['size']:>8}  p50 {old['p50_ms']:.3f} -> {r['p50_ms']:.3f} ms "
+              f"({change:+.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per benchmark (per client for routes)")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients for route benchmarks")
+    parser.add_argument("--bursts", type=int, default=20, help="encoder bursts per inventory size")
+    parser.add_argument("--steps", type=int, default=50, help="encoder steps per burst")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="storage backend to benchmark")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh interpreters for the start-up benchmark")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p50 slowdown (%%) reported as a regression")
+    args = parser.parse_args()
+
+    app = import_app()
+    print("Benchmarking start-up...")
+    results = bench_startup(args.startup_runs)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            app.configure_storage("csv", os.path.join(tmp, f"inventory_{size}.csv"))
+            if args.storage == "sqlite":
+                app.configure_storage("sqlite", os.path.join(tmp, f"inventory_{size}.db"))
+            app.save_bins(synthetic_bins(app, size))
+            print(f"Benchmarking {size} bins...")
+            results += bench_cold_load(app, size, args.startup_runs)
+            results += bench_persistence(app, size, args.repeat)
+            results += bench_routes(app, size, args.repeat, args.clients)
+            results += bench_encoder(app, size, args.bursts, args.steps)
+
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime("inventory_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'args': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare and compare_results(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
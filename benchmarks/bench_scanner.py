@@ -0,0 +1,325 @@
+"""Benchmark and regression-test the Data Matrix scanner on synthetic frames.
+
+Generates ECC200 labels carrying Digi-Key style payloads, composites them
+into camera-sized frames under different conditions (blur, rotation, glare,
+clutter) and runs every localization strategy over the same corpus, so
+scanner changes can be measured without a camera or real bags:
+
+    python3 benchmarks/bench_scanner.py --frames 40
+    python3 benchmarks/bench_scanner.py --compare benchmarks/results/<older>.json
+    python3 benchmarks/bench_scanner.py --save-corpus /tmp/corpus   # look at the frames
+
+A decode only counts if it returns the exact payload and parse_digikey_data_matrix
+recovers every field, so the run doubles as a decoder/parser regression suite.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+from PIL import Image
+from pylibdmtx.pylibdmtx import decode, encode
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+sys.path.insert(0, REPO_DIR)
+
+from camera_test import SCAN_PARAMS, AdaptiveLocalizer, decode_regions, parse_digikey_data_matrix
+from scan_trace import ScanTrace
+
+FRAME_SIZE = (1280, 720)  # matches capture_image()
+GS, RS, EOT = "\x1d", "\x1e", "\x04"
+
+MANUFACTURERS = ["TI", "STM", "MCHP", "ADI", "NXP", "ON", "VISHAY", "YAGEO", "MURATA", "KEMET"]
+
+
+# === SYNTHETIC LABELS ===
+def digikey_payload(rng):
+    """An ISO 15434 format 06 message like the ones on Digi-Key bags, plus the fields parse_digikey_data_matrix should find"""
+    mfr_pn = f"{rng.choice(MANUFACTURERS)}{rng.randint(100, 99999)}-{rng.choice('ABCDEFGHJK')}{rng.randint(1, 9)}"
+    fields = {
+        'digi_key_pn': f"{rng.randint(100, 9999)}-{mfr_pn}-ND",
+        'mfr_pn': mfr_pn,
+        'qty': str(rng.choice([1, 5, 10, 25, 50, 100, 250, 1000, 2500])),
+        'lot_code': f"{rng.randint(0, 9999999):07d}",
+        'date_code': f"{rng.randint(18, 25)}{rng.randint(1, 52):02d}",
+        'mid': f"{rng.randint(0, 99999999):08d}",
+    }
+    segments = [
+        "K", f"1K{rng.randint(10000000, 99999999)}", f"10K{rng.randint(10000000, 99999999)}",
+        f"P{fields['digi_key_pn']}", f"1P{fields['mfr_pn']}", f"30P{fields['digi_key_pn']}",
+        f"Q{fields['qty']}", f"11K{rng.randint(1, 9)}", "4LCN",
+        f"1T{fields['lot_code']}", f"9D{fields['date_code']}", f"12Z{fields['mid']}", "13Z000000",
+    ]
+    raw = f"[)>{RS}06{GS}" + GS.join(segments) + RS + EOT
+    return raw, fields
+
+
+def render_label(payload, module_px, rng):
+    """White label with the code and some printed text, as a grayscale array"""
+    encoded = encode(payload.encode("utf-8"))
+    symbol = np.array(Image.frombytes("RGB", (encoded.width, encoded.height), encoded.pixels).convert("L"))
+    # pylibdmtx draws 5 px per module (the libdmtx default); rescale to the module size this frame wants
+    scale = module_px / 5.0
+    symbol = cv2.resize(symbol, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    h, w = symbol.shape
+    label = np.full((h + 40, w + 220), 250, np.uint8)
+    label[20:20 + h, 20:20 + w] = symbol
+    for line in range(4):
+        text = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789-") for _ in range(rng.randint(6, 12)))
+        cv2.putText(label, text, (w + 35, 35 + line * max(18, h // 5)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.45, 30, 1, cv2.LINE_AA)
+    return label
+
+
+# === FRAME COMPOSITING ===
+CONDITIONS = {
+    # name: (blur sigma range, rotation degrees range, glare, clutter)
+    'clean': ((0, 0), (0, 0), False, False),
+    'blur': ((1.0, 2.5), (0, 0), False, False),
+    'rotation': ((0, 0), (-45, 45), False, False),
+    'glare': ((0, 0), (0, 0), True, False),
+    'clutter': ((0, 0), (0, 0), False, True),
+    'combined': ((0.5, 1.8), (-30, 30), True, True),
+}
+
+
+def background(rng, clutter):
+    """Anti-static bag grey, optionally with desk clutter"""
+    w, h = FRAME_SIZE
+    frame = np.full((h, w), rng.randint(90, 160), np.uint8)
+    if clutter:
+        for _ in range(rng.randint(15, 40)):
+            colour = rng.randint(0, 255)
+            x, y = rng.randint(0, w), rng.randint(0, h)
+            kind = rng.random()
+            if kind < 0.4:
+                cv2.rectangle(frame, (x, y), (x + rng.randint(20, 250), y + rng.randint(20, 250)), colour, -1)
+            elif kind < 0.7:
+                cv2.line(frame, (x, y), (rng.randint(0, w), rng.randint(0, h)), colour, rng.randint(1, 6))
+            else:
+                cv2.putText(frame, str(rng.randint(0, 10 ** 6)), (x, y), cv2.FONT_HERSHEY_SIMPLEX,
+                            rng.uniform(0.5, 2.0), colour, 2)
+    return frame
+
+
+def composite(label, condition, rng):
+    (blur_lo, blur_hi), (rot_lo, rot_hi), glare, clutter = CONDITIONS[condition]
+    frame = background(rng, clutter)
+    fh, fw = frame.shape
+
+    # Rotate the label about its centre onto a canvas big enough for any angle
+    angle = rng.uniform(rot_lo, rot_hi)
+    lh, lw = label.shape
+    side = int(np.hypot(lh, lw)) + 2
+    canvas = np.zeros((side, side), np.uint8)
+    mask = np.zeros((side, side), np.uint8)
+    oy, ox = (side - lh) // 2, (side - lw) // 2
+    canvas[oy:oy + lh, ox:ox + lw] = label
+    mask[oy:oy + lh, ox:ox + lw] = 255
+    m = cv2.getRotationMatrix2D((side / 2, side / 2), angle, 1.0)
+    canvas = cv2.warpAffine(canvas, m, (side, side), flags=cv2.INTER_LINEAR)
+    mask = cv2.warpAffine(mask, m, (side, side), flags=cv2.INTER_NEAREST)
+
+    # Place it somewhere fully inside the frame (labels larger than the frame are cropped)
+    side_h, side_w = min(side, fh), min(side, fw)
+    y, x = rng.randint(0, fh - side_h), rng.randint(0, fw - side_w)
+    region = frame[y:y + side_h, x:x + side_w]
+    np.copyto(region, canvas[:side_h, :side_w], where=mask[:side_h, :side_w] > 0)
+
+    out = frame.astype(np.float32)
+    if glare:
+        # Specular highlight from the ring light on the bag film
+        gy, gx = y + rng.randint(0, side_h), x + rng.randint(0, side_w)
+        yy, xx = np.mgrid[0:fh, 0:fw]
+        radius = rng.uniform(60, 180)
+        out += rng.uniform(90, 170) * np.exp(-(((yy - gy) ** 2 + (xx - gx) ** 2) / (2 * radius ** 2)))
+    sigma = rng.uniform(blur_lo, blur_hi)
+    if sigma > 0:
+        out = cv2.GaussianBlur(out, (0, 0), sigma)
+    out += np.random.default_rng(rng.randint(0, 2 ** 32)).normal(0, 4, out.shape)
+    frame = np.clip(out, 0, 255).astype(np.uint8)
+    # Round-trip through JPEG like libcamera-still's output
+    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE)
+
+
+def build_corpus(frames_per_condition, seed, conditions):
+    rng = random.Random(seed)
+    corpus = []
+    for condition in conditions:
+        for i in range(frames_per_condition):
+            payload, fields = digikey_payload(rng)
+            label = render_label(payload, rng.choice([3, 4, 5, 6]), rng)
+            corpus.append({'condition': condition, 'index': i, 'payload': payload, 'fields': fields,
+                           'frame': composite(label, condition, rng)})
+    return corpus
+
+
+# === LOCALIZATION STRATEGIES ===
+def full_frame(gray, trace):
+    with trace.stage('fallback'):
+        result = decode(Image.fromarray(gray))
+    return result[0].data.decode("utf-8") if result else None
+
+
+def region_detection(gray, trace):
+    return decode_regions(gray, trace, params=SCAN_PARAMS)
+
+
+def region_then_full_frame(gray, trace):
+    """What camera_test.main() effectively gets: regions first, whole frame if they fail"""
+    return region_detection(gray, trace) or full_frame(gray, trace)
+
+
+def adaptive(localizer):
+    """Adaptive localizer that learns over the corpus (cache kept in memory), then the whole frame"""
+    def strategy(gray, trace):
+        return localizer.decode(gray, trace) or full_frame(gray, trace)
+    return strategy
+
+
+# name -> factory, so stateful strategies start fresh on every run
+STRATEGIES = {
+    'region': lambda: region_detection,
+    'full_frame': lambda: full_frame,
+    'region+fallback': lambda: region_then_full_frame,
+    'adaptive': lambda: adaptive(AdaptiveLocalizer(path=None)),
+}
+
+
+# === RUNNING ===
+def check(raw, sample):
+    """A decode counts only if the payload and every parsed field match"""
+    if raw != sample['payload']:
+        return False
+    parsed = parse_digikey_data_matrix(raw)
+    return all(parsed.get(k) == v for k, v in sample['fields'].items())
+
+
+def run(corpus, strategies):
+    results = []
+    groups = {}
+    for sample in corpus:
+        groups.setdefault(sample['condition'], []).append(sample)
+    for name in strategies:
+        strategy = STRATEGIES[name]()
+        for condition, samples in list(groups.items()) + [('all', corpus)]:
+            times, decoded, correct, candidates, attempts = [], 0, 0, 0, 0
+            for sample in samples:
+                trace = ScanTrace(SCAN_PARAMS)
+                start = time.perf_counter()
+                try:
+                    raw = strategy(sample['frame'], trace)
+                except Exception as e:
+                    print(f"✗ {name} failed on {condition} #{sample['index']}: {e}")
+                    raw = None
+                times.append((time.perf_counter() - start) * 1000)
+                decoded += raw is not None
+                correct += check(raw, sample)
+                candidates += trace.record['counts'].get('candidates', 0)
+                attempts += trace.record['counts'].get('decode_attempts', 0) + ('fallback' in trace.record['stages'])
+            times.sort()
+            results.append({
+                'strategy': name,
+                'condition': condition,
+                'frames': len(samples),
+                'decode_rate': round(decoded / len(samples), 3),
+                'correct_rate': round(correct / len(samples), 3),
+                'candidates': round(candidates / len(samples), 2),
+                'decode_attempts': round(attempts / len(samples), 2),
+                'p50_ms': round(statistics.median(times), 2),
+                'p90_ms': round(times[min(len(times) - 1, int(0.9 * len(times)))], 2),
+                'max_ms': round(times[-1], 2),
+            })
+            print(f"  {name:<17}{condition:<10}{correct}/{len(samples)} correct")
+    return results
+
+
+# === REPORTING ===
+def print_results(results):
+    print(f"{'strategy':<18}{'condition':<11}{'frames':>7}{'decoded':>9}{'correct':>9}{'cands':>7}{'tries':>7}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}")
+    for r in results:
+        print(f"{r['strategy']:<18}{r['condition']:<11}{r['frames']:>7}{r['decode_rate']:>9.0%}"
+              f"{r['correct_rate']:>9.0%}{r['candidates']:>7.1f}{r['decode_attempts']:>7.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p90_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+
+def compare_results(results, baseline_path, threshold):
+    """Flag strategies that got slower by more than threshold % or decode fewer frames"""
+    with open(baseline_path) as f:
+        baseline = {(r['strategy'], r['condition']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r['strategy'], r['condition']))
+        if not old or not old['p50_ms']:
+            continue
+        change = (r['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        flag = ""
+        if change > threshold or r['correct_rate'] < old['correct_rate']:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"  {r['strategy']:<18}{r['condition']:<11}p50 {old['p50_ms']:.1f} -> {r['p50_ms']:.1f} ms "
+              f"({change:+.1f}%), correct {old['correct_rate']:.0%} -> {r['correct_rate']:.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20, help="frames per condition")
+    parser.add_argument("--seed", type=int, default=1234, help="corpus seed; the same seed gives the same frames")
+    parser.add_argument("--conditions", nargs="+", choices=sorted(CONDITIONS), default=list(CONDITIONS))
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--save-corpus", help="also write the frames and a manifest to this directory")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p50 slowdown (%%) reported as a regression")
+    args = parser.parse_args()
+
+    print(f"Generating {args.frames} frames for each of {len(args.conditions)} conditions...")
+    corpus = build_corpus(args.frames, args.seed, args.conditions)
+    if args.save_corpus:
+        os.makedirs(args.save_corpus, exist_ok=True)
+        manifest = []
+        for sample in corpus:
+            filename = f"{sample['condition']}_{sample['index']:03d}.png"
+            cv2.imwrite(os.path.join(args.save_corpus, filename), sample['frame'])
+            manifest.append({'file': filename, 'payload': sample['payload'], 'fields': sample['fields']})
+        with open(os.path.join(args.save_corpus, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Corpus saved to {args.save_corpus}")
+
+    print("Decoding...")
+    results = run(corpus, args.strategies)
+    print()
+    print_results(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime("scanner_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'args': vars(args),
+            'params': SCAN_PARAMS,
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare and compare_results(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,28 @@
+import argparse
+import json
 import subprocess
+import urllib.request
 import os
 import re
-import time
 import cv2
 import numpy as np
 from PIL import Image
 from pylibdmtx.pylibdmtx import decode
+from scan_trace import ScanTrace, append as append_trace
+
+# Localization parameters; recorded with every trace so they can be tuned
+# against real scans (python3 scan_trace.py compares them)
+SCAN_PARAMS = {
+    'block_size': 11,       # adaptiveThreshold neighbourhood, odd
+    'c': 2,                 # adaptiveThreshold offset
+    'min_std': 15,          # skip flat regions
+    'min_side': 50,
+    'max_side': 600,
+    'min_aspect': 0.6,
+    'max_aspect': 1.4,
+    'min_area': 200 * 200,
+    'nested': False,        # also look inside other contours (a code on a label with a visible edge)
+}
 
 def parse_digikey_data_matrix(raw: str):
     if raw.startswith("[)>06"):
@@ -27,108 +44,409 @@ def parse_digikey_data_matrix(raw: str):
             result["mid"] = field[3:]
     return result
 
-def capture_image(filename="/tmp/frame.jpg"):
+# === CAPTURE MODES ===
+# Picked per workstation in scanner.json next to this file (or --capture-mode):
+#   {"capture_mode": "two_stage", "roi": [0.25, 0.2, 0.5, 0.6], "lens_position": 4.5}
+# roi is x, y, width, height as fractions of the sensor; lens_position is in
+# dioptres (1 / focus distance in metres) for the fixed-focus modes.
+#   full       1280x720 with autofocus, as before
+#   fixed      same frame, fixed focus and a short timeout
+#   roi        fixed focus, sensor cropped to the bench area in roi
+#   two_stage  low-res preview of roi to find labels, then a full-resolution
+#              grab of just the region they are in
+SCANNER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scanner.json")
+CAPTURE_MODES = ['full', 'fixed', 'roi', 'two_stage']
+DEFAULT_CAPTURE = {
+    'capture_mode': 'full',
+    'roi': [0.0, 0.0, 1.0, 1.0],
+    'lens_position': 4.0,       # ~25 cm
+    'still_size': [1280, 720],
+    'preview_size': [640, 360],     # largest two_stage preview; the roi's aspect ratio is kept
+    'timeout_ms': 300,          # fixed-focus modes; autofocus needs the full 2 s
+}
+
+def load_capture_config(path=SCANNER_CONFIG, **overrides):
+    config = dict(DEFAULT_CAPTURE)
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"✗ Ignoring {path}: {e}")
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    if config['capture_mode'] not in CAPTURE_MODES:
+        raise ValueError(f"Unknown capture mode {config['capture_mode']}")
+    return config
+
+def capture_image(filename="/tmp/frame.jpg", config=None, size=None, roi=None):
+    """Run libcamera-still; without config this is the original 1280x720 autofocus still"""
+    command = ["libcamera-still", "-o", filename]
+    if config is None or config['capture_mode'] == 'full':
+        width, height = size or (1280, 720)
+        command += ["--timeout", "2000", "--autofocus-mode", "auto", "--lens-position", "0.0"]
+    else:
+        width, height = size or config['still_size']
+        command += ["-n", "--timeout", str(config['timeout_ms']),
+                    "--autofocus-mode", "manual", "--lens-position", str(config['lens_position'])]
+    if roi and list(roi) != [0.0, 0.0, 1.0, 1.0]:
+        command += ["--roi", ",".join(f"{v:.4f}" for v in roi)]
+    command += ["--width", str(width), "--height", str(height)]
     try:
-        subprocess.run([
-            "libcamera-still",
-            "-o", filename,
-            "--width", "1280",
-            "--height", "720",
-            "--timeout", "2000",
-            "--autofocus-mode", "auto",
-            "--lens-position", "0.0"
-        ], check=True)
+        subprocess.run(command, check=True)
         return filename if os.path.exists(filename) else None
     except subprocess.CalledProcessError as e:
         print(f"✗ Camera capture failed: {e}")
         return None
 
-def decode_with_region_detection(image_path):
-    try:
-        image = cv2.imread(image_path)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def locate_candidates(gray, trace, params=SCAN_PARAMS, debug_image=None):
+    """Square, high-contrast regions of a grayscale frame as [((x1, y1, x2, y2), region), ...].
 
+    With debug_image (the colour frame) each candidate is saved to /tmp and
+    outlined on it, which is useful by hand but too slow to benchmark.
+    """
+    with trace.stage('threshold'):
         thresh = cv2.adaptiveThreshold(
             gray, 255,
             cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 11, 2
+            cv2.THRESH_BINARY_INV, params['block_size'], params['c']
         )
 
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        candidates = []
-
-        for i, cnt in enumerate(contours):
+    candidates = []
+    # One stage around the whole filter loop; per-contour timing would cost more than the tests it measures
+    with trace.stage('contours'):
+        mode = cv2.RETR_LIST if params.get('nested') else cv2.RETR_EXTERNAL
+        contours, _ = cv2.findContours(thresh, mode, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in contours:
             x, y, w, h = cv2.boundingRect(cnt)
             aspect = w / float(h)
+            # Cheapest tests first: most contours are specks of noise, and the
+            # std of every one of them used to dominate the localization time
+            if not (params['min_side'] < w < params['max_side'] and params['min_aspect'] < aspect < params['max_aspect']):
+                continue
+            if w * h < params['min_area']:
+                continue  # contourArea() is at most the bounding box area
+            area = cv2.contourArea(cnt)
+            if area < params['min_area']:
+                continue
             region = gray[y:y+h, x:x+w]
-            if np.std(region) < 15:
+            if np.std(region) < params['min_std']:
                 continue
 
-            if 50 < w < 600 and 0.6 < aspect < 1.4:
-                area = cv2.contourArea(cnt)
-                if area < (200 * 200):
-                    continue
-
-                pad_x = int(w * 0.08)
-                pad_y = int(h * 0.08)
-                x1 = max(x - pad_x, 0)
-                y1 = max(y - pad_y, 0)
-                x2 = min(x + w + pad_x, gray.shape[1])
-                y2 = min(y + h + pad_y, gray.shape[0])
-                region = gray[y1:y2, x1:x2]
-                candidates.append(region)
+            pad_x = int(w * 0.08)
+            pad_y = int(h * 0.08)
+            x1 = max(x - pad_x, 0)
+            y1 = max(y - pad_y, 0)
+            x2 = min(x + w + pad_x, gray.shape[1])
+            y2 = min(y + h + pad_y, gray.shape[0])
+            candidates.append(((x1, y1, x2, y2), gray[y1:y2, x1:x2]))
+    trace.count('contours', len(contours))
 
+    if debug_image is not None:
+        with trace.stage('debug_output'):
+            for i, ((x1, y1, x2, y2), region) in enumerate(candidates):
                 # Save candidate region to file
                 candidate_path = f"/tmp/candidate_{i}.png"
                 cv2.imwrite(candidate_path, region)
                 print(f"💾 Saved candidate to {candidate_path}")
 
                 # Draw rectangle on original image
-                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.rectangle(debug_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
                 print(f"→ Candidate at (x={x1}, y={y1}, w={x2 - x1}, h={y2 - y1})")
+    trace.count('candidates', len(candidates))
+    return candidates
 
-        cv2.imwrite("/tmp/debug_regions.jpg", image)
-
-        for region in candidates:
+def decode_regions(gray, trace=None, params=SCAN_PARAMS, debug_image=None):
+    """Decode candidate regions until one reads; returns its payload or None"""
+    trace = trace or ScanTrace(params)
+    for box, region in locate_candidates(gray, trace, params, debug_image):
+        trace.count('decode_attempts')
+        with trace.stage('candidate_decode'):
             pil_img = Image.fromarray(region)
             result = decode(pil_img)
+        if result:
+            return result[0].data.decode("utf-8")
+
+    return None
+
+def decode_all_regions(gray, trace=None, params=SCAN_PARAMS, debug_image=None, fallback=True):
+    """Batch mode: decode every candidate, one label per distinct payload.
+
+    Returns [{'raw', 'parsed', 'box': [x1, y1, x2, y2]}, ...] in frame order.
+    If no candidate reads (and fallback is set), the whole frame is decoded
+    for every symbol in it.
+    """
+    trace = trace or ScanTrace(params)
+    labels = {}
+    for box, region in locate_candidates(gray, trace, params, debug_image):
+        trace.count('decode_attempts')
+        with trace.stage('candidate_decode'):
+            results = decode(Image.fromarray(region))
+        for result in results:
+            raw = result.data.decode("utf-8")
+            if raw not in labels:
+                labels[raw] = {'raw': raw, 'parsed': parse_digikey_data_matrix(raw), 'box': list(box)}
+    if not labels and fallback:
+        return decode_frame_labels(gray, trace)
+    trace.count('labels', len(labels))
+    return list(labels.values())
+
+def decode_frame_labels(gray, trace):
+    """Full-frame fallback for batch mode: every symbol libdmtx finds in the whole frame"""
+    with trace.stage('fallback'):
+        results = decode(Image.fromarray(gray))
+    labels = {}
+    height = gray.shape[0]
+    for result in results:
+        raw = result.data.decode("utf-8")
+        # libdmtx measures top from the bottom of the image
+        left, bottom, w, h = result.rect
+        box = [left, height - bottom - h, left + w, height - bottom]
+        labels.setdefault(raw, {'raw': raw, 'parsed': parse_digikey_data_matrix(raw), 'box': box})
+    trace.count('labels', len(labels))
+    return list(labels.values())
+
+# === ADAPTIVE LOCALIZATION ===
+# Fixed thresholds work for one lighting setup. The adaptive localizer keys
+# frames by a cheap brightness/contrast signature and remembers which
+# parameter set last found a code under that signature; it tries that set
+# first and walks the variants below only when it fails.
+LOCALIZER_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "localizer_cache.json")
+
+# Overrides of SCAN_PARAMS, in the order they are tried when nothing is cached
+PARAM_VARIANTS = [
+    {},
+    {'nested': True, 'min_side': 30, 'min_area': 100 * 100},    # code inside a label outline
+    {'block_size': 21, 'c': 4},                                 # softer focus, larger modules
+    {'block_size': 31, 'c': 6, 'min_std': 20},                  # uneven light, glare
+    {'min_side': 30, 'min_area': 100 * 100},                    # labels further from the camera
+    {'block_size': 7, 'c': 1, 'min_std': 8},                    # dim, low contrast
+    {'block_size': 51, 'c': 8, 'min_side': 30, 'min_area': 100 * 100},
+]
+
+def lighting_signature(gray):
+    """Coarse brightness and contrast buckets of a thumbnail, e.g. 'b3-c2'"""
+    small = cv2.resize(gray, (32, 18), interpolation=cv2.INTER_AREA)
+    return f"b{int(small.mean()) // 32}-c{int(small.std()) // 16}"
+
+class AdaptiveLocalizer:
+    def __init__(self, path=LOCALIZER_CACHE):
+        """path=None keeps the cache in memory only"""
+        self.path = path
+        self.cache = {}          # signature -> {'params', 'hits'}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                self.cache = {}
+
+    def param_sets(self, signature):
+        sets = [dict(SCAN_PARAMS, **variant) for variant in PARAM_VARIANTS]
+        cached = self.cache.get(signature)
+        if cached:
+            sets = [cached['params']] + [p for p in sets if p != cached['params']]
+        return sets
+
+    def remember(self, signature, params):
+        entry = self.cache.get(signature)
+        if entry and entry['params'] == params:
+            entry['hits'] += 1
+        else:
+            self.cache[signature] = {'params': params, 'hits': 1}
+        if self.path:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.cache, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def decode(self, gray, trace=None, debug_image=None, decode_all=False):
+        """Like decode_regions (or decode_all_regions without its fallback), trying parameter sets until one reads"""
+        trace = trace or ScanTrace(SCAN_PARAMS)
+        signature = lighting_signature(gray)
+        trace.record['signature'] = signature
+        for params in self.param_sets(signature):
+            trace.count('param_sets')
+            if decode_all:
+                result = decode_all_regions(gray, trace, params, debug_image, fallback=False)
+            else:
+                result = decode_regions(gray, trace, params, debug_image)
             if result:
-                return result[0].data.decode("utf-8")
+                trace.record['params'] = dict(params)
+                self.remember(signature, params)
+                return result
+        return [] if decode_all else None
 
-        return None
+def scale_params(params, factor):
+    """Localization parameters for a frame scaled by factor (e.g. a preview)"""
+    scaled = dict(params)
+    scaled['min_side'] = params['min_side'] * factor
+    scaled['max_side'] = params['max_side'] * factor
+    scaled['min_area'] = params['min_area'] * factor * factor
+    return scaled
+
+def roi_size(config, roi):
+    """Output size for a crop at the same pixels-per-label as a full still, so fewer pixels to move and decode"""
+    width, height = config['still_size']
+    return max(64, int(width * roi[2]) // 2 * 2), max(64, int(height * roi[3]) // 2 * 2)
+
+def preview_dimensions(config, roi):
+    """Preview output size: the roi at its own aspect ratio, shrunk to fit within config['preview_size']"""
+    width, height = roi_size(config, roi)
+    max_width, max_height = config['preview_size']
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(64, int(width * scale) // 2 * 2), max(64, int(height * scale) // 2 * 2)
+
+def preview_factor(config, roi, preview_width):
+    """Preview pixels per still pixel; the preview frames only the roi, so it is relative to the roi's width"""
+    return preview_width / (config['still_size'][0] * roi[2])
+
+def preview_boxes_to_roi(boxes, preview_shape, roi, margin=0.05):
+    """Sensor roi covering preview boxes (x1, y1, x2, y2) plus a margin, mapped back through the preview's roi"""
+    rx, ry, rw, rh = roi
+    ph, pw = preview_shape[:2]
+    x1 = max(min(b[0] for b in boxes) / pw - margin, 0.0)
+    y1 = max(min(b[1] for b in boxes) / ph - margin, 0.0)
+    x2 = min(max(b[2] for b in boxes) / pw + margin, 1.0)
+    y2 = min(max(b[3] for b in boxes) / ph + margin, 1.0)
+    return [rx + x1 * rw, ry + y1 * rh, (x2 - x1) * rw, (y2 - y1) * rh]
+
+def capture_for_scan(config, trace, params=SCAN_PARAMS):
+    """Capture a frame the way the configured mode says; returns its path or None"""
+    mode = config['capture_mode']
+    trace.record['capture_mode'] = mode
+    if mode in ('full', 'fixed'):
+        with trace.stage('capture'):
+            return capture_image(config=config)
+    if mode == 'roi':
+        with trace.stage('capture'):
+            return capture_image(config=config, size=roi_size(config, config['roi']), roi=config['roi'])
+
+    # two_stage: find the labels in a small preview, then grab only their region
+    roi = config['roi']
+    size = preview_dimensions(config, roi)
+    with trace.stage('preview'):
+        preview = capture_image("/tmp/preview.jpg", config, size=size, roi=roi)
+    if preview:
+        with trace.stage('preview'):
+            gray = cv2.imread(preview, cv2.IMREAD_GRAYSCALE)
+            factor = preview_factor(config, roi, gray.shape[1])
+            boxes = [box for box, _ in locate_candidates(gray, ScanTrace(params), scale_params(params, factor))]
+        trace.count('preview_candidates', len(boxes))
+        if boxes:
+            roi = preview_boxes_to_roi(boxes, gray.shape, roi)
+    with trace.stage('capture'):
+        return capture_image(config=config, size=roi_size(config, roi), roi=roi)
+
+def decode_with_region_detection(image_path, trace=None, params=SCAN_PARAMS, localizer=None):
+    trace = trace or ScanTrace(params)
+    try:
+        with trace.stage('load'):
+            image = cv2.imread(image_path)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        if localizer:
+            raw = localizer.decode(gray, trace, debug_image=image)
+        else:
+            raw = decode_regions(gray, trace, params, debug_image=image)
+
+        with trace.stage('debug_output'):
+            cv2.imwrite("/tmp/debug_regions.jpg", image)
+
+        return raw
     except Exception as e:
         print(f"✗ Region-based decode error: {e}")
         return None
 
-def main():
+def book_labels(labels, server):
+    """Send a tray's labels to the inventory as one batched update"""
+    body = json.dumps({'labels': [label['parsed'] for label in labels]}).encode('utf-8')
+    req = urllib.request.Request(f"{server.rstrip('/')}/scan/batch", data=body,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def scan_tray(server, localizer=None, capture_config=None):
+    """Batch mode: book every label in one exposure"""
+    trace = ScanTrace(SCAN_PARAMS)
+    img_path = capture_for_scan(capture_config or load_capture_config(None), trace)
+    if not img_path:
+        print("✗ Image capture failed.\n")
+        return
+
+    with trace.stage('load'):
+        image = cv2.imread(img_path)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if localizer:
+        labels = localizer.decode(gray, trace, decode_all=True) or decode_frame_labels(gray, trace)
+    else:
+        labels = decode_all_regions(gray, trace)
+    outcome = ('fallback' if 'fallback' in trace.record['stages'] else 'region') if labels else 'none'
+    record = trace.finish(outcome)
+    append_trace(record)
+
+    if not labels:
+        print("✗ No valid Data Matrix detected.\n")
+        return
+    print(f"\n✓ {len(labels)} label(s) found:")
+    for label in labels:
+        parsed = label['parsed']
+        print(f"  {parsed.get('mfr_pn', '?'):<24} qty {parsed.get('qty', '?'):>6}  at {label['box']}")
+    print(f"⏱️ Decoded in {record['stages']['total'] / 1000:.2f} sec")
+
+    if server:
+        try:
+            result = book_labels(labels, server)
+            print(("✓ " + result['message']) if result['success'] else ("✗ " + result['error']))
+            for booking in result.get('booked', []):
+                print(f"  {booking['location']}: {booking['name']} +{booking['added']} -> {booking['quantity']}")
+        except Exception as e:
+            print(f"✗ Booking failed: {e}")
+    print()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DigiKey Data Matrix Scanner")
+    parser.add_argument("--batch", action="store_true", help="read every label in the frame (a whole tray)")
+    parser.add_argument("--server", help="in batch mode, book the labels into this inventory, e.g. http://localhost:5000")
+    parser.add_argument("--fixed-params", action="store_true",
+                        help="always localize with SCAN_PARAMS instead of adapting to the lighting")
+    parser.add_argument("--capture-mode", choices=CAPTURE_MODES, help="override capture_mode from scanner.json")
+    parser.add_argument("--config", default=SCANNER_CONFIG, help="per-workstation scanner settings")
+    args = parser.parse_args(argv)
+    localizer = None if args.fixed_params else AdaptiveLocalizer()
+    capture_config = load_capture_config(args.config, capture_mode=args.capture_mode)
     print("DigiKey Data Matrix Scanner\nPress Enter to capture and scan...\n")
 
     while True:
         try:
             input("➤ Press Enter to scan...")
-            t0 = time.time()
-
-            t1 = time.time()
-            img_path = capture_image()
-            t2 = time.time()
+            if args.batch:
+                scan_tray(args.server, localizer, capture_config)
+                continue
+            trace = ScanTrace(SCAN_PARAMS)
+            img_path = capture_for_scan(capture_config, trace)
 
             if not img_path:
                 print("✗ Image capture failed.\n")
                 continue
 
             print("✓ Captured image, detecting candidates...")
-            raw = decode_with_region_detection(img_path)
-            t3 = time.time()
+            raw = decode_with_region_detection(img_path, trace, localizer=localizer)
+            outcome = 'region' if raw else 'none'
 
             # Full frame fallback decode (grayscale PIL)
             print("Trying full-frame fallback decode...")
             try:
-                full_pil = Image.open(img_path).convert("L")
-                result = decode(full_pil)
+                with trace.stage('fallback'):
+                    full_pil = Image.open(img_path).convert("L")
+                    result = decode(full_pil)
                 if result:
                     print("→ Full-frame fallback:", result[0].data.decode())
+                    if not raw:
+                        outcome = 'fallback'
             except:
                 print("✗ Full-frame decode failed.")
+            record = trace.finish(outcome)
+            append_trace(record)
 
             if not raw:
                 print("✗ No valid Data Matrix detected.\n")
@@ -143,10 +461,10 @@ def main():
                 else:
                     print("✗ Data does not match Digi-Key format.\n")
 
-            print(f"\n⏱️ Timing:")
-            print(f"  Capture time: {(t2 - t1):.2f} sec")
-            print(f"  Decode time:  {(t3 - t2):.2f} sec")
-            print(f"  Total time:   {(t3 - t0):.2f} sec\n")
+            print(f"\n⏱️ Timing ({outcome}, {record['counts'].get('candidates', 0)} candidates):")
+            for stage, ms in record['stages'].items():
+                print(f"  {stage + ':':<18}{ms / 1000:.2f} sec")
+            print()
 
         except KeyboardInterrupt:
             print("\nExiting.")
@@ -0,0 +1,71 @@
+import os
+import time
+import numpy as np
+
+# === EMBEDDING BACKEND ===
+# Sentence embeddings for part search on the Pi's CPU. all-mpnet-base-v2 is
+# ~420 MB and 768-dim; the compact models below load in a fraction of the
+# time and memory. int8 dynamic quantization of the Linear layers shrinks
+# them further and speeds up CPU inference; the thread count should match the
+# cores left over by Flask and the camera. Configured by argument or by
+#   MINIBENCH_EMBED_MODEL=minilm  MINIBENCH_EMBED_QUANTIZE=0|1  MINIBENCH_EMBED_THREADS=2
+#
+#   python3 benchmarks/bench_embeddings.py   load time, RSS, latency, agreement with mpnet
+
+MODELS = {
+    'mpnet': 'sentence-transformers/all-mpnet-base-v2',           # 768-dim, ~420 MB, the original
+    'minilm': 'sentence-transformers/all-MiniLM-L6-v2',           # 384-dim, ~90 MB
+    'minilm-l3': 'sentence-transformers/paraphrase-MiniLM-L3-v2', # 384-dim, ~70 MB, 3 layers
+    'bge-small': 'BAAI/bge-small-en-v1.5',                        # 384-dim, ~130 MB
+}
+DEFAULT_MODEL = 'minilm'
+# Short part-like strings, so warm-up exercises the same shapes as real queries
+WARMUP_TEXTS = ["10k resistor", "Capacitor 100µF", "STM32F103C8T6", "red led"]
+
+def env_config():
+    """Backend keyword arguments from the MINIBENCH_EMBED_* environment variables"""
+    threads = os.environ.get("MINIBENCH_EMBED_THREADS")
+    return {
+        'model': os.environ.get("MINIBENCH_EMBED_MODEL", DEFAULT_MODEL),
+        'quantize': os.environ.get("MINIBENCH_EMBED_QUANTIZE", "1") != "0",
+        'threads': int(threads) if threads else None,
+    }
+
+class EmbeddingBackend:
+    def __init__(self, model=DEFAULT_MODEL, quantize=True, threads=None, warmup=True):
+        """model is a key of MODELS or any sentence-transformers model name/path"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+        self.torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.name = model
+        self.quantized = quantize
+        start = time.perf_counter()
+        self.model = SentenceTransformer(MODELS.get(model, model), device='cpu')
+        self.model.eval()
+        if quantize:
+            # Weights to int8, activations quantized on the fly; in place so the fp32 copy is freed
+            torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.load_seconds = time.perf_counter() - start
+        self.warmup_seconds = self.warmup() if warmup else None
+
+    def warmup(self):
+        """Run a few encodes so the first real query doesn't pay for lazy init and allocator growth"""
+        start = time.perf_counter()
+        for text in WARMUP_TEXTS:
+            self.encode([text])
+        self.encode(WARMUP_TEXTS)
+        return time.perf_counter() - start
+
+    def encode(self, texts, batch_size=32):
+        """2-D float32 array of unit-length embeddings, one row per text"""
+        with self.torch.inference_mode():
+            vectors = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True,
+                                        normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def describe(self):
+        return (f"{self.name}{' int8' if self.quantized else ''}, {self.torch.get_num_threads()} threads, "
+                f"loaded in {self.load_seconds:.1f}s"
+                + (f", warm-up {self.warmup_seconds:.2f}s" if self.warmup_seconds is not None else ""))
@@ -1,34 +1,43 @@
-from sentence_transformers import SentenceTransformer
+import argparse
 import csv
-import numpy as np
+from embedding_backend import MODELS, EmbeddingBackend, env_config
+from part_search import PartSearch
 
-# 1. Load a pretrained Sentence Transformer model
-model = SentenceTransformer("all-mpnet-base-v2")
+config = env_config()
+parser = argparse.ArgumentParser(description="Find inventory parts by name")
+parser.add_argument("--model", default=config['model'], help=f"one of {', '.join(MODELS)} or a model name")
+parser.add_argument("--no-quantize", dest="quantize", action="store_false", default=config['quantize'],
+                    help="keep fp32 weights instead of int8 dynamic quantization")
+parser.add_argument("--threads", type=int, default=config['threads'], help="torch CPU threads")
+args = parser.parse_args()
+
+# 1. Load the embedding model (compact and int8 by default) and warm it up
+backend = EmbeddingBackend(args.model, quantize=args.quantize, threads=args.threads)
+print(f"Model: {backend.describe()}")
 
 #read the csv file
 with open('Expanded_Sample_Inventory.csv', 'r') as file:
     reader = csv.reader(file)
     compNames = [row[0] for row in reader][1:]
-    compQuantities = [row[1] for row in reader][1:]
-
-print(f"Computing Embeddings for {len(compNames)} components")
-
-
-# 2. Calculate embeddings by calling model.encode()
-embeddings = model.encode(compNames)
 
-# 3. Calculate the embedding similarities
-similarities = model.similarity(embeddings, embeddings)
+# 2. Index the names and embed the catalog now rather than on the first ambiguous query
+search = PartSearch(compNames, encode=backend.encode)
+search.embeddings()
+print(f"Indexed {len(compNames)} components")
 
 while True:
     userInput = input("Enter a component name: ")
     if userInput == "exit":
         break
     else:
-        userEmbedding = model.encode([userInput])
-        similarities = model.similarity(userEmbedding, embeddings).squeeze()
-        mostSimilarIndex = np.argmax(similarities).item()
-        print(similarities.shape)
-        print(mostSimilarIndex)
-        print(f"Most similar component: {compNames[mostSimilarIndex]}")
-        print(f"Similarity: {similarities[mostSimilarIndex]}")
\ No newline at end of file
+        matches = search.search(userInput)
+        if not matches:
+            print("No match.")
+            continue
+        best = matches[0]
+        print(f"Most similar component: {best['name']}")
+        print(f"Similarity: {best['score']} ({best['source']})")
+        for other in matches[1:]:
+            print(f"  also: {other['name']} ({other['score']})")
+        info = search.query_embedding.cache_info()
+        print(f"[{dict(search.stats)}, query cache {info.hits} hits / {info.misses} misses]")
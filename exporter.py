@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+from storage import FIELDS
+
+# === STREAMING EXPORT ===
+# Each format turns an iterator of rows into an iterator of byte chunks, so an
+# export is encoded as it is sent and never held in memory as a whole.
+
+CHUNK_ROWS = 500
+
+def row_filter(row=None, column=None, name=None):
+    """Predicate for rows in cabinet row (letters), column (number) and/or with name containing text"""
+    row = row.upper() if row else None
+    name = name.lower() if name else None
+
+    def keep(r):
+        location = r['Location']
+        letters = location.rstrip('0123456789')
+        if row and letters != row:
+            return False
+        if column is not None and location[len(letters):] != str(column):
+            return False
+        if name and name not in r['Name'].lower():
+            return False
+        return True
+    return keep
+
+def batches(rows, size=CHUNK_ROWS):
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_chunks(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for batch in batches(rows):
+        writer.writerows(batch)
+        yield out.getvalue().encode('utf-8')
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
+
+def jsonl_chunks(rows):
+    for batch in batches(rows):
+        yield ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in batch).encode('utf-8')
+
+class _Sink:
+    """Write-only file that hands back whatever was written since the last drain"""
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+XLSX_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Inventory" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+}
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, int):
+            cells.append(f'<c t="n"><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+def xlsx_chunks(rows):
+    """A single-sheet workbook, zipped as it is generated (no openpyxl needed)"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for part, xml in XLSX_PARTS.items():
+            zf.writestr(part, xml)
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(FIELDS).encode('utf-8'))
+            for batch in batches(rows):
+                sheet.write(''.join(_xlsx_row([r[f] for f in FIELDS]) for r in batch).encode('utf-8'))
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# format -> (chunk generator, mimetype, compress on the wire)
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv', True),
+    'jsonl': (jsonl_chunks, 'application/x-ndjson', True),
+    'xlsx': (xlsx_chunks, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', False),
+}
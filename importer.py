@@ -0,0 +1,105 @@
+import codecs
+import csv
+from storage import make_row
+
+# === BULK CSV IMPORT ===
+# An uploaded CSV (Name,Quantity,Location[,Threshold]) is read and validated one row at a
+# time, then merged into the inventory in a single write. Policies:
+#   replace  the inventory becomes exactly the file; bins not in it are dropped
+#   merge    bins in the file overwrite the stored ones, the rest are untouched
+#   add      file quantities are added to the stored ones (negative removes);
+#            a bin that reaches 0 or less is cleared
+# Any invalid row aborts the whole import, so a bad file never half-applies.
+# A missing or blank Threshold keeps the bin's current reorder level.
+
+POLICIES = ('replace', 'merge', 'add')
+PROGRESS_EVERY = 1000
+MAX_ERRORS = 50
+REQUIRED_FIELDS = ['Name', 'Quantity', 'Location']
+
+class CsvImport:
+    def __init__(self, policy, is_valid_location):
+        self.policy = policy
+        self.is_valid_location = is_valid_location
+        self.rows = {}           # location -> (line number, row)
+        self.errors = []
+        self.count = 0
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Line {line}: {message}")
+
+    def read(self, stream):
+        """Validate a byte stream of CSV; yields the running row count every PROGRESS_EVERY rows"""
+        reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+        missing = [f for f in REQUIRED_FIELDS if f not in (reader.fieldnames or [])]
+        if missing:
+            self.errors.append(f"Missing column(s): {', '.join(missing)}")
+            return
+        try:
+            for record in reader:
+                self.count += 1
+                self.add_record(reader.line_num, record)
+                if self.count % PROGRESS_EVERY == 0:
+                    yield self.count
+        except (UnicodeDecodeError, csv.Error) as e:
+            self.errors.append(f"Line {reader.line_num}: unreadable CSV ({e})")
+
+    def add_record(self, line, record):
+        """Validate one {'Name', 'Quantity', 'Location'[, 'Threshold']} record (strings, as read from CSV)"""
+        name = (record['Name'] or "").strip()
+        location = (record['Location'] or "").strip().upper()
+        if not self.is_valid_location(location):
+            self.error(line, f"invalid bin location '{location}'")
+            return
+        try:
+            quantity = int((record['Quantity'] or "").strip())
+        except ValueError:
+            self.error(line, f"invalid quantity '{record['Quantity']}' for {location}")
+            return
+        if quantity < 0 and self.policy != 'add':
+            self.error(line, f"negative quantity for {location}")
+            return
+        threshold = (record.get('Threshold') or "").strip()
+        try:
+            threshold = int(threshold) if threshold else None
+        except ValueError:
+            self.error(line, f"invalid threshold '{record['Threshold']}' for {location}")
+            return
+        if threshold is not None and threshold < 0:
+            self.error(line, f"negative threshold for {location}")
+            return
+        if location in self.rows:
+            self.error(line, f"{location} already appears on line {self.rows[location][0]}")
+            return
+        row = make_row(name, quantity, location)
+        row['Threshold'] = threshold   # None until merge() knows the stored one
+        self.rows[location] = (line, row)
+
+    def merge(self, existing):
+        """Final rows for the bins this import touches, given the stored {location: row}.
+
+        For 'replace', existing must be the whole inventory and the result is
+        the whole new inventory. Adds that would rename a stocked bin are errors.
+        """
+        merged = {}
+        for location, (line, row) in self.rows.items():
+            current = existing.get(location)
+            threshold = row['Threshold']
+            if threshold is None:
+                threshold = current.get('Threshold', 0) if current else 0
+            row = dict(row, Threshold=threshold)
+            if self.policy != 'add' or not current or not current['Name'] or current['Quantity'] <= 0:
+                if self.policy == 'add' and row['Quantity'] <= 0:
+                    row = make_row("", 0, location, threshold)
+                elif row['Quantity'] > 0 and not row['Name']:
+                    self.error(line, f"{location} needs a name")
+                    continue
+                merged[location] = row
+                continue
+            if row['Name'] and row['Name'] != current['Name']:
+                self.error(line, f"{location} holds {current['Name']}, not {row['Name']}")
+                continue
+            quantity = current['Quantity'] + row['Quantity']
+            merged[location] = make_row(current['Name'] if quantity > 0 else "", max(quantity, 0), location, threshold)
+        return merged
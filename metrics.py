@@ -0,0 +1,150 @@
+import bisect
+import functools
+import threading
+import time
+
+# === METRICS ===
+# Minimal counters and histograms rendered in the Prometheus text format on
+# /metrics. Observing is a bisect and a few additions under a per-metric
+# lock, cheap enough to leave on on a Pi.
+
+# Seconds; covers sub-millisecond lock waits up to slow full-file rewrites
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+registry = []
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}         # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, list(entry)) for key, entry in self.values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, entry):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {entry[-1]}")
+        return lines
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def timed(histogram, **labels):
+    """Decorator that observes the wrapped call's duration (also when it raises)"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+# --- application metrics ---
+REQUEST_SECONDS = Histogram('minibench_request_seconds', 'Time to produce a Flask response', ['endpoint', 'method'])
+REQUESTS = Counter('minibench_requests_total', 'Flask requests by response status', ['endpoint', 'method', 'status'])
+LOCK_WAIT_SECONDS = Histogram('minibench_lock_wait_seconds', 'Time spent waiting to acquire a lock', ['lock'])
+LOCK_HOLD_SECONDS = Histogram('minibench_lock_hold_seconds', 'Time a lock was held', ['lock'])
+PERSISTENCE_SECONDS = Histogram('minibench_persistence_seconds', 'Store call latency', ['backend', 'op'])
+GPIO_SECONDS = Histogram('minibench_gpio_callback_seconds', 'Encoder and button callback run time', ['callback'])
+
+class TimedLock:
+    """threading.Lock that records wait and hold times; usable anywhere a Lock is"""
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            LOCK_WAIT_SECONDS.observe(self._acquired_at - start, lock=self.name)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        LOCK_HOLD_SECONDS.observe(held, lock=self.name)
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+def instrument_app(app):
+    """Time every request by endpoint (the route function, not the raw URL)"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
@@ -0,0 +1,113 @@
+import threading
+
+def split_location(location):
+    """'B12' -> ('B', 12); returns None if it isn't row letters followed by a column number"""
+    letters = location.rstrip('0123456789')
+    digits = location[len(letters):]
+    if not letters or not digits or not letters.isalpha():
+        return None
+    return letters, int(digits)
+
+def popcount(x):
+    return bin(x).count("1")
+
+class OccupancyGrid:
+    """One bit per slot of the rows x columns cabinet, set while the bin holds stock.
+
+    Slot index is row_index * len(columns) + column_index, so each row is a
+    contiguous run of bits: a row's occupancy is a mask and a popcount, and
+    the first free slot is the lowest clear bit.
+    """
+    def __init__(self, rows, columns):
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self.row_index = {r: i for i, r in enumerate(self.rows)}
+        self.column_index = {c: i for i, c in enumerate(self.columns)}
+        self.size = len(self.rows) * len(self.columns)
+        self.full_mask = (1 << self.size) - 1
+        self.row_mask = (1 << len(self.columns)) - 1
+        self.bits = 0
+        self.lock = threading.Lock()
+
+    def index(self, location):
+        parts = split_location(location)
+        if parts is None:
+            return None
+        r = self.row_index.get(parts[0])
+        c = self.column_index.get(parts[1])
+        if r is None or c is None:
+            return None
+        return r * len(self.columns) + c
+
+    def location(self, index):
+        r, c = divmod(index, len(self.columns))
+        return f"{self.rows[r]}{self.columns[c]}"
+
+    def set(self, location, occupied):
+        """Mark a slot; locations outside the grid are ignored"""
+        i = self.index(location)
+        if i is None:
+            return
+        with self.lock:
+            if occupied:
+                self.bits |= 1 << i
+            else:
+                self.bits &= ~(1 << i)
+
+    def is_occupied(self, location):
+        i = self.index(location)
+        return i is not None and bool(self.bits >> i & 1)
+
+    def first_free(self):
+        free = ~self.bits & self.full_mask
+        if not free:
+            return None
+        return self.location((free & -free).bit_length() - 1)
+
+    def free_slots(self):
+        """Free locations in slot order"""
+        free = ~self.bits & self.full_mask
+        while free:
+            yield self.location((free & -free).bit_length() - 1)
+            free &= free - 1
+
+    def nearest_free(self, location):
+        """Closest free slot to location (row/column distance), or the first free slot"""
+        i = self.index(location)
+        if i is None:
+            return self.first_free()
+        if not self.bits >> i & 1:
+            return location
+        free = ~self.bits & self.full_mask
+        if not free:
+            return None
+        r0, c0 = divmod(i, len(self.columns))
+        best = None
+        for r, _ in enumerate(self.rows):
+            row_free = free >> (r * len(self.columns)) & self.row_mask
+            while row_free:
+                c = (row_free & -row_free).bit_length() - 1
+                row_free &= row_free - 1
+                distance = abs(r - r0) + abs(c - c0)
+                if best is None or distance < best[0]:
+                    best = (distance, r * len(self.columns) + c)
+        return self.location(best[1])
+
+    def row_fill(self, row):
+        """Fraction of a row's slots that are occupied"""
+        r = self.row_index[row]
+        return popcount(self.bits >> (r * len(self.columns)) & self.row_mask) / len(self.columns)
+
+    def row_occupancy(self, row):
+        """Occupied flag for each column of a row"""
+        mask = self.bits >> (self.row_index[row] * len(self.columns)) & self.row_mask
+        return [bool(mask >> c & 1) for c in range(len(self.columns))]
+
+    def rebuild(self, bins):
+        bits = 0
+        for b in bins:
+            i = self.index(b.location)
+            if i is not None and b.name and b.quantity > 0:
+                bits |= 1 << i
+        with self.lock:
+            self.bits = bits
@@ -0,0 +1,127 @@
+import collections
+import functools
+import re
+import numpy as np
+
+# === PART SEARCH ===
+# Lexical first, transformer last. Names are indexed by token and by
+# character trigram; a query that matches a name exactly, names a part number
+# token, or has one clear lexical winner is answered from the index. Only
+# ambiguous queries are embedded, and then only the lexical candidates (or the
+# whole catalog if there are none) are scored. Query embeddings are cached, so
+# repeated searches like "10k resistor" never hit the model twice.
+
+QUERY_CACHE_SIZE = 256
+MAX_CANDIDATES = 50
+CLEAR_SCORE = 0.6       # trigram similarity that counts as a confident match...
+CLEAR_MARGIN = 0.15     # ...when the runner-up is this far behind
+MIN_CANDIDATE_SCORE = 0.2
+
+UNIT_CHARS = {'µ': 'u', 'μ': 'u', 'Ω': 'ohm', 'ω': 'ohm', '±': '+-'}
+
+def normalize(text):
+    text = text.strip().casefold()
+    for char, replacement in UNIT_CHARS.items():
+        text = text.replace(char, replacement)
+    return " ".join(text.split())
+
+def tokens(text):
+    """Word tokens of normalized text; values like 10kohm or 100uf also give 10k/ohm, 100u/f"""
+    found = []
+    for token in re.findall(r"[a-z0-9][a-z0-9.+\-/]*", text):
+        found.append(token)
+        value = re.match(r"^(\d+(?:\.\d+)?)([kmunp]?)(ohm|f|h|v|a|w|hz|mah)$", token)
+        if value:
+            number, multiplier, unit = value.groups()
+            found.extend([number + multiplier, unit])
+    return found
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PartSearch:
+    def __init__(self, names, encode=None, cache_size=QUERY_CACHE_SIZE):
+        """encode(list of str) -> 2-D array of embeddings; None means lexical search only"""
+        self.names = list(names)
+        self.encode = encode
+        self.normalized = [normalize(n) for n in self.names]
+        self.exact = {}
+        self.by_token = collections.defaultdict(set)
+        self.by_trigram = collections.defaultdict(set)
+        self.name_trigrams = []
+        for i, name in enumerate(self.normalized):
+            self.exact.setdefault(name, i)
+            for token in tokens(name):
+                self.by_token[token].add(i)
+            grams = trigrams(name)
+            self.name_trigrams.append(grams)
+            for gram in grams:
+                self.by_trigram[gram].add(i)
+        self._embeddings = None
+        self.query_embedding = functools.lru_cache(maxsize=cache_size)(self._embed_query)
+        self.stats = collections.Counter()
+
+    # --- lexical ---
+    def lexical(self, query):
+        """[(score, index), ...] best first, from the token and trigram indexes"""
+        query_grams = trigrams(query)
+        overlap = collections.Counter()
+        for gram in query_grams:
+            for i in self.by_trigram.get(gram, ()):
+                overlap[i] += 1
+        scored = []
+        for i, shared in overlap.items():
+            # Jaccard similarity of the trigram sets
+            scored.append((shared / (len(query_grams) + len(self.name_trigrams[i]) - shared), i))
+        # Names containing every query token rank above partial matches
+        query_tokens = set(tokens(query))
+        if query_tokens:
+            full = set.intersection(*(self.by_token.get(t, set()) for t in query_tokens))
+            scored = [(score + (1.0 if i in full else 0.0), i) for score, i in scored]
+        scored.sort(reverse=True)
+        return scored[:MAX_CANDIDATES]
+
+    # --- embeddings ---
+    def _embed_query(self, query):
+        return np.asarray(self.encode([query]))[0]
+
+    def embeddings(self):
+        if self._embeddings is None:
+            vectors = np.asarray(self.encode(self.names), dtype=np.float32)
+            self._embeddings = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self._embeddings
+
+    def semantic(self, query, candidates=None):
+        """[(cosine similarity, index), ...] best first, over candidates or the whole catalog"""
+        vector = self.query_embedding(query)
+        vector = vector / np.linalg.norm(vector)
+        indices = np.arange(len(self.names)) if candidates is None else np.asarray(candidates)
+        scores = self.embeddings()[indices] @ vector
+        order = np.argsort(-scores)
+        return [(float(scores[j]), int(indices[j])) for j in order]
+
+    # --- search ---
+    def search(self, query, k=5):
+        """Best matches as [{'name', 'score', 'source'}]; source is exact, lexical or embedding"""
+        query = normalize(query)
+        if not query:
+            return []
+        if query in self.exact:
+            self.stats['exact'] += 1
+            return [{'name': self.names[self.exact[query]], 'score': 1.0, 'source': 'exact'}]
+
+        lexical = self.lexical(query)
+        # A single name holding every query token (e.g. a part number) is an answer
+        full = [i for score, i in lexical if score >= 1.0]
+        clear = lexical and lexical[0][0] - (lexical[1][0] if len(lexical) > 1 else 0) >= CLEAR_MARGIN
+        if len(full) == 1 or (clear and lexical[0][0] >= CLEAR_SCORE) or self.encode is None:
+            self.stats['lexical'] += 1
+            return [{'name': self.names[i], 'score': round(min(score, 1.0), 3), 'source': 'lexical'}
+                    for score, i in lexical[:k]]
+
+        self.stats['embedding'] += 1
+        # Rank only what the index found: names with every query token, else close trigram matches
+        candidates = full or [i for score, i in lexical if score >= MIN_CANDIDATE_SCORE] or None
+        return [{'name': self.names[i], 'score': round(score, 3), 'source': 'embedding'}
+                for score, i in self.semantic(query, candidates)[:k]]
@@ -0,0 +1,73 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+# === SAMPLING PROFILER ===
+# Periodically snapshots the stack of every thread (Flask, gpiozero callbacks,
+# the Tk main loop, replication) with sys._current_frames() and counts
+# identical stacks. Nothing is traced between samples, so the running kiosk
+# barely notices. Frames are labelled by function, not line, so every sample
+# inside one function adds up. Output is the collapsed-stack format read by
+# flamegraph.pl and speedscope: "thread;outer;...;inner count" per line.
+#
+# A run samples on its own thread: start() returns at once and last_run()
+# has the stacks once it is done, so a long run never holds a web worker.
+
+MAX_SECONDS = 60
+# Only one profile at a time; overlapping samplers would just skew each other
+_running = threading.Lock()
+_last_run = None         # {'started', 'seconds', 'interval', 'stacks', 'error'}; stacks is None until done
+
+def _frame_label(frame):
+    code = frame.f_code
+    # co_qualname (3.11+) tells apart same-named nested functions such as each route's stream()
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+def sample(seconds, interval=0.01):
+    """Sample all threads for the given time; returns Counter of collapsed stack -> samples"""
+    stacks = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+def collapsed(stacks):
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+def start(seconds, interval=0.01):
+    """Begin a profile run on a background thread; returns it, or None if one is already running"""
+    global _last_run
+    if not _running.acquire(blocking=False):
+        return None
+    run = {'started': time.time(), 'seconds': min(seconds, MAX_SECONDS), 'interval': interval, 'stacks': None,
+           'error': None}
+    _last_run = run
+
+    def work():
+        try:
+            run['stacks'] = collapsed(sample(run['seconds'], interval))
+        except Exception as e:
+            print(f"Profile run failed: {e}")
+            run['error'] = str(e) or type(e).__name__
+        finally:
+            _running.release()
+
+    threading.Thread(target=work, name="profiler", daemon=True).start()
+    return dict(run)
+
+def last_run():
+    """The latest run (stacks is None while it is sampling or if it failed), or None before the first"""
+    return dict(_last_run) if _last_run else None
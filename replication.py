@@ -0,0 +1,277 @@
+import hmac
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+from flask import Blueprint, request, jsonify
+
+# === INVENTORY REPLICATION BETWEEN MINIBENCH UNITS ===
+# Every bin mutation on a unit becomes an op with (origin, seq). Ops are
+# appended to a local JSON-lines log, pushed to peers as they happen and
+# pulled from peers by sequence number (since=origin:seq) to catch up after
+# downtime, so nothing ever transfers the whole inventory.
+#
+# Per-bin conflict resolution:
+#   set     name/quantity overwrite (add, clear, edit). Last writer wins by
+#           Lamport version (clock, origin).
+#   adjust  a quantity delta (encoder, /apply-adjustment) made on top of a
+#           given set version. Deltas are summed per origin, so concurrent
+#           adjustments on different units all count. Deltas made against an
+#           older set are dropped once a newer set is seen.
+#
+# quantity = base + sum(deltas); a bin that reaches 0 or less is cleared,
+# matching apply_adjustment. Units should start from the same inventory
+# (e.g. a copy of inventory.csv); bins never touched by an op are not synced.
+#
+# Units share a token (--replication-token or MINIBENCH_REPLICATION_TOKEN)
+# and send it as "Authorization: Bearer <token>" on every replication call.
+#
+# Once every peer reports holding every op we have, and there are at least
+# COMPACT_OPS of them, the log is rewritten as a checkpoint of the merged
+# bins and the ops are dropped. A unit added later has to start from a copy
+# of a peer's inventory and op log.
+
+INITIAL_VERSION = (0, "")
+COMPACT_OPS = 1000
+
+def materialize(state):
+    quantity = state['base'] + sum(state['deltas'].values())
+    if quantity <= 0:
+        return "", 0
+    return state['name'], quantity
+
+class Replicator:
+    def __init__(self, node_id, peers, log_path, write_lock, on_change, token, interval=5.0):
+        """on_change([(location, name, quantity), ...]) is called with write_lock held"""
+        self.node_id = node_id
+        self.peers = [p.rstrip('/') for p in peers]
+        self.log_path = log_path
+        self.token = token
+        self.write_lock = write_lock
+        self.on_change = on_change
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.clock = 0
+        self.bins = {}           # location -> {'version', 'name', 'base', 'deltas'}
+        self.ops = {}            # origin -> [op, ...] in seq order, after the compacted ones
+        self.base = {}           # origin -> seqs compacted into the checkpoint
+        self.pushed = {}         # peer -> last own seq the peer has
+        self.peer_seen = {}      # peer -> its last_seen as of our last pull
+        self._replay()
+
+    # --- op log ---
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                if op['kind'] == 'checkpoint':
+                    self.clock, self.base = op['clock'], op['base']
+                    self.bins = {b.pop('location'): dict(b, version=tuple(b['version'])) for b in op['bins']}
+                    continue
+                self.ops.setdefault(op['origin'], []).append(op)
+                self._merge(op)
+
+    def _append(self, op):
+        self.ops.setdefault(op['origin'], []).append(op)
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(op) + "\n")
+
+    def last_seen(self):
+        return {origin: self.base.get(origin, 0) + len(ops) for origin, ops in self.ops.items()}
+
+    def ops_since(self, since):
+        """Ops from every origin after the given {origin: seq}"""
+        with self.lock:
+            return [op for origin, ops in self.ops.items()
+                    for op in ops[max(since.get(origin, 0) - self.base.get(origin, 0), 0):]]
+
+    def compact(self):
+        """Replace the log with a checkpoint once every peer has every op; returns ops dropped"""
+        with self.lock:
+            held = sum(len(ops) for ops in self.ops.values())
+            if held < COMPACT_OPS or any(peer not in self.peer_seen for peer in self.peers):
+                return 0
+            # Only when nothing is outstanding: the checkpoint then holds exactly the dropped ops
+            for origin, seq in self.last_seen().items():
+                if any(self.peer_seen[peer].get(origin, 0) < seq for peer in self.peers):
+                    return 0
+            for origin, ops in self.ops.items():
+                self.base[origin] = self.base.get(origin, 0) + len(ops)
+            self.ops = {origin: [] for origin in self.ops}
+            checkpoint = {'kind': 'checkpoint', 'clock': self.clock, 'base': self.base,
+                          'bins': [dict(state, location=location) for location, state in self.bins.items()]}
+            tmp_path = self.log_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(checkpoint) + "\n")
+            os.replace(tmp_path, self.log_path)
+        return held
+
+    # --- merging ---
+    def _merge(self, op):
+        """Fold an op into the per-bin state; returns (name, quantity) if the bin changed"""
+        version = tuple(op['version'])
+        self.clock = max(self.clock, version[0])
+        state = self.bins.get(op['location'])
+        before = materialize(state) if state else None
+        if state is None or version > state['version']:
+            state = {'version': version, 'name': op['name'], 'base': op['quantity'], 'deltas': {}}
+            self.bins[op['location']] = state
+        if op['kind'] == 'adjust' and version == state['version']:
+            state['deltas'][op['origin']] = state['deltas'].get(op['origin'], 0) + op['delta']
+        after = materialize(state)
+        return after if after != before else None
+
+    # --- local mutations (caller holds write_lock) ---
+    def _local(self, op):
+        with self.lock:
+            op['origin'] = self.node_id
+            op['seq'] = self.base.get(self.node_id, 0) + len(self.ops.get(self.node_id, [])) + 1
+            self._append(op)
+            self._merge(op)
+        self.wake.set()
+
+    def local_set(self, location, name, quantity):
+        with self.lock:
+            self.clock += 1
+            version = (self.clock, self.node_id)
+        self._local({'kind': 'set', 'location': location, 'version': version,
+                     'name': name, 'quantity': int(quantity)})
+
+    def local_adjust(self, location, delta, name, quantity_before):
+        """delta was applied to a bin that held name/quantity_before"""
+        with self.lock:
+            state = self.bins.get(location)
+            if state is None:
+                base = {'version': INITIAL_VERSION, 'name': name, 'quantity': int(quantity_before)}
+            else:
+                base = {'version': state['version'], 'name': state['name'], 'quantity': state['base']}
+        # The op carries its base so a peer that missed the set can still apply it
+        self._local(dict(base, kind='adjust', location=location, delta=int(delta)))
+
+    # --- remote ops ---
+    def receive(self, ops):
+        """Apply ops from a peer in seq order; returns how many were new"""
+        applied = 0
+        gap = False
+        with self.write_lock:
+            changed = {}
+            with self.lock:
+                for op in sorted(ops, key=lambda o: (o['origin'], o['seq'])):
+                    if op['origin'] == self.node_id:
+                        continue
+                    last = self.base.get(op['origin'], 0) + len(self.ops.get(op['origin'], []))
+                    if op['seq'] <= last:
+                        continue  # already have it
+                    if op['seq'] != last + 1:
+                        gap = True  # missed some; the pull below fills it in
+                        continue
+                    self._append(op)
+                    result = self._merge(op)
+                    if result:
+                        changed[op['location']] = result
+                    applied += 1
+            if changed:
+                # One store write for the whole batch
+                self.on_change([(location, name, quantity) for location, (name, quantity) in changed.items()])
+        if gap:
+            self.wake.set()
+        return applied
+
+    # --- peer sync ---
+    def _request(self, url, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json',
+                                                              'Authorization': f"Bearer {self.token}"})
+        with urllib.request.urlopen(req, timeout=3) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def _push(self, peer):
+        if peer not in self.pushed:
+            status = self._request(f"{peer}/replication/status")
+            self.pushed[peer] = status['last_seen'].get(self.node_id, 0)
+        with self.lock:
+            own = self.ops.get(self.node_id, [])[max(self.pushed[peer] - self.base.get(self.node_id, 0), 0):]
+        if own:
+            self._request(f"{peer}/replication/ops", {'ops': own})
+            self.pushed[peer] = own[-1]['seq']
+
+    def _pull(self, peer):
+        with self.lock:
+            since = [f"{origin}:{seq}" for origin, seq in self.last_seen().items()]
+        query = urllib.parse.urlencode([('since', s) for s in since])
+        result = self._request(f"{peer}/replication/ops?{query}")
+        self.receive(result['ops'])
+        self.peer_seen[peer] = result['last_seen']
+
+    def sync_once(self):
+        for peer in self.peers:
+            try:
+                self._push(peer)
+                self._pull(peer)
+            except Exception as e:
+                # Peer is down or unreachable; catch up on a later round
+                self.pushed.pop(peer, None)
+                self.peer_seen.pop(peer, None)
+                print(f"Replication with {peer} failed: {e}")
+        try:
+            self.compact()
+        except OSError as e:
+            print(f"Error compacting {self.log_path}: {e}")
+
+    def _run(self, shutdown_event):
+        while not shutdown_event.is_set():
+            self.sync_once()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def start(self, shutdown_event):
+        thread = threading.Thread(target=self._run, args=(shutdown_event,), daemon=True)
+        thread.start()
+        return thread
+
+def create_blueprint(replicator):
+    bp = Blueprint('replication', __name__, url_prefix='/replication')
+
+    @bp.before_request
+    def authorize():
+        supplied = request.headers.get('Authorization', '')
+        if not (supplied.startswith('Bearer ') and
+                hmac.compare_digest(supplied[len('Bearer '):].encode(), replicator.token.encode())):
+            return jsonify({'success': False, 'error': 'Replication token required'}), 403
+
+    @bp.route("/status")
+    def status():
+        with replicator.lock:
+            return jsonify({'node': replicator.node_id, 'clock': replicator.clock,
+                            'last_seen': replicator.last_seen(), 'peers': replicator.peers})
+
+    @bp.route("/ops", methods=['GET'])
+    def get_ops():
+        """Catch-up: ops after since=origin:seq (repeatable; unknown origins start at 0)"""
+        since = {}
+        for item in request.args.getlist('since'):
+            origin, _, seq = item.rpartition(':')
+            try:
+                since[origin] = int(seq)
+            except ValueError:
+                return jsonify({'success': False, 'error': f'Invalid since value {item}'})
+        ops = replicator.ops_since(since)
+        with replicator.lock:
+            last_seen = replicator.last_seen()
+        # last_seen tells the caller what we hold, so it knows when it can compact
+        return jsonify({'success': True, 'node': replicator.node_id, 'ops': ops, 'last_seen': last_seen})
+
+    @bp.route("/ops", methods=['POST'])
+    def post_ops():
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Invalid request format'})
+        applied = replicator.receive(request.get_json().get('ops', []))
+        return jsonify({'success': True, 'applied': applied})
+
+    return bp
@@ -0,0 +1,139 @@
+import bisect
+import collections
+import contextlib
+import json
+import os
+import time
+
+# === SCAN PIPELINE TRACING ===
+# Each scan records how long every stage took, how many contours/candidates
+# it saw, which path found the code and the localization parameters it ran
+# with. Records are appended to scan_trace.jsonl so they survive restarts;
+# the summary covers the most recent WINDOW scans, grouped by parameters so
+# different adaptiveThreshold/contour settings can be compared.
+#
+#   python3 scan_trace.py            print the summary report
+#   GET /api/scan-stats              the same summary as JSON (app.py)
+
+TRACE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan_trace.jsonl")
+WINDOW = 500
+# Report order; stages a record has that aren't listed here follow them
+STAGES = ['preview', 'capture', 'load', 'threshold', 'contours', 'candidate_decode', 'debug_output', 'fallback', 'total']
+OUTCOMES = ['region', 'fallback', 'none']
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class ScanTrace:
+    """Timings and counts for one scan"""
+    def __init__(self, params):
+        self.started = time.perf_counter()
+        self.record = {'time': time.time(), 'params': dict(params), 'stages': {}, 'counts': {}, 'outcome': None}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self.record['stages']
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def count(self, name, n=1):
+        counts = self.record['counts']
+        counts[name] = counts.get(name, 0) + n
+
+    def finish(self, outcome):
+        self.record['outcome'] = outcome
+        self.record['stages']['total'] = (time.perf_counter() - self.started) * 1000
+        return self.record
+
+def append(record, path=TRACE_PATH):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+    # Keep the file from growing without bound on a device that scans all day
+    if os.path.getsize(path) > 2000 * WINDOW:
+        records = read_recent(path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+        os.replace(tmp_path, path)
+
+def read_recent(path=TRACE_PATH, window=WINDOW):
+    """The last window trace records, oldest first"""
+    recent = collections.deque(maxlen=window)
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    recent.append(json.loads(line))
+                except ValueError:
+                    continue  # torn last line from a crash
+    except OSError:
+        pass
+    return list(recent)
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+def stage_stats(values):
+    values = sorted(values)
+    histogram = [0] * (len(BUCKETS_MS) + 1)
+    for v in values:
+        histogram[bisect.bisect_left(BUCKETS_MS, v)] += 1
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 2),
+        'p50_ms': round(percentile(values, 50), 2),
+        'p90_ms': round(percentile(values, 90), 2),
+        'p99_ms': round(percentile(values, 99), 2),
+        'max_ms': round(values[-1], 2),
+        'histogram': dict(zip([f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], histogram)),
+    }
+
+def summarize(records):
+    """Per parameter set: outcome counts, mean counts and per-stage latency stats"""
+    groups = collections.OrderedDict()
+    for r in records:
+        key = json.dumps(r['params'], sort_keys=True)
+        groups.setdefault(key, []).append(r)
+    summary = []
+    for key, group in groups.items():
+        outcomes = collections.Counter(r['outcome'] for r in group)
+        count_names = sorted({name for r in group for name in r['counts']})
+        recorded = {stage for r in group for stage in r['stages']}
+        stages = [stage for stage in STAGES if stage in recorded] + sorted(recorded - set(STAGES))
+        summary.append({
+            'params': json.loads(key),
+            'scans': len(group),
+            'outcomes': {o: outcomes.get(o, 0) for o in OUTCOMES},
+            'success_rate': round((outcomes['region'] + outcomes['fallback']) / len(group), 3),
+            'mean_counts': {name: round(sum(r['counts'].get(name, 0) for r in group) / len(group), 2)
+                            for name in count_names},
+            'stages': {stage: stage_stats([r['stages'][stage] for r in group if stage in r['stages']])
+                       for stage in stages},
+        })
+    return summary
+
+def format_report(summary):
+    if not summary:
+        return "No scans recorded yet.\n"
+    lines = []
+    for group in summary:
+        params = ", ".join(f"{k}={v}" for k, v in group['params'].items())
+        outcomes = ", ".join(f"{k} {v}" for k, v in group['outcomes'].items())
+        lines.append(f"Parameters: {params}")
+        lines.append(f"  {group['scans']} scans, success {group['success_rate']:.1%} ({outcomes})")
+        counts = ", ".join(f"{k} {v}" for k, v in group['mean_counts'].items())
+        if counts:
+            lines.append(f"  mean per scan: {counts}")
+        lines.append(f"  {'stage':<18}{'n':>6}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, s in group['stages'].items():
+            lines.append(f"  {stage:<18}{s['count']:>6}{s['mean_ms']:>10.1f}{s['p50_ms']:>10.1f}"
+                         f"{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+        lines.append("")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    print(format_report(summarize(read_recent())))
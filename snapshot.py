@@ -0,0 +1,141 @@
+import mmap
+import os
+import struct
+import sys
+
+# Binary snapshot of inventory.csv for fast cold starts. Everything is
+# little-endian and 4-byte aligned so the file can be memory-mapped and read
+# in place:
+#
+#   header        magic, bin count, string count, heap size,
+#                 mtime_ns and size of the CSV it was built from
+#   quantities    int32[count]
+#   thresholds    int32[count]      reorder level, 0 = none
+#   name_ids      uint32[count]     index into the string table
+#   location_ids  uint32[count]     index into the string table
+#   by_location   uint32[count]     bin indices sorted by location
+#   offsets       uint32[strings+1] string table: start of each string in the heap
+#   heap          utf-8 bytes, each distinct name/location stored once
+#
+# Rows are only decoded when asked for, and find() is a binary search over
+# by_location, so looking up one bin never touches the rest.
+
+MAGIC = b'MBSNAP02'
+HEADER = struct.Struct('<8sIIIqq')
+
+def write_snapshot(path, rows, source_stat):
+    """Write rows (dicts with Name/Quantity/Location/Threshold) built from a CSV with the given os.stat()"""
+    strings = {}
+
+    def intern(s):
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    quantities = [int(r['Quantity']) for r in rows]
+    thresholds = [int(r.get('Threshold', 0)) for r in rows]
+    name_ids = [intern(str(r['Name'])) for r in rows]
+    location_ids = [intern(str(r['Location'])) for r in rows]
+    by_location = sorted(range(len(rows)), key=lambda i: str(rows[i]['Location']).encode('utf-8'))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    count = len(rows)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, count, len(encoded), offsets[-1],
+                            source_stat.st_mtime_ns, source_stat.st_size))
+        f.write(struct.pack(f'<{count}i', *quantities))
+        f.write(struct.pack(f'<{count}i', *thresholds))
+        f.write(struct.pack(f'<{count}I', *name_ids))
+        f.write(struct.pack(f'<{count}I', *location_ids))
+        f.write(struct.pack(f'<{count}I', *by_location))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(b''.join(encoded))
+    # Readers either see the old snapshot or the complete new one
+    os.replace(tmp_path, path)
+
+class Snapshot:
+    """A memory-mapped snapshot; rows are materialized on demand"""
+    def __init__(self, mm):
+        magic, count, n_strings, heap_size, mtime_ns, size = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an inventory snapshot")
+        self.count = count
+        self.source = (mtime_ns, size)
+        view = memoryview(mm)
+        pos = HEADER.size
+
+        def section(length, fmt):
+            nonlocal pos
+            part = view[pos:pos + 4 * length].cast(fmt)
+            pos += 4 * length
+            return part
+
+        self.quantities = section(count, 'i')
+        self.thresholds = section(count, 'i')
+        self.name_ids = section(count, 'I')
+        self.location_ids = section(count, 'I')
+        self.by_location = section(count, 'I')
+        self.offsets = section(n_strings + 1, 'I')
+        self.heap = view[pos:pos + heap_size]
+        if len(self.heap) != heap_size:
+            raise ValueError("Truncated inventory snapshot")
+
+    @staticmethod
+    def open(path):
+        """Map a snapshot file, or return None if it is missing or unreadable"""
+        # The arrays are read in place, which assumes a little-endian host
+        if sys.byteorder != 'little':
+            return None
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return Snapshot(mm)
+        except (OSError, ValueError, struct.error, TypeError):
+            return None
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, string_id):
+        return str(self.heap[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+
+    def _location_bytes(self, i):
+        string_id = self.location_ids[i]
+        return self.heap[self.offsets[string_id]:self.offsets[string_id + 1]].tobytes()
+
+    def row(self, i):
+        return {
+            'Name': self._string(self.name_ids[i]),
+            'Quantity': self.quantities[i],
+            'Location': self._string(self.location_ids[i]),
+            'Threshold': self.thresholds[i],
+        }
+
+    def rows(self):
+        # Decode each distinct string once
+        strings = [self._string(i) for i in range(len(self.offsets) - 1)]
+        return [{'Name': strings[n], 'Quantity': q, 'Location': strings[l], 'Threshold': t}
+                for n, q, l, t in zip(self.name_ids, self.quantities, self.location_ids, self.thresholds)]
+
+    def iter_rows(self):
+        for i in range(self.count):
+            yield self.row(i)
+
+    def find(self, location):
+        """Binary search for a bin by location; returns its row or None"""
+        target = location.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._location_bytes(self.by_location[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._location_bytes(self.by_location[lo]) == target:
+            return self.row(self.by_location[lo])
+        return None
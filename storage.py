@@ -0,0 +1,335 @@
+import contextlib
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from snapshot import Snapshot, write_snapshot
+from metrics import PERSISTENCE_SECONDS, timed
+
+# Rows passed to and from a store are plain dicts with these keys, the same
+# shape as Bin.to_dict() and the columns of inventory.csv. Threshold is the
+# bin's reorder level (0 = not watched); older files without it read as 0.
+FIELDS = ['Name', 'Quantity', 'Location', 'Threshold']
+
+def make_row(name, quantity, location, threshold=0):
+    if name is None or (isinstance(name, float) and math.isnan(name)):
+        name = ""
+    if threshold is None or (isinstance(threshold, float) and math.isnan(threshold)):
+        threshold = 0
+    return {'Name': name, 'Quantity': int(quantity), 'Location': location, 'Threshold': int(threshold)}
+
+# --- Store interface ---
+# all()                     -> every row, ordered by location
+# get(location)             -> one row or None
+# get_many(locations)       -> {location: row} for the locations that exist
+# upsert_many(changes)      -> write [(original_location, row), ...] in one go;
+#                              rows whose original_location is missing are inserted
+# replace_all(rows)         -> overwrite the whole inventory
+# iter_rows()               -> iterator over a point-in-time view of every row;
+#                              later writes don't show up in it
+# version()                 -> changes whenever the stored rows do, whoever wrote them
+# close()                   -> release open files/connections at shutdown
+
+class RowsView:
+    """The rows of our own last CSV write, read like a Snapshot until the file is rewritten"""
+    def __init__(self, rows, source):
+        self.source = source
+        self._rows = [make_row(r['Name'], r['Quantity'], r['Location'], r.get('Threshold')) for r in rows]
+        self._by_location = {}
+        for r in self._rows:
+            self._by_location.setdefault(r['Location'], r)
+
+    def rows(self):
+        return [dict(r) for r in self._rows]
+
+    def iter_rows(self):
+        # Never mutated: the next write builds a new view
+        return (dict(r) for r in self._rows)
+
+    def find(self, location):
+        r = self._by_location.get(location)
+        return dict(r) if r else None
+
+class CsvStore:
+    """The original inventory.csv file; every write rewrites the whole file.
+
+    A binary snapshot (inventory.snap, see snapshot.py) is kept next to the
+    CSV and answers reads without parsing it. The snapshot records the CSV's
+    mtime and size; if the CSV is edited behind our back the snapshot is
+    rebuilt from it on the next read. Our own writes are served from the rows
+    just written, and the snapshot file is rewritten from them at most every
+    SNAPSHOT_INTERVAL seconds and at close(); if we stop without that, the
+    mtime/size check rebuilds it on the next start.
+    """
+    SNAPSHOT_INTERVAL = 60
+
+    def __init__(self, path, use_snapshot=True):
+        self.path = path
+        self.snapshot_path = os.path.splitext(path)[0] + '.snap' if use_snapshot else None
+        self._snapshot = None       # Snapshot or RowsView matching the CSV
+        self._dirty = False         # the snapshot file is behind our last write
+        self._snapshot_written = None
+
+    def _read_csv(self):
+        import pandas as pd
+        try:
+            df = pd.read_csv(self.path)
+            return [make_row(r['Name'], r['Quantity'], r['Location'], r.get('Threshold'))
+                    for r in df.to_dict(orient='records')]
+        except Exception:
+            return []
+
+    def _current_snapshot(self):
+        """The mapped snapshot if it matches the CSV on disk, rebuilding it if stale"""
+        if not self.snapshot_path:
+            return None
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        source = (st.st_mtime_ns, st.st_size)
+        snap = self._snapshot
+        if snap is None or snap.source != source:
+            snap = Snapshot.open(self.snapshot_path)
+            if snap is None or snap.source != source:
+                self.compact(st)
+                snap = Snapshot.open(self.snapshot_path)
+            # The CSV changed behind our back, so rows from our last write are stale too
+            self._snapshot, self._dirty = snap, False
+        return snap
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='compact')
+    def compact(self, st=None):
+        """Regenerate the snapshot from the CSV"""
+        try:
+            write_snapshot(self.snapshot_path, self._read_csv(), st or os.stat(self.path))
+            self._dirty = False
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+
+    def _write_snapshot(self):
+        """Bring the snapshot file up to our last write"""
+        view = self._snapshot
+        if not self._dirty or not isinstance(view, RowsView):
+            return
+        try:
+            st = os.stat(self.path)
+            if (st.st_mtime_ns, st.st_size) == view.source:
+                write_snapshot(self.snapshot_path, view.rows(), st)
+            self._dirty = False
+            self._snapshot_written = time.monotonic()
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='all')
+    def all(self):
+        snap = self._current_snapshot()
+        if snap is not None:
+            return snap.rows()
+        return self._read_csv()
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='get')
+    def get(self, location):
+        snap = self._current_snapshot()
+        if snap is not None:
+            return snap.find(location)
+        return self.get_many([location]).get(location)
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='get_many')
+    def get_many(self, locations):
+        snap = self._current_snapshot()
+        if snap is not None:
+            found = (snap.find(location) for location in set(locations))
+            return {r['Location']: r for r in found if r}
+        wanted = set(locations)
+        return {r['Location']: r for r in self.all() if r['Location'] in wanted}
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='upsert_many')
+    def upsert_many(self, changes):
+        rows = self.all()
+        by_location = {r['Location']: r for r in rows}
+        inserted = False
+        for original_location, row in changes:
+            existing = by_location.get(original_location)
+            if existing is None:
+                rows.append(dict(row))
+                inserted = True
+            else:
+                existing.update(row)
+        if inserted:
+            rows.sort(key=lambda r: r['Location'])
+        self.replace_all(rows)
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='replace_all')
+    def replace_all(self, rows):
+        import pandas as pd
+        try:
+            df = pd.DataFrame(rows, columns=FIELDS)
+            df.to_csv(self.path, index=False)
+        except Exception as e:
+            print(f"Error saving bins: {e}")
+            # Don't let the error break the application
+            return
+        if self.snapshot_path:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._snapshot = None
+                return
+            # Reads are served from the rows we just wrote; the file catches up later
+            self._snapshot = RowsView(rows, (st.st_mtime_ns, st.st_size))
+            self._dirty = True
+            if self._snapshot_written is None or time.monotonic() - self._snapshot_written >= self.SNAPSHOT_INTERVAL:
+                self._write_snapshot()
+
+    @timed(PERSISTENCE_SECONDS, backend='csv', op='iter_rows')
+    def iter_rows(self):
+        # Writes replace the snapshot file rather than changing it, so the
+        # mapped one stays a consistent view for as long as we hold it
+        snap = self._current_snapshot()
+        if snap is not None:
+            return snap.iter_rows()
+        return iter(self._read_csv())
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def close(self):
+        if self.snapshot_path:
+            self._write_snapshot()
+        self._snapshot = None
+
+class SqliteStore:
+    """SQLite in WAL mode: single-row writes, and readers never block the writer.
+
+    Each call borrows a connection from a small pool and hands it back, so
+    short-lived Flask worker threads don't each leave one open.
+    """
+    POOL_SIZE = 4           # idle connections kept; extra ones are closed when returned
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bins (
+            location TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            quantity INTEGER NOT NULL DEFAULT 0,
+            threshold INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS bins_name ON bins (name);
+    """
+    COLUMNS = "name, quantity, location, threshold"
+
+    def __init__(self, path, seed_csv=None):
+        self.path = path
+        self._pool = queue.LifoQueue()
+        # data_version only moves for commits made on other connections, so it
+        # is read from one that never writes: every pooled commit counts
+        self._version_conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._version_lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+            # Databases from before reorder thresholds
+            if 'threshold' not in {r[1] for r in conn.execute("PRAGMA table_info(bins)")}:
+                with conn:
+                    conn.execute("ALTER TABLE bins ADD COLUMN threshold INTEGER NOT NULL DEFAULT 0")
+            empty = not conn.execute("SELECT 1 FROM bins LIMIT 1").fetchone()
+        # First run: import the existing inventory.csv
+        if seed_csv and os.path.exists(seed_csv) and empty:
+            self.replace_all(CsvStore(seed_csv).all())
+
+    @contextlib.contextmanager
+    def _conn(self):
+        """A pooled connection for the length of one call; only one thread uses it at a time"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield conn
+        finally:
+            if self._pool.qsize() < self.POOL_SIZE:
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    def version(self):
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='all')
+    def all(self):
+        with self._conn() as conn:
+            cur = conn.execute(f"SELECT {self.COLUMNS} FROM bins ORDER BY location")
+            return [make_row(*r) for r in cur]
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='get')
+    def get(self, location):
+        with self._conn() as conn:
+            r = conn.execute(f"SELECT {self.COLUMNS} FROM bins WHERE location = ?", (location,)).fetchone()
+        return make_row(*r) if r else None
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='get_many')
+    def get_many(self, locations):
+        locations = list(locations)
+        found = {}
+        with self._conn() as conn:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(locations), 500):
+                chunk = locations[i:i + 500]
+                cur = conn.execute(
+                    f"SELECT {self.COLUMNS} FROM bins WHERE location IN ({','.join('?' * len(chunk))})", chunk)
+                for r in cur:
+                    found[r[2]] = make_row(*r)
+        return found
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='upsert_many')
+    def upsert_many(self, changes):
+        changes = list(changes)
+        try:
+            with self._conn() as conn, conn:
+                # Clear every changed row first, then write them all, so bins can trade
+                # places in one batch (A1 <-> A2) without clashing on the unique location
+                conn.executemany("DELETE FROM bins WHERE location = ?",
+                                 [(original_location,) for original_location, _ in changes])
+                conn.executemany(
+                    "INSERT INTO bins (location, name, quantity, threshold) VALUES (?, ?, ?, ?)",
+                    [(r['Location'], r['Name'], int(r['Quantity']), int(r.get('Threshold', 0))) for _, r in changes])
+        except sqlite3.IntegrityError:
+            raise ValueError("Bin location already in use")
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='replace_all')
+    def replace_all(self, rows):
+        with self._conn() as conn, conn:
+            conn.execute("DELETE FROM bins")
+            conn.executemany(
+                "INSERT OR REPLACE INTO bins (location, name, quantity, threshold) VALUES (?, ?, ?, ?)",
+                [(r['Location'], r['Name'], int(r['Quantity']), int(r.get('Threshold', 0))) for r in rows])
+
+    @timed(PERSISTENCE_SECONDS, backend='sqlite', op='iter_rows')
+    def iter_rows(self):
+        # A read transaction on a private connection sees the database as of
+        # its first read, whatever writers do meanwhile
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("BEGIN")
+        cur = conn.execute(f"SELECT {self.COLUMNS} FROM bins ORDER BY location")
+
+        def rows():
+            try:
+                for r in cur:
+                    yield make_row(*r)
+            finally:
+                conn.close()
+        return rows()
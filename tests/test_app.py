@@ -0,0 +1,171 @@
+import gzip
+
+import pytest
+
+import app as minibench
+from storage import CsvStore, make_row
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / "inventory.csv")
+    CsvStore(path).replace_all([make_row("Resistor 10k", 100, "A1"), make_row("LED red", 50, "A2"),
+                                make_row("", 0, "A3")])
+    minibench.configure_storage("csv", path)
+    yield minibench.create_app().test_client()
+    minibench.store.close()
+
+
+def usage(location, name):
+    """[consumed, added] over every bucket of one bin's rollup"""
+    rollup = minibench.get_usage().rollups.get((location, name))
+    return [sum(b[0] for b in rollup.daily.values()), sum(b[1] for b in rollup.daily.values())] if rollup else [0, 0]
+
+
+def test_update_bin_records_usage(client):
+    r = client.post("/update-bin", json={'name': "Resistor 10k", 'quantity': "70", 'location': "A1",
+                                         'original_location': "A1"})
+    assert r.json['success']
+    assert usage("A1", "Resistor 10k") == [30, 0]
+    # A different part in the bin is a relabel, not consumption
+    client.post("/update-bin", json={'name': "Resistor 22k", 'quantity': "10", 'location': "A1",
+                                     'original_location': "A1"})
+    assert usage("A1", "Resistor 10k") == [30, 0]
+    assert usage("A1", "Resistor 22k") == [0, 0]
+
+
+def test_update_all_bins_records_usage(client):
+    r = client.post("/update-all-bins", json={'changes': [
+        {'original_location': "A1", 'quantity': "90"},
+        {'original_location': "A2", 'quantity': "60"},
+        {'original_location': "A3", 'name': "Fuse", 'quantity': "5"},
+    ]})
+    assert r.json['success']
+    assert usage("A1", "Resistor 10k") == [10, 0]
+    assert usage("A2", "LED red") == [0, 10]
+    assert usage("A3", "Fuse") == [0, 5]
+
+
+def test_import_and_scan_batch_record_restocks(client):
+    r = client.post("/import?policy=add", data="Name,Quantity,Location\nLED red,25,A2\n", content_type="text/csv")
+    assert r.json['success']
+    assert usage("A2", "LED red") == [0, 25]
+    r = client.post("/scan/batch", json={'labels': [{'mfr_pn': "Resistor 10k", 'qty': 40}]})
+    assert r.json['success']
+    assert usage("A1", "Resistor 10k") == [0, 40]
+
+
+def test_list_bins_pages_and_sorts(client):
+    r = client.get("/api/bins?sort=Quantity&order=desc&limit=2").json
+    assert r['total'] == 3
+    assert [row['Location'] for row in r['rows']] == ["A1", "A2"]
+    r = client.get("/api/bins?sort=Quantity&order=desc&offset=2&limit=2").json
+    assert [row['Location'] for row in r['rows']] == ["A3"]
+    r = client.get("/api/bins?sort=Quantity&offset=5").json
+    assert r['rows'] == []
+    r = client.get("/api/bins?q=led").json
+    assert (r['total'], r['rows'][0]['Location']) == (1, "A2")
+
+
+def test_list_bins_sees_writes(client):
+    assert client.get("/api/bins?sort=Quantity").json['rows'][-1]['Location'] == "A1"
+    client.post("/update-all-bins", json={'changes': [{'original_location': "A2", 'quantity': "500"}]})
+    rows = client.get("/api/bins?sort=Quantity").json['rows']
+    assert [(row['Location'], row['Quantity']) for row in rows][-1] == ("A2", 500)
+
+
+def test_list_bins_sees_external_edits(client):
+    assert client.get("/api/bins").json['total'] == 3
+    path = minibench.store.path
+    with open(path, 'a') as f:
+        f.write("Fuse,5,B1,0\n")
+    assert client.get("/bin/B1").json['success']
+    r = client.get("/api/bins").json
+    assert r['total'] == 4
+    assert r['rows'][-1]['Location'] == "B1"
+
+
+def test_list_bins_follows_configure_storage(client, tmp_path):
+    assert client.get("/api/bins").json['total'] == 3
+    other = str(tmp_path / "other.csv")
+    CsvStore(other).replace_all([make_row("Fuse", 5, "C1")])
+    minibench.configure_storage("csv", other)
+    r = client.get("/api/bins").json
+    assert (r['total'], r['rows'][0]['Location']) == (1, "C1")
+    minibench.configure_storage("sqlite", str(tmp_path / "inventory.db"))
+    # Seeded from the CSV that was current when the database was created
+    assert client.get("/api/bins").json['total'] == 1
+    minibench.store.upsert_many([("C2", make_row("Diode", 2, "C2"))])    # behind the app's back
+    assert client.get("/api/bins").json['total'] == 2
+
+
+def test_replace_import_does_not_alert_for_dropped_bins(client):
+    engine = minibench.get_watch()
+    engine.rebuild([make_row("Resistor 10k", 100, "A1", 20), make_row("LED red", 50, "A2", 10),
+                    make_row("", 0, "A3", 10)])
+    seq = engine.seq
+    r = client.post("/import?policy=replace", data="Name,Quantity,Location,Threshold\nResistor 10k,15,A1,20\n",
+                    content_type="text/csv")
+    assert r.json['success']
+    # A1 changed and A2 was dropped; A3 was empty already
+    assert r.json['changed'] == 2
+    assert [(a['kind'], a['location']) for a in engine.since(seq)] == [('low', "A1")]
+    assert [b['location'] for b in engine.low()] == ["A1"]
+
+
+def test_clear_and_add_record_usage(client):
+    r = client.post("/clear", data={'bin_location': "A2"})
+    assert r.json['success']
+    assert usage("A2", "LED red") == [50, 0]
+    r = client.post("/add", data={'name': "Fuse", 'quantity': "8", 'bin_location': "A3"})
+    assert r.json['success']
+    assert usage("A3", "Fuse") == [0, 8]
+
+
+def test_usage_report_totals_on_hand(client):
+    client.post("/update-bin", json={'name': "Resistor 10k", 'quantity': "80", 'location': "A1",
+                                     'original_location': "A1"})
+    [part] = client.get("/api/usage?days=1").json['parts']
+    assert (part['name'], part['consumed'], part['quantity']) == ("Resistor 10k", 20, 80)
+
+
+def test_export_filters_and_compresses(client):
+    r = client.get("/export?format=jsonl&name=led")
+    assert r.data == b'{"Name": "LED red", "Quantity": 50, "Location": "A2", "Threshold": 0}\n'
+    r = client.get("/export?column=1", headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(r.data).decode().splitlines() == ["Name,Quantity,Location,Threshold",
+                                                             "Resistor 10k,100,A1,0"]
+    assert not client.get("/export?format=pdf").json['success']
+
+
+def bins():
+    return {row['Location']: (row['Name'], row['Quantity']) for row in minibench.store.all()}
+
+
+def test_scan_batch_matches_labels_to_bins(client):
+    r = client.post("/scan/batch", json={'labels': [
+        {'mfr_pn': "resistor 10K", 'qty': 10},                        # case-insensitive part match
+        {'mfr_pn': "", 'digi_key_pn': "LED red", 'qty': "5"},          # falls back to the Digi-Key number
+        {'mfr_pn': "RC0603-1K", 'qty': 20},                           # unknown part: first free bin
+        {'mfr_pn': "RC0603-1K", 'qty': 30},                           # second lot: same new bin
+        {'mfr_pn': "CAP-100N", 'qty': 7},                             # next free bin
+    ]}).json
+    assert r['success']
+    assert [(b['location'], b['added'], b['quantity']) for b in r['booked']] == \
+        [("A1", 10, 110), ("A2", 5, 55), ("A3", 50, 50), ("A4", 7, 7)]
+    assert bins() == {"A1": ("Resistor 10k", 110), "A2": ("LED red", 55),
+                      "A3": ("RC0603-1K", 50), "A4": ("CAP-100N", 7)}
+
+
+@pytest.mark.parametrize("labels, error", [
+    ([], "No labels provided"),
+    ([{'mfr_pn': "X", 'qty': "many"}], "Label 1: invalid quantity"),
+    ([{'mfr_pn': "LED red", 'qty': 1}, {'mfr_pn': "X", 'qty': 0}], "Label 2: needs a part number and a quantity"),
+    ([{'qty': 3}], "Label 1: needs a part number and a quantity"),
+])
+def test_scan_batch_rejects_bad_labels(client, labels, error):
+    r = client.post("/scan/batch", json={'labels': labels}).json
+    assert (r['success'], r['error']) == (False, error)
+    # Nothing is booked when any label is bad
+    assert bins()["A2"] == ("LED red", 50)
@@ -0,0 +1,232 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask, request
+
+import async_server
+from async_server import AsyncServer, BadRequest, StatusBroadcaster, read_request, run_wsgi
+from watch import WatchEngine
+
+
+def parse(data):
+    """read_request() over a stream holding data"""
+    async def go():
+        reader = asyncio.StreamReader(limit=async_server.MAX_HEADER_BYTES)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(go())
+
+
+def test_keep_alive_defaults():
+    assert parse(b"GET / HTTP/1.1\r\nHost: t\r\n\r\n")['keep_alive']
+    assert not parse(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n")['keep_alive']
+    assert not parse(b"GET / HTTP/1.0\r\n\r\n")['keep_alive']
+    assert parse(b"GET / HTTP/1.0\r\nConnection: Keep-Alive\r\n\r\n")['keep_alive']
+
+
+def test_request_fields():
+    req = parse(b"post /a/b?x=1 HTTP/1.1\r\nContent-Length: 3\r\nExpect: 100-continue\r\n\r\nabc")
+    assert (req['method'], req['path'], req['query']) == ('POST', '/a/b', 'x=1')
+    assert (req['length'], req['chunked'], req['expect_continue']) == (3, False, True)
+    assert parse(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n")['chunked']
+    assert parse(b"") is None
+
+
+@pytest.mark.parametrize('data, status', [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"GET / HTTP/1.1 extra\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: ten\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (async_server.MAX_BODY_BYTES + 1), 413),
+    (b"GET / HTTP/1.1\r\n" + b"X-Pad: aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa\r\n" * 400 + b"\r\n", 431),
+])
+def test_bad_requests(data, status):
+    with pytest.raises(BadRequest) as e:
+        parse(data)
+    assert e.value.status == status
+
+
+def wsgi_response(app, method='GET', version='HTTP/1.1'):
+    out = []
+    keep_alive = run_wsgi(app, {'REQUEST_METHOD': method, 'SERVER_PROTOCOL': version}, out.append, True)
+    return keep_alive, b"".join(out)
+
+
+def test_unsized_response_is_chunked():
+    def app(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/plain')])
+        write(b"ab")
+        return [b"", b"cde"]
+    keep_alive, raw = wsgi_response(app)
+    assert keep_alive
+    assert raw.endswith(b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n2\r\nab\r\n3\r\ncde\r\n0\r\n\r\n")
+    # HTTP/1.0 has no chunking: the body runs to the end of the connection
+    keep_alive, raw = wsgi_response(app, version='HTTP/1.0')
+    assert not keep_alive
+    assert raw.endswith(b"Connection: close\r\n\r\nabcde")
+
+
+def test_sized_and_bodyless_responses_keep_alive():
+    def sized(environ, start_response):
+        start_response('200 OK', [('Content-Length', '2')])
+        return [b"ok"]
+
+    def no_content(environ, start_response):
+        start_response('204 No Content', [])
+        return []
+    assert wsgi_response(sized) == (True, b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\nok")
+    assert wsgi_response(no_content) == (True, b"HTTP/1.1 204 No Content\r\nConnection: keep-alive\r\n\r\n")
+    assert wsgi_response(sized, method='HEAD')[1].endswith(b"\r\n\r\n")
+
+
+def test_status_payload_built_once_off_the_loop():
+    calls = []
+
+    def get_status():
+        calls.append(threading.current_thread())
+        return {'n': len(calls)}
+
+    async def go():
+        b = StatusBroadcaster(asyncio.get_running_loop(), get_status)
+        first = await asyncio.gather(*(b.payload() for _ in range(20)))
+        b._bump()
+        second = await b.payload()
+        return first, second
+    first, second = asyncio.run(go())
+    assert set(first) == {b'data: {"n": 1}\n\n'}
+    assert second == b'data: {"n": 2}\n\n'
+    assert threading.main_thread() not in calls
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        # Read in pieces, as an upload handler would
+        total, first = 0, b""
+        while True:
+            data = request.stream.read(4096)
+            if not data:
+                break
+            first = first or data[:8]
+            total += len(data)
+        return f"{total} {first.decode()}"
+
+    @app.route('/ignore', methods=['POST'])
+    def ignore():
+        return "ignored"
+
+    return app
+
+
+@pytest.fixture
+def server():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    shutdown = threading.Event()
+    srv = AsyncServer(make_app(), lambda: {'ok': True}, WatchEngine(), shutdown, workers=2)
+    thread = threading.Thread(target=srv.run, args=('127.0.0.1', port), daemon=True)
+    thread.start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield port
+    shutdown.set()
+    thread.join(5)
+
+
+def connect(port):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    return sock, sock.makefile('rb')
+
+
+def read_response(f):
+    """(status, headers, body) of one response, following Content-Length or chunked framing"""
+    status = int(f.readline().split()[1])
+    headers = {}
+    while (line := f.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b""
+        while (size := int(f.readline(), 16)):
+            body += f.read(size)
+            f.readline()
+        f.readline()
+    else:
+        body = f.read(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+def test_streams_content_length_body_and_keeps_alive(server):
+    sock, f = connect(server)
+    body = b"x" * 300000
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: t\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+    assert read_response(f)[2] == b"300000 xxxxxxxx"
+    # Same connection, unread body on the second request is skipped before the third
+    sock.sendall(b"POST /ignore HTTP/1.1\r\nHost: t\r\nContent-Length: 5\r\n\r\nhello")
+    assert read_response(f)[2] == b"ignored"
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: t\r\nContent-Length: 3\r\n\r\nabc")
+    assert read_response(f)[2] == b"3 abc"
+    sock.close()
+
+
+def test_chunked_request_body(server):
+    sock, f = connect(server)
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: t\r\nTransfer-Encoding: chunked\r\n\r\n"
+                 b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n")
+    assert read_response(f)[2] == b"11 hello wo"
+    sock.close()
+
+
+def test_expect_100_continue(server):
+    sock, f = connect(server)
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: t\r\nContent-Length: 4\r\nExpect: 100-continue\r\n\r\n")
+    # The client waits for the go-ahead before sending the body
+    assert f.readline() == b"HTTP/1.1 100 Continue\r\n"
+    assert f.readline() == b"\r\n"
+    sock.sendall(b"data")
+    assert read_response(f)[2] == b"4 data"
+    sock.close()
+
+
+def test_expect_100_continue_not_read_closes(server):
+    sock, f = connect(server)
+    sock.sendall(b"POST /ignore HTTP/1.1\r\nHost: t\r\nContent-Length: 4\r\nExpect: 100-continue\r\n\r\n")
+    status, headers, body = read_response(f)
+    assert body == b"ignored"
+    # No 100 was sent, so the body never came and the connection can't be reused
+    assert f.read() == b""
+    sock.close()
+
+
+def test_events_served_on_the_loop(server):
+    # Encoded paths and HEAD must not fall through to a WSGI worker (only two here)
+    for _ in range(3):
+        sock, f = connect(server)
+        sock.sendall(b"HEAD /events HTTP/1.1\r\nHost: t\r\n\r\n")
+        assert f.readline() == b"HTTP/1.1 200 OK\r\n"
+        assert f.read().endswith(b"\r\n\r\n")
+        sock.close()
+    streams = []
+    for _ in range(3):
+        sock, f = connect(server)
+        sock.sendall(b"GET /%65vents HTTP/1.1\r\nHost: t\r\n\r\n")
+        while f.readline() != b"\r\n":
+            pass
+        assert f.readline() == b'data: {"ok": true}\n'
+        streams.append(sock)
+    sock, f = connect(server)
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: t\r\nContent-Length: 2\r\n\r\nhi")
+    assert read_response(f)[2] == b"2 hi"
+    for s in streams + [sock]:
+        s.close()
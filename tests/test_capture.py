@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+# Needs the libdmtx shared library, not just the Python package
+pytest.importorskip("pylibdmtx.pylibdmtx", exc_type=ImportError)
+cv2 = pytest.importorskip("cv2")
+
+import camera_test
+from scan_trace import ScanTrace
+
+CONFIG = dict(camera_test.DEFAULT_CAPTURE, capture_mode='two_stage', roi=[0.25, 0.25, 0.5, 0.5],
+              still_size=[1280, 720], preview_size=[320, 320])
+LABEL = (480, 230, 700, 450)    # x1, y1, x2, y2 on a full-sensor still
+
+
+def sensor_frame():
+    """A full still with one 220 px square, checkered symbol on a white background"""
+    width, height = CONFIG['still_size']
+    frame = np.full((height, width), 255, np.uint8)
+    x1, y1, x2, y2 = LABEL
+    frame[y1:y2, x1:x2] = 0
+    cells = np.random.default_rng(0).integers(0, 2, (18, 18), dtype=np.uint8) * 255
+    frame[y1 + 20:y2 - 20, x1 + 20:x2 - 20] = cv2.resize(cells, (180, 180), interpolation=cv2.INTER_NEAREST)
+    return frame
+
+
+def test_preview_keeps_roi_aspect():
+    # A tall strip of the sensor is previewed tall, not squashed into the preview box's shape
+    config = dict(CONFIG, preview_size=[640, 360])
+    width, height = camera_test.preview_dimensions(config, [0.0, 0.0, 0.25, 1.0])
+    assert (width, height) == (160, 360)
+    # Never larger than the still would be for the same roi
+    assert camera_test.preview_dimensions(config, [0.4, 0.4, 0.1, 0.1]) == (128, 72)
+
+
+def test_preview_factor_is_relative_to_roi():
+    width, _ = camera_test.preview_dimensions(CONFIG, CONFIG['roi'])
+    assert width == 320
+    # The roi is 640 still pixels wide, so the preview is at half the still's density
+    assert camera_test.preview_factor(CONFIG, CONFIG['roi'], width) == pytest.approx(0.5)
+
+
+def test_preview_boxes_map_back_to_sensor_roi():
+    rx, ry, rw, rh = CONFIG['roi']
+    still_w, still_h = CONFIG['still_size']
+    # What libcamera returns for the preview: the roi, resized to the preview size
+    crop = sensor_frame()[int(ry * still_h):int((ry + rh) * still_h), int(rx * still_w):int((rx + rw) * still_w)]
+    width, height = camera_test.preview_dimensions(CONFIG, CONFIG['roi'])
+    preview = cv2.resize(crop, (width, height), interpolation=cv2.INTER_AREA)
+
+    factor = camera_test.preview_factor(CONFIG, CONFIG['roi'], width)
+    params = camera_test.scale_params(camera_test.SCAN_PARAMS, factor)
+    boxes = [box for box, _ in camera_test.locate_candidates(preview, ScanTrace(params), params)]
+    assert boxes
+
+    roi = camera_test.preview_boxes_to_roi(boxes, preview.shape, CONFIG['roi'])
+    x1, y1, x2, y2 = LABEL
+    # The mapped roi covers the label on the sensor, and not much more
+    assert roi[0] * still_w <= x1 and (roi[0] + roi[2]) * still_w >= x2
+    assert roi[1] * still_h <= y1 and (roi[1] + roi[3]) * still_h >= y2
+    assert roi[2] * still_w < (x2 - x1) * 1.5 and roi[3] * still_h < (y2 - y1) * 1.5
+    # The final still of that roi keeps full-still density, so the label stays ~220 px
+    still_width, still_height = camera_test.roi_size(CONFIG, roi)
+    assert still_width == pytest.approx(roi[2] * still_w, abs=2)
+    assert still_height == pytest.approx(roi[3] * still_h, abs=2)
@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+import json
+import zipfile
+import xml.etree.ElementTree as ET
+
+import exporter
+from storage import make_row
+
+ROWS = [make_row("Resistor 10k", 100, "A1", 10), make_row("LED <red> & co", 50, "A12", 5),
+        make_row("Resistor 1k", 7, "B1"), make_row("", 0, "AB1")]
+NS = {'s': "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def kept(**kwargs):
+    return [r['Location'] for r in ROWS if exporter.row_filter(**kwargs)(r)]
+
+
+def test_row_filter():
+    assert kept() == ["A1", "A12", "B1", "AB1"]
+    assert kept(row="a") == ["A1", "A12"]               # whole row letters, not a prefix
+    assert kept(column=1) == ["A1", "B1", "AB1"]        # column 1 is not column 12
+    assert kept(name="RESISTOR") == ["A1", "B1"]
+    assert kept(row="A", column=1, name="resistor") == ["A1"]
+
+
+def test_batches():
+    assert list(exporter.batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(exporter.batches([], 2)) == []
+
+
+def test_csv_and_jsonl():
+    chunks = list(exporter.csv_chunks(iter(ROWS)))
+    assert list(csv.DictReader(io.StringIO(b"".join(chunks).decode()))) == \
+        [{k: str(v) for k, v in r.items()} for r in ROWS]
+    lines = b"".join(exporter.jsonl_chunks(iter(ROWS))).decode().splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+def test_xlsx_is_a_readable_workbook():
+    data = b"".join(exporter.xlsx_chunks(iter(ROWS)))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert set(exporter.XLSX_PARTS) < set(zf.namelist())
+        sheet = ET.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    table = []
+    for row in sheet.iterfind('s:sheetData/s:row', NS):
+        table.append([c.findtext('s:is/s:t', namespaces=NS) if c.get('t') == 'inlineStr'
+                      else int(c.findtext('s:v', namespaces=NS)) for c in row])
+    assert table == [exporter.FIELDS] + [[r[f] for f in exporter.FIELDS] for r in ROWS]
+
+
+def test_gzip_chunks_round_trip():
+    chunks = [b"Name,Quantity\n", b"", b"LED,5\n"]
+    assert gzip.decompress(b"".join(exporter.gzip_chunks(chunks))) == b"".join(chunks)
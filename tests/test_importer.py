@@ -0,0 +1,72 @@
+import pytest
+
+import importer
+from importer import CsvImport
+from storage import make_row
+
+VALID = {f"{r}{c}" for r in "AB" for c in (1, 2, 3)}
+STORED = {"A1": make_row("Resistor", 100, "A1", 10),
+          "A2": make_row("LED", 50, "A2", 5),
+          "A3": make_row("", 0, "A3", 7)}
+
+
+def read(policy, text):
+    job = CsvImport(policy, VALID.__contains__)
+    list(job.read([line.encode() for line in text.splitlines(keepends=True)]))
+    return job
+
+
+def test_replace_and_merge_overwrite_listed_bins():
+    for policy in ('replace', 'merge'):
+        job = read(policy, "Name,Quantity,Location\nCapacitor,30,a1\nLED,0,A2\n")
+        assert not job.errors and job.count == 2
+        merged = job.merge(STORED)
+        # Blank threshold keeps the stored one; bins not in the file aren't touched here
+        assert merged == {"A1": make_row("Capacitor", 30, "A1", 10), "A2": make_row("LED", 0, "A2", 5)}
+
+
+def test_add_sums_clears_and_fills():
+    job = read('add', "Name,Quantity,Location,Threshold\n"
+                      "Resistor,25,A1,\n"       # same part: summed
+                      ",-60,A2,\n"              # blank name means the stored part; goes to 0
+                      "Diode,4,A3,2\n"          # empty bin: filled, new threshold
+                      "Fuse,3,B1,\n")           # unknown bin: created
+    merged = job.merge(STORED)
+    assert not job.errors
+    assert merged == {"A1": make_row("Resistor", 125, "A1", 10), "A2": make_row("", 0, "A2", 5),
+                      "A3": make_row("Diode", 4, "A3", 2), "B1": make_row("Fuse", 3, "B1", 0)}
+
+
+def test_add_refuses_to_rename_a_stocked_bin():
+    job = read('add', "Name,Quantity,Location\nCapacitor,5,A1\n")
+    assert job.merge(STORED) == {}
+    assert job.errors == ["Line 2: A1 holds Resistor, not Capacitor"]
+
+
+@pytest.mark.parametrize("policy, text, error", [
+    ('merge', "Name,Location\nX,A1\n", "Missing column(s): Quantity"),
+    ('merge', "Name,Quantity,Location\nX,1,Z9\n", "Line 2: invalid bin location 'Z9'"),
+    ('merge', "Name,Quantity,Location\nX,lots,A1\n", "Line 2: invalid quantity 'lots' for A1"),
+    ('merge', "Name,Quantity,Location\nX,-1,A1\n", "Line 2: negative quantity for A1"),
+    ('merge', "Name,Quantity,Location,Threshold\nX,1,A1,low\n", "Line 2: invalid threshold 'low' for A1"),
+    ('merge', "Name,Quantity,Location,Threshold\nX,1,A1,-2\n", "Line 2: negative threshold for A1"),
+    ('merge', "Name,Quantity,Location\nX,1,A1\nY,2,a1\n", "Line 3: A1 already appears on line 2"),
+])
+def test_validation_errors(policy, text, error):
+    assert read(policy, text).errors == [error]
+
+
+def test_nameless_stock_is_rejected_at_merge():
+    job = read('replace', "Name,Quantity,Location\n,5,B2\n")
+    assert not job.errors
+    assert job.merge({}) == {}
+    assert job.errors == ["Line 2: B2 needs a name"]
+
+
+def test_errors_are_capped_and_progress_reported(monkeypatch):
+    monkeypatch.setattr(importer, "PROGRESS_EVERY", 2)
+    job = CsvImport('merge', VALID.__contains__)
+    lines = [b"Name,Quantity,Location\n"] + [b"X,1,Z9\n"] * (importer.MAX_ERRORS + 5)
+    assert list(job.read(lines))[:3] == [2, 4, 6]
+    assert job.count == importer.MAX_ERRORS + 5
+    assert len(job.errors) == importer.MAX_ERRORS
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+
+
+def observed(histogram, name):
+    """(count, sum) recorded for lock=name"""
+    entry = histogram.values.get((name,))
+    return (entry[-1], entry[-2]) if entry else (0, 0)
+
+
+def test_timed_lock_records_wait_and_hold():
+    lock = metrics.TimedLock("test-contended")
+    holding = threading.Event()
+
+    def holder():
+        with lock:
+            holding.set()
+            time.sleep(0.1)
+
+    t = threading.Thread(target=holder)
+    t.start()
+    holding.wait()
+    with lock:          # blocks until the holder lets go
+        pass
+    t.join()
+    waits, waited = observed(metrics.LOCK_WAIT_SECONDS, "test-contended")
+    holds, held = observed(metrics.LOCK_HOLD_SECONDS, "test-contended")
+    assert waits == holds == 2
+    assert waited >= 0.05
+    assert held >= 0.1
+
+
+def test_timed_lock_failed_acquire_records_nothing():
+    lock = metrics.TimedLock("test-nonblocking")
+    assert lock.acquire()
+    assert lock.locked()
+    assert not lock.acquire(blocking=False)
+    assert not lock.acquire(timeout=0.01)
+    lock.release()
+    assert not lock.locked()
+    assert observed(metrics.LOCK_WAIT_SECONDS, "test-nonblocking")[0] == 1
+    assert observed(metrics.LOCK_HOLD_SECONDS, "test-nonblocking")[0] == 1
+
+
+def test_histogram_render_is_cumulative():
+    h = metrics.Histogram('test_seconds', 'Test histogram', ['op'], buckets=(0.1, 1.0))
+    metrics.registry.remove(h)
+    for value in (0.05, 0.5, 0.5, 3):
+        h.observe(value, op='read')
+    assert h.render() == ['# HELP test_seconds Test histogram', '# TYPE test_seconds histogram',
+                          'test_seconds_bucket{op="read",le="0.1"} 1',
+                          'test_seconds_bucket{op="read",le="1.0"} 3',
+                          'test_seconds_bucket{op="read",le="+Inf"} 4',
+                          'test_seconds_sum{op="read"} 4.05',
+                          'test_seconds_count{op="read"} 4']
+
+
+def test_timed_observes_when_the_call_raises():
+    h = metrics.Histogram('test_timed_seconds', 'Test histogram')
+    metrics.registry.remove(h)
+
+    @metrics.timed(h)
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        fail()
+    assert h.values[()][-1] == 1
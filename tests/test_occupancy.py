@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from occupancy import OccupancyGrid, split_location
+
+
+def grid(*occupied):
+    g = OccupancyGrid("ABC", [1, 2, 3])
+    g.rebuild(SimpleNamespace(location=loc, name="Part", quantity=1) for loc in occupied)
+    return g
+
+
+def test_split_location():
+    assert split_location("B12") == ("B", 12)
+    assert split_location("AA3") == ("AA", 3)
+    for bad in ("B", "12", "1B2", ""):
+        assert split_location(bad) is None
+
+
+def test_first_free_is_lowest_slot():
+    assert grid().first_free() == "A1"
+    assert grid("A1", "A2").first_free() == "A3"
+    # Rows wrap: A is full, so B1 comes next
+    assert grid("A1", "A2", "A3").first_free() == "B1"
+    assert grid(*[r + str(c) for r in "ABC" for c in (1, 2, 3)]).first_free() is None
+    assert list(grid("A1", "A3", "B1", "B2", "B3", "C2").free_slots()) == ["A2", "C1", "C3"]
+
+
+def test_nearest_free():
+    g = grid("A1", "A2", "A3", "B1", "B2")
+    assert g.nearest_free("B3") == "B3"                        # free itself
+    assert g.nearest_free("B2") == "B3"                        # same row beats the row below
+    assert g.nearest_free("A1") == "C1"                        # two rows down, nothing closer
+    assert g.nearest_free("Z9") == g.first_free() == "B3"      # off the grid falls back
+    assert grid(*[r + str(c) for r in "ABC" for c in (1, 2, 3)]).nearest_free("B2") is None
+
+
+def test_set_and_rebuild_track_stock():
+    g = OccupancyGrid("AB", [1, 2])
+    g.rebuild([SimpleNamespace(location="A1", name="Part", quantity=3),
+               SimpleNamespace(location="A2", name="Part", quantity=0),   # named but empty
+               SimpleNamespace(location="B1", name="", quantity=0),
+               SimpleNamespace(location="Q7", name="Part", quantity=1)])  # outside the grid
+    assert g.row_occupancy("A") == [True, False]
+    assert g.row_fill("A") == 0.5 and g.row_fill("B") == 0
+    g.set("B2", True)
+    g.set("A1", False)
+    g.set("Q7", True)
+    assert [g.is_occupied(loc) for loc in ("A1", "A2", "B1", "B2", "Q7")] == [False, False, False, True, False]
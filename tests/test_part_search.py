@@ -0,0 +1,64 @@
+import numpy as np
+
+from part_search import PartSearch, normalize, tokens
+
+NAMES = ["Resistor 10k 0603", "Resistor 10k 0805", "LED red 5mm", "Capacitor 100µF 25V", "STM32F103C8T6"]
+
+
+class FakeEncoder:
+    """Letter-count vectors; remembers every batch it was asked to encode"""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), 37))
+        for row, text in enumerate(texts):
+            for char in text.lower():
+                vectors[row, "abcdefghijklmnopqrstuvwxyz0123456789 ".find(char)] += 1
+        return vectors
+
+
+def test_normalize_and_tokens():
+    assert normalize("  Capacitor 100µF   25V ") == "capacitor 100uf 25v"
+    assert tokens("resistor 10kohm") == ["resistor", "10kohm", "10k", "ohm"]
+
+
+def test_exact_and_part_number_queries_skip_the_model():
+    encode = FakeEncoder()
+    search = PartSearch(NAMES, encode)
+    assert search.search("led RED 5mm") == [{'name': "LED red 5mm", 'score': 1.0, 'source': 'exact'}]
+    [best, *_] = search.search("stm32f103c8t6 mcu")
+    assert (best['name'], best['source']) == ("STM32F103C8T6", 'lexical')
+    assert search.search("capacitor 100uf")[0]['name'] == "Capacitor 100µF 25V"
+    assert encode.calls == []
+    assert search.stats == {'exact': 1, 'lexical': 2}
+
+
+def test_ambiguous_query_embeds_only_lexical_candidates():
+    encode = FakeEncoder()
+    search = PartSearch(NAMES, encode)
+    results = search.search("10k resistor")
+    assert {r['name'] for r in results} == {"Resistor 10k 0603", "Resistor 10k 0805"}
+    assert {r['source'] for r in results} == {'embedding'}
+    assert search.lexical("10k resistor")[0][0] >= 1.0
+    # One query batch, then the catalog once
+    assert encode.calls == [["10k resistor"], NAMES]
+
+
+def test_repeated_queries_hit_the_cache():
+    encode = FakeEncoder()
+    search = PartSearch(NAMES, encode, cache_size=2)
+    for _ in range(3):
+        search.search("10k resistor")
+        search.search("  10K   Resistor")    # normalizes to the same cached query
+    assert encode.calls == [["10k resistor"], NAMES]
+    assert search.query_embedding.cache_info().hits == 5
+    assert search.stats['embedding'] == 6
+
+
+def test_without_an_encoder_search_is_lexical():
+    search = PartSearch(NAMES)
+    results = search.search("10k resistor", k=1)
+    assert len(results) == 1 and results[0]['source'] == 'lexical'
+    assert search.search("   ") == []
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import profiler
+
+
+def busy(stop):
+    # A plain list check: Event.is_set() is Python code and would show up as its own stack
+    while not stop:
+        sum(range(1000))
+
+
+def test_background_run_aggregates_by_function():
+    stop = []
+    worker = threading.Thread(target=busy, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        run = profiler.start(0.3, 0.005)
+        assert run is not None and run['stacks'] is None
+        # Returns at once; a second run is refused while this one samples
+        assert profiler.start(0.1) is None
+        assert profiler.last_run()['stacks'] is None
+        deadline = time.monotonic() + 5
+        while profiler.last_run()['stacks'] is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.append(True)
+        worker.join()
+    lines = [line for line in profiler.last_run()['stacks'].splitlines() if line.startswith("busy-worker;")]
+    # Every sample of the loop lands on one stack, whatever line it was on
+    assert len(lines) == 1
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.endswith(";busy (test_profiler.py)")
+    assert int(count) > 10
+    assert profiler.start(0.01) is not None
+
+
+def test_failed_run_reports_error_and_frees_the_profiler(monkeypatch):
+    def broken(seconds, interval):
+        raise RuntimeError("no frames")
+    monkeypatch.setattr(profiler, "sample", broken)
+    deadline = time.monotonic() + 5
+    while profiler.start(0.1) is None and time.monotonic() < deadline:
+        time.sleep(0.05)    # an earlier test's run may still be finishing
+    while profiler.last_run()['error'] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    run = profiler.last_run()
+    assert run['error'] == "no frames" and run['stacks'] is None
+    deadline = time.monotonic() + 5
+    while (run := profiler.start(0.01)) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert run is not None
@@ -0,0 +1,119 @@
+import json
+import threading
+import urllib.parse
+
+import pytest
+from flask import Flask
+
+import replication
+from replication import Replicator, create_blueprint
+
+TOKEN = "secret"
+
+
+class Unit:
+    """A replicator with an in-memory bin table, reachable through a Flask test client"""
+    def __init__(self, node_id, peer, tmp_path, units):
+        self.bins = {}
+        self.batches = []
+        self.replicator = Replicator(node_id, [peer], str(tmp_path / f"{node_id}.oplog.jsonl"),
+                                     threading.Lock(), self.on_change, TOKEN)
+        self.replicator._request = lambda url, body=None: request(units, url, body)
+        app = Flask(node_id)
+        app.register_blueprint(create_blueprint(self.replicator))
+        self.client = app.test_client()
+
+    def on_change(self, changes):
+        self.batches.append(changes)
+        for location, name, quantity in changes:
+            self.bins[location] = (name, quantity)
+
+
+def request(units, url, body):
+    parts = urllib.parse.urlsplit(url)
+    client = units[parts.netloc].client
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {'Authorization': f"Bearer {TOKEN}"}
+    response = client.post(path, json=body, headers=headers) if body is not None else client.get(path, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.fixture
+def units(tmp_path):
+    units = {}
+    units['a'] = Unit('a', 'http://b', tmp_path, units)
+    units['b'] = Unit('b', 'http://a', tmp_path, units)
+    return units
+
+
+def state(unit):
+    return {location: replication.materialize(s) for location, s in unit.replicator.bins.items()}
+
+
+def test_two_units_converge(units):
+    a, b = units['a'].replicator, units['b'].replicator
+    a.local_set("A1", "Resistor", 100)
+    a.sync_once()
+    # Concurrent adjustments on both units, on top of the same set
+    a.local_adjust("A1", -10, "Resistor", 100)
+    b.local_adjust("A1", -5, "Resistor", 100)
+    b.local_set("B1", "LED", 7)
+    b.sync_once()
+    a.sync_once()
+    assert state(units['a']) == state(units['b']) == {"A1": ("Resistor", 85), "B1": ("LED", 7)}
+    assert units['a'].bins == {"A1": ("Resistor", 85), "B1": ("LED", 7)}
+
+
+def test_received_batch_is_one_write(units):
+    a = units['a'].replicator
+    for i in range(5):
+        a.local_set(f"A{i}", "Part", i + 1)
+    a.sync_once()
+    assert len(units['b'].batches) == 1
+    assert len(units['b'].batches[0]) == 5
+
+
+def test_compaction_keeps_state_and_seqs(units, tmp_path, monkeypatch):
+    monkeypatch.setattr(replication, 'COMPACT_OPS', 3)
+    a, b = units['a'].replicator, units['b'].replicator
+    for i in range(4):
+        a.local_set("A1", "Part", i + 1)
+    a.local_adjust("A1", 2, "Part", 4)
+    a.sync_once()      # the pull after the push reports that b holds all five
+    assert a.ops == {'a': []} and a.base == {'a': 5}
+    assert len(b.ops['a']) == 5
+    b.sync_once()
+    assert b.ops == {'a': []}
+    # Sequence numbers carry on after the checkpoint
+    a.local_set("A2", "Fuse", 3)
+    assert a.ops['a'][0]['seq'] == 6
+    a.sync_once()
+    assert state(units['b']) == {"A1": ("Part", 6), "A2": ("Fuse", 3)}
+    # Restarting from the compacted log rebuilds the same state
+    restarted = Replicator('a', ['http://b'], a.log_path, threading.Lock(), lambda changes: None, TOKEN)
+    assert restarted.bins == a.bins
+    assert restarted.last_seen() == a.last_seen() == {'a': 6}
+    with open(a.log_path) as f:
+        assert json.loads(f.readline())['kind'] == 'checkpoint'
+
+
+def test_compaction_waits_for_every_peer(units, monkeypatch):
+    monkeypatch.setattr(replication, 'COMPACT_OPS', 1)
+    a = units['a'].replicator
+    a.local_set("A1", "Part", 1)
+    assert a.compact() == 0    # b has never reported
+    a.peer_seen['http://b'] = {'a': 0}
+    assert a.compact() == 0
+    a.peer_seen['http://b'] = {'a': 1}
+    assert a.compact() == 1
+
+
+def test_requests_need_the_token(units):
+    client = units['a'].client
+    body = {'ops': [{'kind': 'set', 'origin': 'x', 'seq': 1, 'location': 'A1', 'version': [9, 'x'],
+                     'name': 'Evil', 'quantity': 1}]}
+    assert client.post("/replication/ops", json=body).status_code == 403
+    assert client.post("/replication/ops", json=body, headers={'Authorization': "Bearer wrong"}).status_code == 403
+    assert client.get("/replication/status").status_code == 403
+    assert units['a'].bins == {}
@@ -0,0 +1,23 @@
+import scan_trace
+from scan_trace import ScanTrace
+
+
+def test_summary_reports_every_recorded_stage():
+    records = []
+    for mode in ('two_stage', 'full'):
+        trace = ScanTrace({'block_size': 11})
+        if mode == 'two_stage':
+            with trace.stage('preview'):
+                pass
+        with trace.stage('capture'):
+            pass
+        with trace.stage('experimental'):
+            pass
+        trace.count('contours', 4)
+        records.append(trace.finish('region'))
+    [group] = scan_trace.summarize(records)
+    assert list(group['stages']) == ['preview', 'capture', 'total', 'experimental']
+    assert group['stages']['preview']['count'] == 1
+    assert group['stages']['capture']['count'] == 2
+    assert group['mean_counts'] == {'contours': 4}
+    assert "preview" in scan_trace.format_report([group])
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from storage import CsvStore, SqliteStore, make_row
+
+ROWS = [make_row("Resistor 10k", 100, "A1", 20), make_row("LED red", 50, "A2"), make_row("", 0, "A3")]
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'csv':
+        s = CsvStore(str(tmp_path / "inventory.csv"))
+    else:
+        s = SqliteStore(str(tmp_path / "inventory.db"))
+    s.replace_all([dict(r) for r in ROWS])
+    return s
+
+
+def test_round_trip(store):
+    assert store.all() == ROWS
+    assert store.get("A2") == ROWS[1]
+    assert store.get("Z9") is None
+    assert store.get_many(["A1", "A3", "Z9"]) == {"A1": ROWS[0], "A3": ROWS[2]}
+    assert list(store.iter_rows()) == ROWS
+
+
+def test_upsert_updates_and_inserts(store):
+    store.upsert_many([("A2", make_row("LED red", 45, "A2")), ("B1", make_row("Fuse", 5, "B1", 2))])
+    assert store.get("A2")['Quantity'] == 45
+    assert store.get("B1") == make_row("Fuse", 5, "B1", 2)
+    assert [r['Location'] for r in store.all()] == ["A1", "A2", "A3", "B1"]
+
+
+def test_swap_locations_in_one_batch(store):
+    a1, a2 = store.get("A1"), store.get("A2")
+    store.upsert_many([("A1", dict(a1, Location="A2")), ("A2", dict(a2, Location="A1"))])
+    assert store.get("A1") == dict(a2, Location="A1")
+    assert store.get("A2") == dict(a1, Location="A2")
+    assert len(store.all()) == len(ROWS)
+
+
+def test_move_to_free_location(store):
+    store.upsert_many([("A1", dict(store.get("A1"), Location="C1"))])
+    assert store.get("A1") is None
+    assert store.get("C1")['Name'] == "Resistor 10k"
+
+
+def test_sqlite_move_onto_occupied_location_is_rejected(tmp_path):
+    s = SqliteStore(str(tmp_path / "inventory.db"))
+    s.replace_all([dict(r) for r in ROWS])
+    with pytest.raises(ValueError):
+        s.upsert_many([("A1", dict(ROWS[0], Location="A2"))])
+    # The failed batch is rolled back as a whole
+    assert s.all() == ROWS
+
+
+def test_sqlite_seeds_from_csv(tmp_path):
+    csv_path = str(tmp_path / "inventory.csv")
+    CsvStore(csv_path, use_snapshot=False).replace_all([dict(r) for r in ROWS])
+    assert SqliteStore(str(tmp_path / "inventory.db"), seed_csv=csv_path).all() == ROWS
+
+
+def test_sqlite_pools_connections_across_threads(tmp_path):
+    s = SqliteStore(str(tmp_path / "inventory.db"))
+    s.replace_all([dict(r) for r in ROWS])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(s.get("A1"))) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [ROWS[0]] * 20
+    # Finished threads leave at most the pool's worth of connections open
+    assert s._pool.qsize() <= SqliteStore.POOL_SIZE
+    s.close()
+    assert s._pool.qsize() == 0
+
+
+def test_csv_snapshot_rewritten_lazily(tmp_path):
+    from snapshot import Snapshot
+    s = CsvStore(str(tmp_path / "inventory.csv"))
+    s.replace_all([dict(r) for r in ROWS])
+    snap_path = str(tmp_path / "inventory.snap")
+    first = Snapshot.open(snap_path).rows()
+    assert first == ROWS
+    # Writes within the interval only rewrite the CSV, but reads see them
+    s.upsert_many([("A2", make_row("LED red", 1, "A2"))])
+    assert s.get("A2")['Quantity'] == 1
+    assert Snapshot.open(snap_path).rows() == first
+    # A fresh store sees the stale snapshot and rebuilds it from the CSV
+    assert CsvStore(s.path).get("A2")['Quantity'] == 1
+    s.upsert_many([("A2", make_row("LED red", 2, "A2"))])
+    s.close()
+    assert Snapshot.open(snap_path).find("A2")['Quantity'] == 2
+
+
+def test_csv_external_edit_is_picked_up(tmp_path):
+    s = CsvStore(str(tmp_path / "inventory.csv"))
+    s.replace_all([dict(r) for r in ROWS])
+    with open(s.path, 'a') as f:
+        f.write("Fuse,5,B1,0\n")
+    assert s.get("B1") == make_row("Fuse", 5, "B1")
+
+
+def test_version_tracks_writes(store):
+    before = store.version()
+    store.upsert_many([("A2", make_row("LED red", 1, "A2"))])
+    assert store.version() != before
@@ -0,0 +1,34 @@
+from usage import DAY, HOUR, Rollup, UsageLog
+
+T0 = 1_700_000_000 // DAY * DAY     # a day boundary
+
+
+def test_partial_first_day_from_hourly_buckets():
+    r = Rollup("A1", "Resistor")
+    r.add(T0 - DAY + 2 * HOUR, -4, 96)     # before the window
+    r.add(T0 - DAY + 20 * HOUR, -6, 90)    # partial first day, inside the window
+    r.add(T0 + 5 * HOUR, -3, 87)
+    assert r.consumed_since(T0 - DAY + 12 * HOUR) == 9
+    assert r.consumed_since(T0 - DAY) == 13
+
+
+def test_partial_first_day_falls_back_to_daily_bucket():
+    r = Rollup("A1", "Resistor")
+    r.add(T0 - 8 * DAY + 20 * HOUR, -5, 95)
+    r.add(T0 + HOUR, -3, 92)               # expires the hourly buckets of eight days ago
+    assert T0 - 8 * DAY + 20 * HOUR not in r.hourly
+    # A window starting part-way through that day still counts its consumption
+    assert r.consumed_since(T0 - 8 * DAY + 12 * HOUR) == 8
+    assert r.consumed_since(T0) == 3
+
+
+def test_checkpoint_and_replay(tmp_path):
+    path = str(tmp_path / "inventory.usage.jsonl")
+    log = UsageLog(path)
+    log.record("A1", "Resistor", -10, 90, t=T0)
+    log.flush()
+    log.record("A1", "Resistor", -5, 85, t=T0 + HOUR)
+    reopened = UsageLog(path)
+    [part] = reopened.summary({"Resistor": 85}, days=1, now=T0 + 2 * HOUR)
+    assert part['consumed'] == 15
+    assert part['quantity'] == 85
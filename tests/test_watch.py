@@ -0,0 +1,80 @@
+import json
+import threading
+
+import pytest
+
+from storage import make_row
+from watch import CallbackNotifier, FileNotifier, WatchEngine, WebhookNotifier, describe, make_notifier
+
+
+def kinds(engine):
+    return [a['kind'] for a in engine.since(0)]
+
+
+def test_threshold_crossing_and_rearm():
+    engine = WatchEngine()
+    engine.rebuild([make_row("Resistor", 50, "A1", 20)])
+    assert engine.update(make_row("Resistor", 30, "A1", 20)) is None
+    alert = engine.update(make_row("Resistor", 20, "A1", 20))
+    assert (alert['kind'], alert['location'], alert['quantity'], alert['threshold']) == ('low', "A1", 20, 20)
+    # Already low: no repeat while it keeps falling
+    assert engine.update(make_row("Resistor", 10, "A1", 20)) is None
+    assert engine.update(make_row("Resistor", 40, "A1", 20))['kind'] == 'restocked'
+    # Re-armed: the next drop alerts again
+    assert engine.update(make_row("Resistor", 5, "A1", 20))['kind'] == 'low'
+    assert engine.update(make_row("", 0, "A1"))['kind'] == 'empty'
+    assert kinds(engine) == ['low', 'restocked', 'low', 'empty']
+    assert [a['seq'] for a in engine.since(2)] == [3, 4]
+
+
+def test_unwatched_bins_never_alert():
+    engine = WatchEngine()
+    engine.rebuild([make_row("LED", 5, "A2")])
+    assert engine.update(make_row("LED", 0, "A2")) is None
+    assert engine.update(make_row("", 0, "A2")) is None
+    assert engine.low() == []
+
+
+def test_index_order_and_moves():
+    engine = WatchEngine()
+    engine.rebuild([make_row("A", 25, "A1", 20), make_row("B", 5, "A2", 10), make_row("C", 100, "A3", 10),
+                    make_row("D", 0, "A4", 10), make_row("", 0, "A5", 10)])
+    # Lowest headroom first; a bin without a part isn't watched
+    assert [b['location'] for b in engine.low()] == ["A4", "A2"]
+    assert [b['location'] for b in engine.nearest(3)] == ["A4", "A2", "A1"]
+    # A move carries the bin's state, so no new alert for a bin that was already low
+    assert engine.update(make_row("B", 5, "B2", 10), original_location="A2") is None
+    assert [b['location'] for b in engine.low()] == ["A4", "B2"]
+    engine.forget("B2")
+    assert [b['location'] for b in engine.low()] == ["A4"] and kinds(engine) == []
+
+
+def test_relabelled_bin_alerts_for_the_new_part():
+    engine = WatchEngine()
+    engine.rebuild([make_row("Old", 5, "A1", 10)])
+    assert engine.update(make_row("New", 5, "A1", 10))['name'] == "New"
+
+
+def test_notifiers_get_alerts_off_the_caller(tmp_path):
+    received = []
+    done = threading.Event()
+    engine = WatchEngine()
+    engine.add_notifier(CallbackNotifier(lambda alert: (received.append((alert, threading.current_thread())),
+                                                        done.set())))
+    path = tmp_path / "alerts.jsonl"
+    engine.add_notifier(FileNotifier(str(path)))
+    engine.rebuild([make_row("Resistor", 50, "A1", 20)])
+    engine.update(make_row("Resistor", 0, "A1", 20))
+    assert done.wait(5)
+    engine.outbox.join()
+    alert, thread = received[0]
+    assert thread is not threading.current_thread()
+    line = json.loads(path.read_text())
+    assert line['kind'] == 'low' and line['message'] == describe(alert)
+
+
+def test_make_notifier():
+    assert isinstance(make_notifier("https://example.com/hook"), WebhookNotifier)
+    assert make_notifier("file:/tmp/x.jsonl").path == "/tmp/x.jsonl"
+    with pytest.raises(ValueError):
+        make_notifier("smtp://nope")
@@ -0,0 +1,181 @@
+import collections
+import json
+import os
+import threading
+import time
+
+# === CONSUMPTION ANALYTICS ===
+# Every quantity adjustment is appended to an event log (<inventory>.usage.jsonl)
+# and folded into per-bin hourly and daily rollups as it arrives, so burn rate
+# and days-to-empty come from a few hundred precomputed buckets rather than a
+# scan of the history. The rollups are checkpointed to <inventory>.usage.json
+# together with the log offset they cover; on start only the events written
+# after the checkpoint are replayed.
+
+HOUR = 3600
+DAY = 24 * HOUR
+HOURLY_RETENTION = 7 * DAY     # hourly buckets kept for the last-24h view and recent spikes
+DAILY_RETENTION = 90 * DAY
+CHECKPOINT_EVENTS = 100        # rewrite the checkpoint after this many new events
+DEFAULT_WINDOW_DAYS = 7
+
+class Rollup:
+    """Consumption and restock totals for one (location, part) in hourly and daily buckets"""
+    def __init__(self, location, name):
+        self.location = location
+        self.name = name
+        self.hourly = collections.OrderedDict()   # bucket start -> [consumed, added]
+        self.daily = collections.OrderedDict()
+        self.first_seen = None
+        self.last_seen = None
+        self.quantity = 0
+
+    def add(self, t, delta, quantity):
+        for buckets, width, retention in ((self.hourly, HOUR, HOURLY_RETENTION), (self.daily, DAY, DAILY_RETENTION)):
+            start = int(t // width * width)
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = [0, 0]
+            bucket[0 if delta < 0 else 1] += abs(delta)
+            # Events arrive in time order, so expired buckets are at the front
+            while buckets and next(iter(buckets)) < start - retention:
+                buckets.popitem(last=False)
+        self.first_seen = t if self.first_seen is None else min(self.first_seen, t)
+        self.last_seen = t
+        self.quantity = quantity
+
+    def consumed_since(self, since):
+        """Units consumed from since onwards; daily buckets for whole days, hourly for the partial first day.
+
+        If the hourly buckets for that first day have already expired, its whole
+        daily bucket is counted instead.
+        """
+        day_start = int(-(-since // DAY) * DAY)
+        total = sum(b[0] for start, b in self.daily.items() if start >= day_start)
+        if since < day_start:
+            newest_hour = next(reversed(self.hourly), None)
+            if newest_hour is None or since >= newest_hour - HOURLY_RETENTION:
+                total += sum(b[0] for start, b in self.hourly.items() if since <= start < day_start)
+            else:
+                total += self.daily.get(day_start - DAY, (0, 0))[0]
+        return total
+
+    def to_dict(self):
+        return {'location': self.location, 'name': self.name, 'first_seen': self.first_seen,
+                'last_seen': self.last_seen, 'quantity': self.quantity,
+                'hourly': list(self.hourly.items()), 'daily': list(self.daily.items())}
+
+    @staticmethod
+    def from_dict(d):
+        r = Rollup(d['location'], d['name'])
+        r.first_seen, r.last_seen, r.quantity = d['first_seen'], d['last_seen'], d['quantity']
+        r.hourly = collections.OrderedDict((int(k), v) for k, v in d['hourly'])
+        r.daily = collections.OrderedDict((int(k), v) for k, v in d['daily'])
+        return r
+
+class UsageLog:
+    def __init__(self, path):
+        """path is the event log; the checkpoint sits next to it as .json"""
+        self.path = path
+        self.checkpoint_path = os.path.splitext(path)[0] + ".json"
+        self.rollups = {}        # (location, name) -> Rollup
+        self.offset = 0          # bytes of the event log already folded into the rollups
+        self.pending = 0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            self.offset = checkpoint['offset']
+            for d in checkpoint['rollups']:
+                r = Rollup.from_dict(d)
+                self.rollups[(r.location, r.name)] = r
+        except (OSError, ValueError, KeyError):
+            self.rollups, self.offset = {}, 0
+        try:
+            with open(self.path, 'rb') as f:
+                if f.seek(0, os.SEEK_END) < self.offset:
+                    # Log was truncated or replaced; start over from it
+                    self.rollups, self.offset = {}, 0
+                f.seek(self.offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn last line from a crash
+                    self.offset += len(line)
+                    try:
+                        self._fold(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+        except OSError:
+            pass
+
+    def _fold(self, event):
+        key = (event['location'], event['name'])
+        rollup = self.rollups.get(key)
+        if rollup is None:
+            rollup = self.rollups[key] = Rollup(*key)
+        rollup.add(event['time'], event['delta'], event['quantity'])
+
+    def record(self, location, name, delta, quantity, t=None):
+        """Log one adjustment of delta units (negative = consumed) leaving quantity in the bin"""
+        if not delta or not name:
+            return
+        event = {'time': time.time() if t is None else t, 'location': location, 'name': name,
+                 'delta': delta, 'quantity': quantity}
+        line = (json.dumps(event) + "\n").encode()
+        with self.lock:
+            with open(self.path, 'ab') as f:
+                f.write(line)
+            self.offset += len(line)
+            self._fold(event)
+            self.pending += 1
+            if self.pending >= CHECKPOINT_EVENTS:
+                self.checkpoint()
+
+    def checkpoint(self):
+        """Write the rollups and the log offset they cover; caller holds self.lock"""
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'offset': self.offset, 'rollups': [r.to_dict() for r in self.rollups.values()]}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.checkpoint()
+
+    def summary(self, quantities, days=DEFAULT_WINDOW_DAYS, now=None):
+        """Per part: consumption over the window, burn rate per day and days until empty.
+
+        quantities maps part name -> units currently on hand (summed over its bins).
+        The rate is averaged over the window, or over the time since the part was
+        first seen if that is shorter, so a new part isn't diluted by empty days.
+        """
+        now = time.time() if now is None else now
+        since = now - days * DAY
+        parts = {}
+        with self.lock:
+            for (location, name), r in self.rollups.items():
+                part = parts.setdefault(name, {'name': name, 'locations': [], 'consumed': 0,
+                                               'last_24h': 0, 'first_seen': r.first_seen})
+                part['locations'].append(location)
+                part['consumed'] += r.consumed_since(since)
+                part['last_24h'] += r.consumed_since(now - DAY)
+                part['first_seen'] = min(part['first_seen'], r.first_seen)
+        usage = []
+        for name, part in parts.items():
+            # At least a day, so a burst in a part's first hour isn't extrapolated into a huge rate
+            elapsed_days = max(now - max(part.pop('first_seen'), since), min(DAY, now - since)) / DAY
+            rate = part['consumed'] / elapsed_days
+            on_hand = quantities.get(name, 0)
+            part['locations'].sort()
+            part['quantity'] = on_hand
+            part['burn_rate_per_day'] = round(rate, 2)
+            part['days_to_empty'] = round(on_hand / rate, 1) if rate > 0 else None
+            usage.append(part)
+        # Fastest burners first, then the ones closest to running out
+        usage.sort(key=lambda p: (-p['burn_rate_per_day'], p['days_to_empty'] if p['days_to_empty'] is not None else float('inf')))
+        return usage
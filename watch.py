@@ -0,0 +1,181 @@
+import bisect
+import collections
+import json
+import queue
+import threading
+import time
+import urllib.request
+
+# === LOW-STOCK WATCH ===
+# A bin is watched while it holds a named part and has a reorder Threshold
+# above 0. Watched bins sit in a list ordered by headroom (quantity minus
+# threshold): everything at or below its threshold is a prefix, and the bins
+# closest to reorder follow. A write re-checks only the bin it touched, moving
+# its entry in the index and raising an alert when the headroom changes sign:
+#   low        quantity fell to or below the threshold
+#   empty      a watched bin was emptied
+#   restocked  quantity rose back above the threshold
+# Alerts go to the notifiers on a background thread, so a slow webhook never
+# holds the inventory lock.
+
+RECENT_ALERTS = 100
+
+class WatchEngine:
+    def __init__(self):
+        self.index = []          # sorted [(headroom, location)]
+        self.entries = {}        # location -> {'headroom', 'name', 'quantity', 'threshold'}
+        self.recent = collections.deque(maxlen=RECENT_ALERTS)
+        self.seq = 0
+        self.notifiers = []
+        self.lock = threading.Lock()
+        self.outbox = queue.Queue()
+        self.worker = None
+
+    def add_notifier(self, notifier):
+        self.notifiers.append(notifier)
+
+    def rebuild(self, rows):
+        """Index every row without raising alerts (start-up, whole-inventory replace)"""
+        with self.lock:
+            self.index, self.entries = [], {}
+            for row in rows:
+                self._insert(row)
+
+    def _remove(self, location):
+        entry = self.entries.pop(location, None)
+        if entry is not None:
+            i = bisect.bisect_left(self.index, (entry['headroom'], location))
+            del self.index[i]
+        return entry
+
+    def _insert(self, row):
+        threshold = int(row.get('Threshold', 0))
+        if not row['Name'] or threshold <= 0:
+            return None
+        entry = {'headroom': row['Quantity'] - threshold, 'name': row['Name'],
+                 'quantity': row['Quantity'], 'threshold': threshold}
+        self.entries[row['Location']] = entry
+        bisect.insort(self.index, (entry['headroom'], row['Location']))
+        return entry
+
+    def update(self, row, original_location=None):
+        """Re-check one written row; returns the alert it raised, if any"""
+        location = row['Location']
+        with self.lock:
+            before = self._remove(location)
+            if original_location and original_location != location:
+                # A moved bin carries its state to the new location
+                before = self._remove(original_location) or before
+            after = self._insert(row)
+            was_low = before is not None and before['headroom'] <= 0
+            if after is None:
+                kind = 'empty' if before is not None and before['quantity'] > 0 and row['Quantity'] <= 0 else None
+            elif after['headroom'] <= 0:
+                kind = 'low' if not was_low or before['name'] != after['name'] else None
+            else:
+                kind = 'restocked' if was_low and before['name'] == after['name'] else None
+            if kind is None:
+                return None
+            self.seq += 1
+            source = after or before
+            alert = {'seq': self.seq, 'time': time.time(), 'kind': kind, 'location': location,
+                     'name': source['name'], 'quantity': row['Quantity'], 'threshold': source['threshold']}
+            self.recent.append(alert)
+        self._dispatch(alert)
+        return alert
+
+    def forget(self, location):
+        """Stop watching a bin without raising an alert (it was removed, not used up)"""
+        with self.lock:
+            self._remove(location)
+
+    def low(self):
+        """Watched bins at or below their threshold, lowest headroom first"""
+        with self.lock:
+            end = bisect.bisect_right(self.index, (0, '\U0010ffff'))
+            return [dict(self.entries[location], location=location) for _, location in self.index[:end]]
+
+    def nearest(self, count):
+        """The count watched bins closest to (or furthest below) their threshold"""
+        with self.lock:
+            return [dict(self.entries[location], location=location) for _, location in self.index[:count]]
+
+    def since(self, seq):
+        """Recent alerts newer than seq, oldest first"""
+        with self.lock:
+            return [a for a in self.recent if a['seq'] > seq]
+
+    # --- delivery ---
+    def _dispatch(self, alert):
+        if not self.notifiers:
+            return
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._deliver, name="stock-alerts", daemon=True)
+            self.worker.start()
+        self.outbox.put(alert)
+
+    def _deliver(self):
+        while True:
+            alert = self.outbox.get()
+            for notifier in self.notifiers:
+                try:
+                    notifier.notify(alert)
+                except Exception as e:
+                    print(f"Error sending stock alert via {notifier}: {e}")
+            self.outbox.task_done()
+
+# === NOTIFIERS ===
+# Anything with notify(alert) can be added to the engine.
+
+def describe(alert):
+    if alert['kind'] == 'low':
+        return f"Low stock: {alert['name']} in {alert['location']} is at {alert['quantity']} (reorder at {alert['threshold']})"
+    if alert['kind'] == 'empty':
+        return f"Empty: {alert['name']} in {alert['location']} has run out"
+    return f"Restocked: {alert['name']} in {alert['location']} is back to {alert['quantity']}"
+
+class CallbackNotifier:
+    """Calls fn(alert); used for the in-process web and kiosk pushes"""
+    def __init__(self, fn):
+        self.fn = fn
+
+    def notify(self, alert):
+        self.fn(alert)
+
+    def __repr__(self):
+        return f"CallbackNotifier({getattr(self.fn, '__name__', self.fn)})"
+
+class FileNotifier:
+    """Appends each alert as a JSON line; a local stand-in for a real service"""
+    def __init__(self, path):
+        self.path = path
+
+    def notify(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(dict(alert, message=describe(alert))) + "\n")
+
+    def __repr__(self):
+        return f"FileNotifier({self.path})"
+
+class WebhookNotifier:
+    """POSTs each alert as JSON (with a human-readable 'text' for chat webhooks)"""
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def notify(self, alert):
+        body = json.dumps(dict(alert, text=describe(alert))).encode()
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+    def __repr__(self):
+        return f"WebhookNotifier({self.url})"
+
+def make_notifier(spec):
+    """'file:alerts.jsonl' or an http(s):// webhook URL"""
+    if spec.startswith(('http://', 'https://')):
+        return WebhookNotifier(spec)
+    if spec.startswith('file:'):
+        return FileNotifier(spec[len('file:'):])
+    raise ValueError(f"Unknown notifier '{spec}' (use file:<path> or an http(s) URL)")